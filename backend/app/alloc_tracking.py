@@ -0,0 +1,196 @@
+"""
+Allocation tracking debug mode (settings.tracemalloc_enabled).
+
+Memory on our 512 MB instances creeps up under PDF load, and RSS alone
+doesn't say which code holds on to it. With tracking on, each worker runs
+tracemalloc and records:
+
+- per route and stage (every app.metrics.stage() block): how many bytes
+  the traced heap grew or shrank across the stage
+- per route: net bytes retained by a whole request
+- every tracemalloc_snapshot_every-th request: a snapshot before and after,
+  and the lines that allocated the memory the request kept, summed per route
+
+GET /admin/memory reports all of it, plus the top lines by memory grown
+since tracking started, next to RSS and gc stats.
+
+tracemalloc traces the whole process, so concurrent requests show up in
+each other's numbers. Use one worker and light traffic for clean figures.
+It also makes allocations a few times slower and keeps its own bookkeeping
+in memory - not for normal production use.
+"""
+
+import itertools
+import linecache
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import set_stage_tracker
+from app.middleware.request_context import route_label
+from app.profiler import request_route, short_path
+
+logger = get_logger(__name__)
+
+# Allocation sites kept per route (the rest are dropped from the tally)
+MAX_SITES_PER_ROUTE = 200
+
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+    # Our own tallies
+    tracemalloc.Filter(False, __file__),
+)
+
+
+def _site(frame) -> str:
+    return f"{short_path(frame.filename)}:{frame.lineno}"
+
+
+class _Totals:
+    __slots__ = ("count", "net_bytes", "max_net_bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.net_bytes = 0
+        self.max_net_bytes = 0
+
+    def add(self, net_bytes: int):
+        self.count += 1
+        self.net_bytes += net_bytes
+        self.max_net_bytes = max(self.max_net_bytes, net_bytes)
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "count": self.count,
+            "net_bytes": self.net_bytes,
+            "avg_net_bytes": self.net_bytes // self.count if self.count else 0,
+            "max_net_bytes": self.max_net_bytes,
+        }
+
+
+class AllocationTracker:
+    def __init__(self):
+        self.started_at: Optional[float] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._requests: Dict[str, _Totals] = {}
+        self._stages: Dict[Tuple[str, str], _Totals] = {}
+        self._sites: Dict[str, Counter] = {}
+        self._snapshots: Dict[str, int] = {}
+        self._counter = itertools.count(1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.started_at is not None
+
+    def start(self):
+        """Start tracemalloc and hook into stage(). Call once per worker process."""
+        if self.enabled:
+            return
+        tracemalloc.start(settings.tracemalloc_frames)
+        self._baseline = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        self.started_at = time.time()
+        set_stage_tracker(self)
+        logger.warning("Allocation tracking is on (tracemalloc, %s frames) - expect slower requests",
+                       settings.tracemalloc_frames)
+
+    # Stage hooks, called by app.metrics.stage() (also from executor threads)
+
+    def stage_started(self, name: str) -> int:
+        return tracemalloc.get_traced_memory()[0]
+
+    def stage_finished(self, name: str, before: int):
+        net = tracemalloc.get_traced_memory()[0] - before
+        key = (request_route.get() or "[background]", name)
+        totals = self._stages.get(key)
+        if totals is None:
+            totals = self._stages[key] = _Totals()
+        totals.add(net)
+
+    # Request hooks, called by AllocationTrackingMiddleware
+
+    def request_started(self) -> Tuple[int, Optional[tracemalloc.Snapshot]]:
+        snapshot = None
+        every = settings.tracemalloc_snapshot_every
+        if every and next(self._counter) % every == 0:
+            snapshot = tracemalloc.take_snapshot()
+        return tracemalloc.get_traced_memory()[0], snapshot
+
+    def request_finished(self, route: str, started: Tuple[int, Optional[tracemalloc.Snapshot]]):
+        before, snapshot = started
+        totals = self._requests.get(route)
+        if totals is None:
+            totals = self._requests[route] = _Totals()
+        totals.add(tracemalloc.get_traced_memory()[0] - before)
+        if snapshot is None:
+            return
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        sites = self._sites.setdefault(route, Counter())
+        for diff in after.compare_to(snapshot.filter_traces(_IGNORED), "lineno"):
+            if diff.size_diff:
+                sites[_site(diff.traceback[0])] += diff.size_diff
+        if len(sites) > MAX_SITES_PER_ROUTE * 2:
+            self._sites[route] = Counter(dict(sites.most_common(MAX_SITES_PER_ROUTE)))
+        self._snapshots[route] = self._snapshots.get(route, 0) + 1
+
+    def report(self, top: int) -> Dict[str, Any]:
+        """Everything for /admin/memory."""
+        if not self.enabled:
+            return {"enabled": False}
+        current, peak = tracemalloc.get_traced_memory()
+        routes: Dict[str, Any] = {}
+        for route, totals in self._requests.items():
+            routes[route] = {"requests": totals.as_dict(), "stages": {}, "snapshots": self._snapshots.get(route, 0)}
+        for (route, name), totals in self._stages.items():
+            routes.setdefault(route, {"stages": {}})["stages"][name] = totals.as_dict()
+        for route, sites in self._sites.items():
+            routes[route]["top_retaining_sites"] = [
+                {"site": site, "bytes": size} for site, size in sites.most_common(top) if size > 0
+            ]
+        growth = tracemalloc.take_snapshot().filter_traces(_IGNORED).compare_to(self._baseline, "lineno")
+        return {
+            "enabled": True,
+            "tracing_since": self.started_at,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "top_growth_since_start": [
+                {"site": _site(diff.traceback[0]), "bytes": diff.size_diff, "blocks": diff.count_diff}
+                for diff in growth[:top]
+            ],
+            "routes": routes,
+        }
+
+
+alloc_tracker = AllocationTracker()
+
+
+class AllocationTrackingMiddleware:
+    """Net traced bytes per request, and sampled before/after snapshots. Only added when tracking is on."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not alloc_tracker.enabled:
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = alloc_tracker.request_started()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            alloc_tracker.request_finished(route_label(scope, status_code), started)
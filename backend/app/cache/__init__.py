@@ -0,0 +1,220 @@
+"""
+Result caching for calculations and rendered reports.
+
+Keys are built from canonical_input_hash(), which already includes the
+calculator version, so a cached result is only ever reused for the exact same
+input.
+
+settings.cache_backends picks the backends, fastest first:
+- memory: per-process LRU (memory.py)
+- shared: one cache for all workers on the host (shared.py)
+- redis: one cache for all replicas (redis_backend.py)
+
+With more than one, lookups go through them in order and hits are copied
+into the faster ones, keeping what is left of their TTL (base.TieredBackend).
+The default is "shared"; multi-replica deployments would use "shared,redis".
+
+The helpers below are blocking. Async routes call them through cache_io(),
+which moves them to a worker thread when a lookup may go over the network.
+"""
+
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import anyio.to_thread
+
+from app.cache.base import CacheBackend, TieredBackend
+from app.config import settings
+from app.logger import get_logger
+from app.models.financial_data import PerformanceMetrics
+
+logger = get_logger(__name__)
+
+_cache: Optional[CacheBackend] = None
+_cache_pid: Optional[int] = None
+# Whether _cache has a tier behind a network round trip (see cache_io())
+_cache_remote = False
+_cache_lock = threading.Lock()
+# Set by reset_shared_cache() in the app.server parent; forked workers inherit it
+_shared_file_reset = False
+
+
+def calculation_key(input_hash: str) -> str:
+    return f"calc:{input_hash}"
+
+
+def report_key(input_hash: str, report_date: str) -> str:
+    return f"pdf:{input_hash}:{report_date}"
+
+
+def _open_shared():
+    from app.cache.shared import SharedResultCache, default_path
+    path = settings.shared_cache_path or default_path(f"janua-cache-{settings.port}")
+    private = not _shared_file_reset
+    if private:
+        # Not started by app.server (plain uvicorn, --reload, scripts), so
+        # nobody emptied the file for this run and it could hold results from
+        # older code. Use a file of our own instead, unlinked right away: the
+        # mapping keeps it alive until the process exits.
+        path = f"{path}-{os.getpid()}"
+    cache = SharedResultCache(
+        path,
+        slots=settings.shared_cache_slots,
+        slot_bytes=settings.shared_cache_slot_bytes,
+        generation=settings.app_version,
+    )
+    if private:
+        os.unlink(path)
+    return cache
+
+
+def _open_backend(name: str) -> CacheBackend:
+    if name == "memory":
+        from app.cache.memory import MemoryBackend
+        return MemoryBackend(settings.memory_cache_max_bytes)
+    if name == "shared":
+        return _open_shared()
+    if name == "redis":
+        from app.cache.redis_backend import RedisBackend
+        if not settings.redis_url:
+            raise ValueError("REDIS_URL is not set")
+        return RedisBackend.from_url(
+            settings.redis_url,
+            prefix=f"{settings.redis_key_prefix}{settings.app_version}:",
+            timeout=settings.redis_timeout,
+        )
+    raise ValueError(f"unknown cache backend '{name}'")
+
+
+def build_cache() -> Optional[CacheBackend]:
+    """The configured backends, skipping any that can't be opened here."""
+    tiers = []
+    for name in settings.cache_backends.split(","):
+        name = name.strip().lower()
+        if not name or name == "none":
+            continue
+        try:
+            tiers.append(_open_backend(name))
+        except Exception as e:
+            # Read-only /dev/shm, no fcntl on Windows, redis not installed...
+            # run without that tier rather than fail requests
+            logger.warning("Result cache backend '%s' unavailable: %s", name, e)
+    if not tiers:
+        return None
+    if len(tiers) == 1:
+        return tiers[0]
+    return TieredBackend(tiers, backfill_ttl=settings.cache_ttl_seconds or None)
+
+
+def get_cache() -> Optional[CacheBackend]:
+    """
+    This process's cache, or None when caching is off. Built lazily, and
+    again after a fork, so each worker maps the shared file and connects to
+    Redis itself (sockets and stats rows can't be shared with the parent).
+    """
+    global _cache, _cache_pid, _cache_remote
+    pid = os.getpid()
+    if _cache_pid == pid:
+        return _cache
+    with _cache_lock:
+        if _cache_pid != pid:
+            _cache = build_cache()
+            _cache_remote = _has_remote_tier(_cache)
+            _cache_pid = pid
+        return _cache
+
+
+def _has_remote_tier(cache: Optional[CacheBackend]) -> bool:
+    if cache is None:
+        return False
+    tiers = cache.tiers if isinstance(cache, TieredBackend) else [cache]
+    return any(tier.name == "redis" for tier in tiers)
+
+
+async def cache_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    func(*args, **kwargs) from an async route. With a Redis tier a lookup is a
+    network round trip (up to redis_timeout when Redis is slow), so it runs in
+    a worker thread rather than stalling the event loop; the memory and shared
+    tiers answer in microseconds and are called inline.
+    """
+    get_cache()
+    if _cache_remote:
+        return await anyio.to_thread.run_sync(functools.partial(func, *args, **kwargs))
+    return func(*args, **kwargs)
+
+
+def shared_tier() -> Optional[CacheBackend]:
+    """The shared-memory cache if it's one of the backends (for its per-worker stats)."""
+    from app.cache.shared import SharedResultCache
+    cache = get_cache()
+    tiers = cache.tiers if isinstance(cache, TieredBackend) else [cache]
+    for tier in tiers:
+        if isinstance(tier, SharedResultCache):
+            return tier
+    return None
+
+
+def reset_shared_cache():
+    """
+    Create (or empty) the shared cache file before forking, so a deploy
+    never serves old reports. Only the host-local cache is reset; Redis keys
+    carry the app version instead. The parent doesn't keep the file open, so
+    it doesn't hold a stats row.
+    """
+    global _shared_file_reset
+    names = [name.strip().lower() for name in settings.cache_backends.split(",")]
+    if "shared" not in names:
+        return
+    _shared_file_reset = True
+    try:
+        cache = _open_shared()
+    except Exception as e:
+        logger.warning("Shared result cache unavailable: %s", e)
+        return
+    cache.clear()
+    cache.close()
+
+
+def _ttl() -> Optional[float]:
+    return settings.cache_ttl_seconds or None
+
+
+def get_metrics(input_hash: str) -> Optional[PerformanceMetrics]:
+    """Cached calculate_all() result for this input, if any worker or replica computed it."""
+    cache = get_cache()
+    raw = cache.get(calculation_key(input_hash)) if cache is not None else None
+    if raw is None:
+        return None
+    return PerformanceMetrics.model_validate_json(raw)
+
+
+def put_metrics(input_hash: str, metrics: PerformanceMetrics):
+    cache = get_cache()
+    if cache is not None:
+        cache.set(calculation_key(input_hash), metrics.model_dump_json().encode("utf-8"), _ttl())
+
+
+def get_report_and_metrics(input_hash: str, report_date: str) -> Tuple[Optional[bytes], Optional[PerformanceMetrics]]:
+    """The cached PDF and calculation for this input, fetched together (one round trip to Redis)."""
+    cache = get_cache()
+    if cache is None:
+        return None, None
+    found = cache.get_many([report_key(input_hash, report_date), calculation_key(input_hash)])
+    pdf = found.get(report_key(input_hash, report_date))
+    raw_metrics = found.get(calculation_key(input_hash))
+    metrics = PerformanceMetrics.model_validate_json(raw_metrics) if raw_metrics is not None else None
+    return pdf, metrics
+
+
+def put_report_and_metrics(input_hash: str, report_date: str, pdf: bytes, metrics: Optional[PerformanceMetrics]):
+    """Store a rendered PDF, plus its calculation when that was computed too."""
+    cache = get_cache()
+    if cache is None:
+        return
+    items: Dict[str, bytes] = {report_key(input_hash, report_date): pdf}
+    if metrics is not None:
+        items[calculation_key(input_hash)] = metrics.model_dump_json().encode("utf-8")
+    cache.set_many(items, _ttl())
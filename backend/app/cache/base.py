@@ -0,0 +1,128 @@
+"""
+Interface every result cache backend implements, plus the tiered cache
+that chains several of them (e.g. the host-local shared cache in front of
+Redis).
+
+Values are bytes. Backends never raise for cache trouble: an unreachable
+server or a value that doesn't fit is a miss, and the caller recomputes.
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.metrics import CACHE_LOOKUPS
+
+
+class CacheBackend:
+    """
+    get/set for single keys, get_many/set_many for several at once (backends
+    with a network hop do those in one round trip). ttl is in seconds, None
+    means no expiry beyond the backend's own eviction.
+    """
+
+    name = "base"
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        raise NotImplementedError
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    def get_many_with_ttl(self, keys: Iterable[str]) -> Dict[str, Tuple[bytes, Optional[float]]]:
+        """Like get_many, plus each hit's remaining TTL in seconds (None: no expiry, or not known)."""
+        return {key: (value, None) for key, value in self.get_many(keys).items()}
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None):
+        for key, value in items.items():
+            self.set(key, value, ttl)
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _record(self, hits: int, misses: int):
+        if hits:
+            CACHE_LOOKUPS.inc(hits, backend=self.name, result="hit")
+        if misses:
+            CACHE_LOOKUPS.inc(misses, backend=self.name, result="miss")
+
+
+class TieredBackend(CacheBackend):
+    """
+    Looks keys up in each tier in order and copies hits back into the faster
+    tiers in front. Writes go to every tier.
+    """
+
+    name = "tiered"
+
+    def __init__(self, tiers: List[CacheBackend], backfill_ttl: Optional[float] = None):
+        self.tiers = tiers
+        # Longest a backfilled copy lives. Keys with a shorter TTL of their own
+        # (result tokens, idempotency records) keep what's left of it.
+        self.backfill_ttl = backfill_ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        missing = list(keys)
+        found: Dict[str, bytes] = {}
+        for index, tier in enumerate(self.tiers):
+            if not missing:
+                break
+            hits = tier.get_many_with_ttl(missing) if index else tier.get_many(missing)
+            if not hits:
+                continue
+            if index:
+                backfill: Dict[Optional[float], Dict[str, bytes]] = {}
+                for key, (value, remaining) in hits.items():
+                    found[key] = value
+                    backfill.setdefault(self._backfill_ttl(remaining), {})[key] = value
+                for ttl, items in backfill.items():
+                    for faster in self.tiers[:index]:
+                        faster.set_many(items, ttl)
+            else:
+                found.update(hits)
+            missing = [key for key in missing if key not in hits]
+        return found
+
+    def _backfill_ttl(self, remaining: Optional[float]) -> Optional[float]:
+        if remaining is None:
+            return self.backfill_ttl
+        if self.backfill_ttl is None:
+            return remaining
+        return min(remaining, self.backfill_ttl)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        stored = False
+        for tier in self.tiers:
+            stored = tier.set(key, value, ttl) or stored
+        return stored
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None):
+        for tier in self.tiers:
+            tier.set_many(items, ttl)
+
+    def delete(self, key: str):
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def close(self):
+        for tier in self.tiers:
+            tier.close()
@@ -0,0 +1,61 @@
+"""
+In-process result cache: an LRU dict bounded by total value size.
+For single-process runs (plain uvicorn, tests) and as the fastest tier in
+front of Redis. Each worker has its own copy.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.cache.base import CacheBackend
+
+
+class MemoryBackend(CacheBackend):
+    name = "memory"
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        # key -> (expires at (monotonic, 0 = never), value), least recently used first
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        self._record(entry is not None, entry is None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        if len(value) > self.max_bytes:
+            return False
+        expires = time.monotonic() + ttl if ttl else 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (expires, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+        return True
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
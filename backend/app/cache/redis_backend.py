@@ -0,0 +1,170 @@
+"""
+Redis-protocol result cache, shared by every replica behind the load balancer.
+Works with Redis, Valkey, KeyDB or anything else that speaks the protocol.
+
+- get_many is one MGET, set_many one pipeline, so a request pays at most one
+  round trip per direction (get_many_with_ttl pipelines a PTTL per key along
+  with the MGET, for the tiered cache's backfill)
+- values are zlib-compressed (a calculation result shrinks about 3x)
+- keys carry a prefix with the app version, so a deploy never reads entries
+  written by an older build, and every key gets a TTL
+
+Calls are blocking with a short socket timeout. After an error the backend
+stays off for `retry_after` seconds instead of making every request wait
+for the timeout again.
+
+Needs the optional `redis` package. For local testing, pass a
+`fakeredis.FakeRedis()` as the client.
+"""
+
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # optional - only needed with CACHE_BACKENDS=redis
+    redis = None
+
+from app.cache.base import CacheBackend
+from app.logger import get_logger
+from app.metrics import CACHE_LOOKUPS
+
+logger = get_logger(__name__)
+
+# First byte of every stored value
+RAW = b"r"
+ZLIB = b"z"
+COMPRESS_MIN_BYTES = 512
+
+
+def encode_value(value: bytes) -> bytes:
+    if len(value) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(value, 1)
+        if len(compressed) < len(value) * 0.9:
+            return ZLIB + compressed
+    return RAW + value
+
+
+def decode_value(stored: bytes) -> Optional[bytes]:
+    marker, body = stored[:1], stored[1:]
+    if marker == ZLIB:
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Truncated or corrupted - a miss, the caller recomputes
+            return None
+    if marker == RAW:
+        return body
+    # Not written by us - treat as a miss
+    return None
+
+
+class RedisBackend(CacheBackend):
+    name = "redis"
+
+    def __init__(self, client, prefix: str = "janua:", retry_after: float = 5.0):
+        self.client = client
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "janua:", timeout: float = 0.1, retry_after: float = 5.0):
+        if redis is None:
+            raise RuntimeError("the redis package is not installed (pip install redis)")
+        client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(client, prefix=prefix, retry_after=retry_after)
+
+    def _available(self) -> bool:
+        return time.monotonic() >= self._down_until
+
+    def _failed(self, operation: str, error: Exception):
+        CACHE_LOOKUPS.inc(backend=self.name, result="error")
+        with self._lock:
+            if not self._available():
+                return
+            self._down_until = time.monotonic() + self.retry_after
+        logger.warning("Redis cache %s failed, skipping it for %.0fs: %s", operation, self.retry_after, error)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        return {key: value for key, (value, _) in self._fetch(keys, with_ttl=False).items()}
+
+    def get_many_with_ttl(self, keys: Iterable[str]) -> Dict[str, Tuple[bytes, Optional[float]]]:
+        """MGET plus a PTTL per key, still one round trip (pipelined)."""
+        return self._fetch(keys, with_ttl=True)
+
+    def _fetch(self, keys: Iterable[str], with_ttl: bool) -> Dict[str, Tuple[bytes, Optional[float]]]:
+        keys = list(keys)
+        if not keys or not self._available():
+            return {}
+        names = [self.prefix + key for key in keys]
+        try:
+            if with_ttl:
+                pipe = self.client.pipeline(transaction=False)
+                pipe.mget(names)
+                for name in names:
+                    pipe.pttl(name)
+                stored, *ttls = pipe.execute()
+            else:
+                stored = self.client.mget(names)
+                ttls = [-1] * len(keys)
+        except Exception as e:
+            self._failed("get", e)
+            return {}
+        found = {}
+        for key, raw, pttl in zip(keys, stored, ttls):
+            value = decode_value(raw) if raw is not None else None
+            # PTTL is -1 for no expiry, -2 (or 0) if it expired since the MGET
+            if value is None or (pttl != -1 and pttl <= 0):
+                continue
+            found[key] = (value, pttl / 1000 if pttl > 0 else None)
+        self._record(len(found), len(keys) - len(found))
+        return found
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        return self.set_many({key: value}, ttl)
+
+    def set_many(self, items: Dict[str, bytes], ttl: Optional[float] = None) -> bool:
+        if not items or not self._available():
+            return False
+        px = int(ttl * 1000) if ttl else None
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipe.set(self.prefix + key, encode_value(value), px=px)
+            pipe.execute()
+        except Exception as e:
+            self._failed("set", e)
+            return False
+        return True
+
+    def delete(self, key: str):
+        if not self._available():
+            return
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            self._failed("delete", e)
+
+    def clear(self):
+        """Delete every key under our prefix (SCAN, not FLUSHDB - the server may be shared)."""
+        try:
+            batch = []
+            for key in self.client.scan_iter(match=self.prefix + "*", count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception as e:
+            self._failed("clear", e)
+
+    def close(self):
+        try:
+            self.client.close()
+        except Exception:
+            pass
@@ -0,0 +1,358 @@
+"""
+Host-local result cache shared by all workers on the machine.
+
+A fixed-size hash table in an mmap'd file (in /dev/shm when it exists, so it
+never touches the disk). Every worker maps the same file, so a result
+computed by one worker is a hit for all of them - a per-process cache would
+see its hit rate divided by the worker count.
+
+Layout:
+
+    header | worker stats rows | slots
+
+Slots are grouped in sets of WAYS. A key (hashed to 16 bytes) can only live
+in one set, and a full set evicts its least recently used slot, so eviction is
+LRU-ish per set rather than global.
+
+Each slot starts with a sequence number (a seqlock). Writers take a short
+fcntl lock on the set, make the sequence odd, write, then make it even again.
+Readers take no lock: they read the sequence, copy the slot, and read the
+sequence again. If it changed, or was odd, or the CRC doesn't match, the read
+is retried and eventually counted as a miss. A miss only costs a recompute.
+
+Entries can carry an expiry time; expired slots read as misses and are the
+first to be reused.
+
+Hit/miss counters live in the file too, one row per worker pid, so any worker
+can report all of them on /metrics.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows - the shared cache is Linux/macOS only
+    fcntl = None
+
+from app.cache.base import CacheBackend
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"JANUASC2"
+# magic, slot count, slot size, ways, generation
+HEADER = struct.Struct("<8sIIIQ")
+HEADER_SIZE = 64
+
+# pid, hits, misses, stores, evictions, too_large
+STATS_ROW = struct.Struct("<6Q")
+STATS_FIELDS = ("hits", "misses", "stores", "evictions", "too_large")
+MAX_WORKERS = 64
+
+# sequence, last used (ns), expires (ns, 0 = never), key, value length, crc32, flags
+SLOT_HEADER = struct.Struct("<QQQ16sIII")
+SLOT_HEADER_SIZE = 64
+SEQ = struct.Struct("<Q")
+
+WAYS = 4
+READ_ATTEMPTS = 3
+FLAG_ZLIB = 1
+# Values smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 512
+EMPTY_KEY = bytes(16)
+
+
+def default_path(name: str) -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, name)
+
+
+def hash_key(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class SharedResultCache(CacheBackend):
+    """
+    Fixed-slot cache in a shared mmap. Safe to use from several processes and
+    threads at once. Values bigger than slot_bytes - 64 (after compression)
+    are not cached.
+
+    Open it in each process after forking (see get_cache() in app.cache),
+    so every worker gets its own stats row.
+    """
+
+    name = "shared"
+
+    def __init__(self, path: str, slots: int, slot_bytes: int, generation: str = ""):
+        if slots < WAYS or slot_bytes <= SLOT_HEADER_SIZE:
+            raise ValueError("shared cache needs at least %s slots of more than %s bytes" % (WAYS, SLOT_HEADER_SIZE))
+        self.path = path
+        self.sets = slots // WAYS
+        self.slots = self.sets * WAYS
+        self.slot_bytes = slot_bytes
+        self.capacity = slot_bytes - SLOT_HEADER_SIZE
+        self.generation = int.from_bytes(hashlib.blake2b(generation.encode("utf-8"), digest_size=8).digest(), "little")
+        self.pid = os.getpid()
+
+        self._stats_offset = HEADER_SIZE
+        self._slots_offset = HEADER_SIZE + MAX_WORKERS * STATS_ROW.size
+        self.size = self._slots_offset + self.slots * slot_bytes
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._thread_lock = threading.Lock()
+        self._lock_range(0, HEADER_SIZE)
+        try:
+            if os.fstat(self._fd).st_size != self.size or not self._header_matches():
+                # New file, or one left by a different layout or app version
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                self._mm = mmap.mmap(self._fd, self.size)
+                self._mm[:HEADER_SIZE] = HEADER.pack(MAGIC, self.slots, slot_bytes, WAYS, self.generation).ljust(HEADER_SIZE, b"\0")
+            else:
+                self._mm = mmap.mmap(self._fd, self.size)
+        finally:
+            self._unlock_range(0, HEADER_SIZE)
+
+        self._local = dict.fromkeys(STATS_FIELDS, 0)
+        self._stats_row = self._claim_stats_row()
+
+    # -- locking -------------------------------------------------------------
+
+    def _lock_range(self, start: int, length: int):
+        # fcntl locks are per process, so threads of one worker also need
+        # the thread lock to keep out of each other's way
+        self._thread_lock.acquire()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, start)
+
+    def _unlock_range(self, start: int, length: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start)
+        self._thread_lock.release()
+
+    def _header_matches(self) -> bool:
+        with open(self.path, "rb") as handle:
+            raw = handle.read(HEADER.size)
+        if len(raw) < HEADER.size:
+            return False
+        return HEADER.unpack(raw) == (MAGIC, self.slots, self.slot_bytes, WAYS, self.generation)
+
+    # -- stats ---------------------------------------------------------------
+
+    def _claim_stats_row(self) -> Optional[int]:
+        """A stats row for this pid: a free one, or one left by a dead worker."""
+        length = MAX_WORKERS * STATS_ROW.size
+        self._lock_range(self._stats_offset, length)
+        try:
+            free = None
+            for row in range(MAX_WORKERS):
+                offset = self._stats_offset + row * STATS_ROW.size
+                pid = STATS_ROW.unpack_from(self._mm, offset)[0]
+                if pid == self.pid:
+                    free = row
+                    break
+                if free is None and (pid == 0 or not _pid_alive(pid)):
+                    free = row
+            if free is not None:
+                STATS_ROW.pack_into(self._mm, self._stats_offset + free * STATS_ROW.size, self.pid, 0, 0, 0, 0, 0)
+            return free
+        finally:
+            self._unlock_range(self._stats_offset, length)
+
+    def _count(self, field: str):
+        self._local[field] += 1
+        if self._stats_row is not None:
+            # Only this process writes its row, so no lock needed
+            offset = self._stats_offset + self._stats_row * STATS_ROW.size + 8 * (1 + STATS_FIELDS.index(field))
+            SEQ.pack_into(self._mm, offset, self._local[field])
+
+    def worker_stats(self) -> Dict[int, Dict[str, int]]:
+        """{pid: {"hits": ..., "misses": ...}} for every worker that used the cache and is still alive."""
+        stats = {}
+        for row in range(MAX_WORKERS):
+            pid, *values = STATS_ROW.unpack_from(self._mm, self._stats_offset + row * STATS_ROW.size)
+            if pid and (pid == self.pid or _pid_alive(pid)):
+                stats[pid] = dict(zip(STATS_FIELDS, values))
+        return stats
+
+    def used_slots(self) -> int:
+        return sum(
+            1 for slot in range(self.slots)
+            if SLOT_HEADER.unpack_from(self._mm, self._slot_offset(slot))[3] != EMPTY_KEY
+        )
+
+    # -- get / set -----------------------------------------------------------
+
+    def _slot_offset(self, slot: int) -> int:
+        return self._slots_offset + slot * self.slot_bytes
+
+    def _set_of(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "little") % self.sets
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._lookup(key)
+        return entry[0] if entry is not None else None
+
+    def get_many_with_ttl(self, keys: Iterable[str]) -> Dict[str, Tuple[bytes, Optional[float]]]:
+        found = {}
+        now = time.time_ns()
+        for key in keys:
+            entry = self._lookup(key)
+            if entry is not None:
+                value, expires = entry
+                found[key] = (value, max(expires - now, 1) / 1e9 if expires else None)
+        return found
+
+    def _lookup(self, key: str) -> Optional[Tuple[bytes, int]]:
+        entry = self._get(key)
+        if entry is None:
+            self._count("misses")
+            self._record(0, 1)
+        else:
+            self._count("hits")
+            self._record(1, 0)
+        return entry
+
+    def _get(self, key: str) -> Optional[Tuple[bytes, int]]:
+        """(value, expires in ns or 0) if the key is here."""
+        digest = hash_key(key)
+        first = self._set_of(digest) * WAYS
+        mm = self._mm
+        for slot in range(first, first + WAYS):
+            offset = self._slot_offset(slot)
+            for _ in range(READ_ATTEMPTS):
+                seq, _, expires, slot_key, length, crc, flags = SLOT_HEADER.unpack_from(mm, offset)
+                if seq & 1:
+                    # Being written right now
+                    time.sleep(0)
+                    continue
+                if slot_key != digest:
+                    break
+                if expires and expires < time.time_ns():
+                    return None
+                start = offset + SLOT_HEADER_SIZE
+                value = mm[start:start + min(length, self.capacity)]
+                if SEQ.unpack_from(mm, offset)[0] != seq or zlib.crc32(value) != crc:
+                    continue
+                # Racy on purpose: a lost update only makes eviction a bit less exact
+                SEQ.pack_into(mm, offset + 8, time.time_ns())
+                return (zlib.decompress(value) if flags & FLAG_ZLIB else value), expires
+            # Kept changing under us - the key may still be in another way
+        return None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> bool:
+        """Store `value`, replacing the set's least recently used slot if needed. False if too large."""
+        flags = 0
+        if len(value) >= COMPRESS_MIN_BYTES:
+            compressed = zlib.compress(value, 1)
+            if len(compressed) < len(value) * 0.9:
+                value, flags = compressed, FLAG_ZLIB
+        if len(value) > self.capacity:
+            self._count("too_large")
+            return False
+
+        digest = hash_key(key)
+        first = self._set_of(digest) * WAYS
+        start = self._slot_offset(first)
+        mm = self._mm
+        now = time.time_ns()
+        expires = now + int(ttl * 1e9) if ttl else 0
+        self._lock_range(start, WAYS * self.slot_bytes)
+        try:
+            target = None
+            oldest = None
+            for slot in range(first, first + WAYS):
+                _, last_used, slot_expires, slot_key, _, _, _ = SLOT_HEADER.unpack_from(mm, self._slot_offset(slot))
+                if slot_key == digest or slot_key == EMPTY_KEY:
+                    target = slot
+                    break
+                if slot_expires and slot_expires < now:
+                    # Expired entries go before live ones
+                    last_used = 0
+                if oldest is None or last_used < oldest[0]:
+                    oldest = (last_used, slot)
+            if target is None:
+                target = oldest[1]
+                if oldest[0]:
+                    self._count("evictions")
+
+            offset = self._slot_offset(target)
+            seq = SEQ.unpack_from(mm, offset)[0]
+            # Odd if a worker died mid-write; it's ours to overwrite now
+            seq += seq & 1
+            SEQ.pack_into(mm, offset, seq + 1)
+            body = offset + SLOT_HEADER_SIZE
+            mm[body:body + len(value)] = value
+            SLOT_HEADER.pack_into(mm, offset, seq + 1, now, expires, digest, len(value), zlib.crc32(value), flags)
+            SEQ.pack_into(mm, offset, seq + 2)
+        finally:
+            self._unlock_range(start, WAYS * self.slot_bytes)
+        self._count("stores")
+        return True
+
+    def clear(self):
+        """Empty every slot (stats rows are kept)."""
+        length = self.slots * self.slot_bytes
+        self._lock_range(self._slots_offset, length)
+        try:
+            for slot in range(self.slots):
+                offset = self._slot_offset(slot)
+                seq = SEQ.unpack_from(self._mm, offset)[0]
+                # Keep the sequence moving so in-flight readers notice
+                SLOT_HEADER.pack_into(self._mm, offset, seq + 2 + (seq & 1), 0, 0, EMPTY_KEY, 0, 0, 0)
+        finally:
+            self._unlock_range(self._slots_offset, length)
+
+    def delete(self, key: str):
+        digest = hash_key(key)
+        first = self._set_of(digest) * WAYS
+        start = self._slot_offset(first)
+        self._lock_range(start, WAYS * self.slot_bytes)
+        try:
+            for slot in range(first, first + WAYS):
+                offset = self._slot_offset(slot)
+                seq, _, _, slot_key, _, _, _ = SLOT_HEADER.unpack_from(self._mm, offset)
+                if slot_key == digest:
+                    SLOT_HEADER.pack_into(self._mm, offset, seq + 2 + (seq & 1), 0, 0, EMPTY_KEY, 0, 0, 0)
+        finally:
+            self._unlock_range(start, WAYS * self.slot_bytes)
+
+    def close(self):
+        if self._stats_row is not None:
+            # Hand the stats row back
+            STATS_ROW.pack_into(self._mm, self._stats_offset + self._stats_row * STATS_ROW.size, 0, 0, 0, 0, 0, 0)
+            self._stats_row = None
+        self._mm.close()
+        os.close(self._fd)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def stats_lines(cache: SharedResultCache) -> List[str]:
+    """Prometheus lines with every worker's counters, labelled by pid."""
+    stats = cache.worker_stats()
+    lines = []
+    for field in STATS_FIELDS:
+        metric = f"janua_shared_cache_{field}_total"
+        lines.append(f"# HELP {metric} Shared result cache {field.replace('_', ' ')}, per worker")
+        lines.append(f"# TYPE {metric} counter")
+        for pid, row in sorted(stats.items()):
+            lines.append(f'{metric}{{worker="{pid}"}} {row[field]}')
+    lines.append("# HELP janua_shared_cache_slots Slots in the shared result cache")
+    lines.append("# TYPE janua_shared_cache_slots gauge")
+    lines.append(f"janua_shared_cache_slots {cache.slots}")
+    return lines
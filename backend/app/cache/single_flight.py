@@ -0,0 +1,93 @@
+"""
+Single-flight request coalescing.
+
+A double-click on "Gerar PDF" or a client retry sends the same input twice
+while the first render is still running. The result cache doesn't help - it
+only has the result once the render is done. Here the first request (the
+leader) starts the work, and identical requests that arrive while it runs
+await the same future instead of starting their own.
+
+The work runs on the scheduler's executor (app.scheduler) as its own task,
+so a leader whose client disconnects doesn't cancel it for the followers.
+Once every request waiting for it is gone, the work is cancelled (see
+app.utils.deadlines). Errors reach everyone - same input, same error.
+
+Per worker process; across workers and replicas the result cache covers it.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict
+
+from app.metrics import REGISTRY, stage
+from app.scheduler import INTERACTIVE, scheduler
+from app.utils.deadlines import Deadline, detached_context
+
+SINGLE_FLIGHT = REGISTRY.counter(
+    "janua_single_flight_total",
+    "Calculations/renders by operation; role=leader ran the work, role=coalesced waited for a leader",
+    ("operation", "role"),
+)
+
+
+class _Flight:
+    __slots__ = ("task", "deadline", "waiters")
+
+    def __init__(self, task: asyncio.Future, deadline: Deadline):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight: Dict[str, _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    async def run(self, operation: str, key: str, func: Callable[..., Any], *args,
+                  priority: int = INTERACTIVE) -> Any:
+        """
+        func(*args) on the scheduler at `priority`, unless the same `key` is
+        already running - then wait for that one. Keys must identify the
+        result completely (operation + canonical input hash).
+        """
+        key = f"{operation}:{key}"
+        flight = self._in_flight.get(key)
+        if flight is not None and flight.deadline.reason is None:
+            SINGLE_FLIGHT.inc(operation=operation, role="coalesced")
+            with stage("coalesced_wait"):
+                return await self._wait(flight)
+
+        SINGLE_FLIGHT.inc(operation=operation, role="leader")
+        # The work outlives any one request, so it gets its own deadline
+        deadline = Deadline()
+        task = asyncio.get_running_loop().create_task(
+            scheduler.run(priority, func, *args), context=detached_context(deadline)
+        )
+        flight = self._in_flight[key] = _Flight(task, deadline)
+        task.add_done_callback(lambda done: self._finished(key, flight))
+        return await self._wait(flight)
+
+    @staticmethod
+    async def _wait(flight: _Flight) -> Any:
+        flight.waiters += 1
+        try:
+            # shield: a waiter giving up must not cancel the shared work...
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                # ...unless it was the last one
+                flight.deadline.cancel("abandoned")
+                flight.task.cancel()
+
+    def _finished(self, key: str, flight: _Flight):
+        if self._in_flight.get(key) is flight:
+            del self._in_flight[key]
+        if not flight.task.cancelled():
+            # Mark the error as retrieved even if every caller went away
+            flight.task.exception()
+
+
+single_flight = SingleFlight()
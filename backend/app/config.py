@@ -14,6 +14,7 @@ class Settings(BaseSettings):
     """
     
     # API Settings
+    environment: str = "development"  # development, staging, production
     app_name: str = "JANUA Financial Analysis API"
     app_version: str = "1.0.0"
     api_prefix: str = "/api"
@@ -37,9 +38,163 @@ class Settings(BaseSettings):
     # Calculation Settings
     trend_threshold: float = 0.05  # 5% change triggers trend arrow
     
+    # HTTP caching
+    # Calculation results must be revalidated (If-None-Match) on every poll.
+    # Reports hold company data, so they're private by default - switch to
+    # "public, max-age=..." if a shared cache in front of the API should keep them.
+    calculation_cache_control: str = "private, no-cache"
+    report_cache_control: str = "private, max-age=3600"
+    
+    # Response compression
+    compression_enabled: bool = True
+    compression_minimum_size: int = 1024  # bytes - smaller responses go out as-is
+    gzip_level: int = 6  # 1 (fastest) to 9 (smallest)
+    brotli_quality: int = 4  # 0 (fastest) to 11 (smallest)
+    
+    # Calculator profiling
+    # Outside production, send "X-Calculator-Profile: json" (or "table") to get
+    # per-metric call counts and timings in the response. In production only
+    # this fraction of requests is profiled, and the result goes to the log.
+    calculator_profile_sample_rate: float = 0.0
+    
+    # Server (python -m app.server)
+    # The parent imports and warms the app once, then forks the workers, which
+    # share its memory copy-on-write. Workers are replaced after
+    # worker_max_requests requests (plus up to worker_max_requests_jitter,
+    # so they don't all restart at once) or once their RSS goes over
+    # worker_max_memory_mb - reportlab grows over time. 0 disables either limit.
+    host: str = "0.0.0.0"
+    port: int = 8000  # PORT on Railway
+    workers: int = 0  # 0 = one per available CPU
+    worker_max_requests: int = 0
+    worker_max_requests_jitter: int = 0
+    worker_max_memory_mb: int = 0
+    graceful_timeout: float = 30.0  # seconds a worker gets to finish in-flight requests
+    
+    # Result cache
+    # Calculation results and rendered PDFs, keyed by the input hash.
+    # cache_backends lists the tiers, fastest first: "memory" (per process),
+    # "shared" (all workers on the host), "redis" (all replicas). Use
+    # "shared,redis" with several replicas; empty turns caching off.
+    cache_backends: str = "shared"
+    cache_ttl_seconds: int = 86400  # 0 = no expiry
+    # "shared" is a memory-mapped file (in /dev/shm by default). Memory use is
+    # at most slots * slot_bytes; PDFs larger than a slot aren't cached.
+    # python -m app.server empties it at startup; other ways of running the
+    # app get a private, unlinked file per process (<path>-<pid>).
+    shared_cache_path: str = ""  # empty = /dev/shm/janua-cache-<port>
+    shared_cache_slots: int = 2048
+    shared_cache_slot_bytes: int = 24576
+    memory_cache_max_bytes: int = 32_000_000
+    # "redis" needs the redis package. Keys get the app version appended to
+    # the prefix, so a deploy never reads an older build's entries.
+    redis_url: str = ""  # e.g. redis://cache.internal:6379/0
+    redis_key_prefix: str = "janua:"
+    redis_timeout: float = 0.1  # seconds; a slow cache is skipped, not waited on
+    # How long a response is kept for replay to a retry with the same
+    # Idempotency-Key (stored in the result cache above)
+    idempotency_ttl_seconds: int = 86400
+    # How long a /api/calculate result token stays usable for /api/generate-pdf
+    result_token_ttl_seconds: int = 3600
+    
+    # Rate limiting (per worker process)
+    # Clients (X-API-Key, or IP) get a token bucket per route class: "cheap"
+    # (calculations) and "expensive" (PDFs, batches). Past the bucket, each
+    # class runs at most *_max_active requests at once; the rest queue per
+    # client and are let in round-robin across clients.
+    # Only keys listed in rate_limit_api_keys (comma-separated) get their own
+    # bucket; other requests are counted by IP. Turn on
+    # rate_limit_trust_forwarded_for only behind a proxy that appends to
+    # X-Forwarded-For (Railway, Render), and set rate_limit_trusted_proxy_hops
+    # to the number of such proxies - otherwise clients choose their own IP.
+    rate_limit_enabled: bool = True
+    rate_limit_api_keys: str = ""
+    rate_limit_trust_forwarded_for: bool = False
+    rate_limit_trusted_proxy_hops: int = 1
+    rate_limit_cheap_paths: str = "/api/calculate"
+    rate_limit_expensive_paths: str = "/api/generate-pdf,/api/calculate-batch"
+    rate_limit_cheap_per_minute: float = 120
+    rate_limit_cheap_burst: float = 30
+    rate_limit_expensive_per_minute: float = 20
+    rate_limit_expensive_burst: float = 6
+    rate_limit_cheap_max_active: int = 8
+    rate_limit_expensive_max_active: int = 2
+    rate_limit_max_queued_per_client: int = 20
+    
+    # Speculative PDF rendering
+    # After a successful /api/calculate, render its PDF into the result cache
+    # in the background so the download that usually follows is instant. Jobs
+    # only start while at most speculative_max_in_flight requests are running
+    # and no interactive work is waiting; older jobs are dropped.
+    speculative_pdf_enabled: bool = False
+    speculative_max_in_flight: int = 1
+    speculative_queue_size: int = 32
+    speculative_max_age_seconds: float = 30.0
+    
+    # Request deadlines
+    # /api/calculate and /api/generate-pdf give up with a 504 once a request
+    # has run this long, counting from when it arrived. Clients can send
+    # X-Request-Timeout (seconds) for a different budget, up to the max.
+    # Work for clients that disconnect is always cancelled. 0 = no deadline.
+    request_deadline_seconds: float = 30.0
+    request_deadline_max_seconds: float = 120.0
+    
+    # Scheduler (app/scheduler.py)
+    # Calculations and renders run on scheduler_workers threads, in priority
+    # order: interactive requests, then background (speculative PDFs), then
+    # bulk (batch chunks). Background and bulk never use the last
+    # scheduler_reserved_interactive threads, and bulk concurrency shrinks
+    # while the interactive p99 (over the last scheduler_latency_window jobs)
+    # is over budget.
+    scheduler_workers: int = 4
+    scheduler_reserved_interactive: int = 1
+    scheduler_background_max_active: int = 1
+    scheduler_interactive_p99_budget_ms: float = 250.0
+    scheduler_latency_window: int = 200
+    # /api/calculate-batch
+    batch_max_companies: int = 1000
+    batch_chunk_size: int = 20  # companies per bulk job; interactive work gets in between chunks
+    batch_idempotency_max_bytes: int = 1_000_000  # larger batch responses aren't kept for replay
+    
+    # Saturation (app/saturation.py)
+    # The event loop is sampled every loop_lag_interval_ms; lag is how late
+    # the sampler wakes up. /ready returns 503 while the p99 lag over the last
+    # loop_lag_window samples is over ready_max_loop_lag_ms, or while more
+    # than ready_max_queue_depth interactive jobs wait for a thread. 0
+    # disables a check.
+    loop_lag_interval_ms: float = 100.0
+    loop_lag_window: int = 100  # samples, i.e. the last 10 seconds
+    ready_max_loop_lag_ms: float = 500.0
+    ready_max_queue_depth: int = 20
+    
+    # Admin endpoints (/admin/profile, /admin/memory)
+    # Off while admin_token is empty; otherwise send it as X-Admin-Token.
+    admin_token: str = ""
+    profile_max_seconds: float = 60.0
+    
+    # Allocation tracking (app/alloc_tracking.py) - debug only
+    # Runs tracemalloc and reports, on /admin/memory, how much memory each
+    # route and stage keeps and which lines allocated it. Every
+    # tracemalloc_snapshot_every-th request is snapshotted before and after
+    # (0 = never). Slows allocations down a lot.
+    tracemalloc_enabled: bool = False
+    tracemalloc_frames: int = 5
+    tracemalloc_snapshot_every: int = 10
+    
+    # Startup warmup
+    # Run one synthetic calculation and PDF render at startup so the first real
+    # request doesn't pay for lazy loading. /ready returns 503 until it's done.
+    warmup_enabled: bool = True
+    
     # Logging
     log_level: str = "INFO"  # DEBUG, INFO, WARNING, ERROR
     log_file: str = "logs/api.log"
+    log_max_bytes: int = 10_000_000  # rotate the log file at 10 MB
+    log_backup_count: int = 5
+    log_json: bool = False  # one JSON object per line instead of plain text
+    # Keep only a fraction of INFO lines from noisy loggers, e.g.
+    # "app.main=0.1,app.routes.analysis=0.5". Warnings and errors are never dropped.
+    log_sample_rates: str = ""
     
     # Validation Thresholds
     # These prevent obviously wrong data from being processed
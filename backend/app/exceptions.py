@@ -40,3 +40,21 @@ class BalanceSheetError(HTTPException):
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail=detail
         )
+
+
+class RequestCancelled(HTTPException):
+    """
+    Raised when we stop working on a request: the client disconnected, or it
+    ran past its deadline. `reason` is "disconnect", "deadline" or
+    "abandoned" (shared work nobody is waiting for any more).
+    Nobody reads the 499 - it's for the access log and metrics.
+    """
+    def __init__(self, reason: str):
+        self.reason = reason
+        if reason == "deadline":
+            super().__init__(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="ERRO: O pedido demorou demasiado tempo a processar. Tente novamente dentro de momentos."
+            )
+        else:
+            super().__init__(status_code=499, detail="Pedido cancelado.")
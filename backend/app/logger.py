@@ -1,31 +1,154 @@
 """
 Logging setup for the application.
 Creates proper log files and console output without the annoying emoji spam.
+
+Log calls only put the record on a queue; a background thread does the
+formatting and the actual writes. That way a slow disk or a blocked stdout
+pipe never stalls the event loop.
+
+Under the pre-fork server every worker appends to the same log file, but only
+the parent rotates it (rotate_log_file(), from its supervise loop). Workers
+use a WatchedFileHandler, which reopens the file once the parent has renamed
+it, so no process keeps writing into a rotated file or rotates it again.
 """
 
+import atexit
+import json
 import logging
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, WatchedFileHandler
 from pathlib import Path
 from datetime import datetime
+from typing import Dict, Optional
+
+
+# The background listener, kept so we can flush it on shutdown
+_listener: Optional[QueueListener] = None
+# The log file handler, for rotate_log_file()
+_file_handler: Optional[logging.FileHandler] = None
+# Arguments of the last setup_logging() call, to redo it after a fork
+_config: Dict[str, object] = {}
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+    The stock handler calls format() before enqueueing, which is exactly the
+    work we're trying to move off the request path. Records never leave the
+    process, so there's no need to make them picklable.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of INFO-and-below records from chatty loggers.
+    `rates` maps logger name prefixes to the fraction to keep (0.1 = 1 in 10).
+    Warnings and errors always go through.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix first so "app.routes.analysis" beats "app"
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+        self._counters: Dict[str, int] = {}
+
+    def _rate_for(self, name: str) -> Optional[tuple]:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return prefix, rate
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO:
+            return True
+        match = self._rate_for(record.name)
+        if match is None:
+            return True
+        prefix, rate = match
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        # Counter-based instead of random: cheap and evenly spaced. Keeps a
+        # record each time count * rate reaches the next whole number, so
+        # 0.4 keeps 2 in 5 (not 1 in round(1 / 0.4) = 2)
+        count = self._counters.get(prefix, 0) + 1
+        self._counters[prefix] = count
+        return int(count * rate) > int((count - 1) * rate)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log shippers."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse "app.main=0.1,app.routes.analysis=0.5" into a dict.
+    Bad entries are skipped rather than stopping the app from starting.
+    """
+    rates = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        name, _, value = item.partition("=")
+        try:
+            rates[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return rates
 
 
-def setup_logging(log_level: str = "INFO", log_file: str = "logs/api.log"):
+def setup_logging(
+    log_level: str = "INFO",
+    log_file: str = "logs/api.log",
+    max_bytes: int = 10_000_000,
+    backup_count: int = 5,
+    json_format: bool = False,
+    sample_rates: Optional[Dict[str, float]] = None,
+    rotate: bool = True,
+):
     """
     Configure logging for the entire application.
-    Logs go to both console and file for easy debugging.
+    Logs go to both console and file for easy debugging. The file rotates
+    once it reaches `max_bytes`, keeping `backup_count` old files. With
+    rotate=False the file is only reopened when another process rotated it.
     """
-    
+    global _listener, _file_handler
+    _config.update(
+        log_level=log_level, log_file=log_file, max_bytes=max_bytes,
+        backup_count=backup_count, json_format=json_format, sample_rates=sample_rates,
+        rotate=rotate,
+    )
+
     # Create logs directory if it doesn't exist
     log_path = Path(log_file)
     log_path.parent.mkdir(parents=True, exist_ok=True)
-    
+
     # Set up the root logger
     logger = logging.getLogger()
     logger.setLevel(getattr(logging, log_level.upper()))
-    
+
     # Clear any existing handlers (prevents duplicate logs)
     logger.handlers.clear()
-    
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
     # Console handler - shows logs in terminal
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(logging.INFO)
@@ -34,23 +157,75 @@ def setup_logging(log_level: str = "INFO", log_file: str = "logs/api.log"):
         datefmt='%H:%M:%S'
     )
     console_handler.setFormatter(console_format)
-    
+
     # File handler - saves everything to file for later review
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    if rotate:
+        file_handler = RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+    else:
+        file_handler = WatchedFileHandler(log_file, encoding='utf-8')
+    _file_handler = file_handler
     file_handler.setLevel(logging.DEBUG)
     file_format = logging.Formatter(
         '[%(asctime)s] %(levelname)s - %(name)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     file_handler.setFormatter(file_format)
-    
-    # Add both handlers
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
-    
+
+    if json_format:
+        console_handler.setFormatter(JsonFormatter())
+        file_handler.setFormatter(JsonFormatter())
+
+    # Both handlers run on the listener thread; callers only enqueue
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if sample_rates:
+        queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+
+    logger.addHandler(queue_handler)
+
     return logger
 
 
+def shutdown_logging():
+    """Flush whatever is still queued and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def restart_logging_after_fork():
+    """
+    Call first thing in a forked child. The listener thread doesn't survive
+    fork(), so records would pile up in the queue and never be written.
+    This sets everything up again with the same arguments, except that the
+    file is left for the parent to rotate.
+    """
+    if _config:
+        setup_logging(**{**_config, "rotate": False})
+
+
+def rotate_log_file():
+    """Rotate the log file if it's over max_bytes. The pre-fork parent calls this for all workers."""
+    handler = _file_handler
+    if not isinstance(handler, RotatingFileHandler):
+        return
+    handler.acquire()
+    try:
+        if handler.shouldRollover(logging.makeLogRecord({"msg": ""})):
+            handler.doRollover()
+    finally:
+        handler.release()
+
+
+atexit.register(shutdown_logging)
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     Get a logger for a specific module.
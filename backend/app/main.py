@@ -1,14 +1,28 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from app.routes import analysis
+from app.routes import analysis, monitoring
 from app.config import settings
-from app.logger import setup_logging, get_logger
+from app.logger import setup_logging, get_logger, shutdown_logging, parse_sample_rates
 from app.exceptions import ValidationError, BalanceSheetError, CalculationError
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.rate_limit import RateLimitMiddleware
+from app.middleware.request_context import RequestContextMiddleware
+from app.alloc_tracking import AllocationTrackingMiddleware, alloc_tracker
+from app.saturation import loop_monitor, queue_depths, saturation_reasons
+from app.warmup import warmup_state, run_warmup_in_background
+import asyncio
 import time
 
 # Set up logging first thing
-setup_logging(log_level=settings.log_level, log_file=settings.log_file)
+setup_logging(
+    log_level=settings.log_level,
+    log_file=settings.log_file,
+    max_bytes=settings.log_max_bytes,
+    backup_count=settings.log_backup_count,
+    json_format=settings.log_json,
+    sample_rates=parse_sample_rates(settings.log_sample_rates),
+)
 logger = get_logger(__name__)
 
 app = FastAPI(
@@ -29,6 +43,15 @@ class UTF8JSONResponse(JSONResponse):
 
 app.default_response_class = UTF8JSONResponse
 
+# Allocation tracking debug mode. Innermost, so rate limit queueing doesn't
+# count as the request's memory.
+if settings.tracemalloc_enabled:
+    app.add_middleware(AllocationTrackingMiddleware)
+
+# Per-client rate limits and fair queuing. Inside CORS so 429s still carry
+# the CORS headers the browser needs to read them.
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -36,47 +59,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Metrics-Schema", "Content-Disposition", "Server-Timing", "Idempotent-Replayed", "X-Result-Token", "Retry-After"],
 )
 
-
-# Character encoding middleware
-@app.middleware("http")
-async def add_charset_header(request: Request, call_next):
-    """Ensure proper UTF-8 encoding for all responses."""
-    response = await call_next(request)
-    
-    # Add UTF-8 charset to content-type header only for JSON responses
-    content_type = response.headers.get("content-type", "")
-    if "application/json" in content_type and "charset" not in content_type:
-        response.headers["content-type"] = "application/json; charset=utf-8"
-    
-    return response
-
-
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    """Log every request that comes in, with timing information."""
-    start_time = time.time()
-    
-    logger.info(f"Request started: {request.method} {request.url.path}")
-    
-    response = await call_next(request)
-    
-    duration = time.time() - start_time
-    logger.info(
-        f"Request completed: {request.method} {request.url.path} "
-        f"- Status: {response.status_code} - Duration: {duration:.3f}s"
+# Compress responses (gzip/brotli). The OpenAPI schema never changes while
+# running, so it's compressed once and cached.
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_minimum_size,
+        gzip_level=settings.gzip_level,
+        brotli_quality=settings.brotli_quality,
+        cached_paths=["/openapi.json"],
     )
-    
-    return response
+
+# Request logging, metrics, JSON charset fix and Server-Timing. Added last so
+# it's the outermost layer and its timing covers CORS and compression too.
+app.add_middleware(RequestContextMiddleware)
 
 
 # Global exception handlers
 @app.exception_handler(ValidationError)
 async def validation_error_handler(request: Request, exc: ValidationError):
     """Handle validation errors with proper error response."""
-    logger.warning(f"Validation error: {exc.detail}")
+    logger.warning("Validation error: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "type": "validation_error"}
@@ -86,7 +92,7 @@ async def validation_error_handler(request: Request, exc: ValidationError):
 @app.exception_handler(BalanceSheetError)
 async def balance_sheet_error_handler(request: Request, exc: BalanceSheetError):
     """Handle balance sheet errors."""
-    logger.warning(f"Balance sheet error: {exc.detail}")
+    logger.warning("Balance sheet error: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "type": "balance_sheet_error"}
@@ -96,7 +102,7 @@ async def balance_sheet_error_handler(request: Request, exc: BalanceSheetError):
 @app.exception_handler(CalculationError)
 async def calculation_error_handler(request: Request, exc: CalculationError):
     """Handle calculation errors."""
-    logger.error(f"Calculation error: {exc.detail}")
+    logger.error("Calculation error: %s", exc.detail)
     return JSONResponse(
         status_code=exc.status_code,
         content={"error": exc.detail, "type": "calculation_error"}
@@ -106,7 +112,7 @@ async def calculation_error_handler(request: Request, exc: CalculationError):
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Catch any other unexpected errors."""
-    logger.error(f"Unexpected error: {str(exc)}", exc_info=True)
+    logger.error("Unexpected error: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={
@@ -120,19 +126,34 @@ async def general_exception_handler(request: Request, exc: Exception):
 async def startup_event():
     """Run when the API starts up."""
     import os
-    logger.info(f"Starting {settings.app_name} v{settings.app_version}")
-    logger.info(f"PORT: {os.getenv('PORT', 'not set')}")
-    logger.info(f"Allowed origins: {settings.cors_origins}")
+    logger.info("Starting %s v%s", settings.app_name, settings.app_version)
+    logger.info("PORT: %s", os.getenv('PORT', 'not set'))
+    logger.info("Allowed origins: %s", settings.cors_origins)
+    if warmup_state.ready:
+        # Already warmed up, e.g. by the pre-fork parent
+        pass
+    elif settings.warmup_enabled:
+        # Keep a reference so the task isn't garbage collected mid-run
+        app.state.warmup_task = asyncio.create_task(run_warmup_in_background())
+    else:
+        warmup_state.ready = True
+    loop_monitor.start()
+    if settings.tracemalloc_enabled:
+        # Per worker process, after the pre-fork parent's imports and warmup
+        alloc_tracker.start()
     logger.info("API startup complete - ready to accept requests")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run when the API shuts down."""
-    logger.info(f"Shutting down {settings.app_name}")
+    logger.info("Shutting down %s", settings.app_name)
+    loop_monitor.stop()
+    shutdown_logging()
 
 # Include routers
 app.include_router(analysis.router, prefix="/api", tags=["analysis"])
+app.include_router(monitoring.router, tags=["monitoring"])
 
 @app.get("/")
 async def root():
@@ -152,11 +173,41 @@ async def simple_health():
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness check: 503 until the startup warmup has finished, and while
+    the instance is saturated (event loop lag or threads queue over the
+    settings.ready_* thresholds).
+    Point load balancer / deploy health checks here so new instances only
+    get traffic once they're warm, and busy ones get a break.
+    """
+    saturated = saturation_reasons()
+    if not warmup_state.ready:
+        status = "warming_up"
+    elif saturated:
+        status = "saturated"
+    else:
+        status = "ready"
+    return JSONResponse(
+        status_code=200 if status == "ready" else 503,
+        content={
+            "status": status,
+            **warmup_state.as_dict(),
+            "saturated": saturated,
+            "loop_lag_ms": loop_monitor.percentiles_ms(),
+            "queue_depth": queue_depths(),
+        },
+    )
+
+
 @app.get("/api/health")
 async def health_check():
     """
     Health check endpoint.
-    Used by monitoring tools to make sure the API is alive.
+    Used by monitoring tools to make sure the API is alive. Also reports
+    recent event loop lag and how much work is waiting for threads; /ready
+    is the one that fails when those get too high.
     """
     import os
     return {
@@ -164,5 +215,7 @@ async def health_check():
         "service": "janua-financial-api",
         "version": settings.app_version,
         "port": os.getenv("PORT", "not_set"),
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        "loop_lag_ms": loop_monitor.percentiles_ms(),
+        "queue_depth": queue_depths(),
     }
@@ -0,0 +1,338 @@
+"""
+In-process metrics registry with a Prometheus text exporter.
+Counters, gauges and histograms live in plain dicts keyed by label values.
+Each series has its own small lock, so observations from different routes
+never wait on each other and the common case is an uncontended acquire.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Latency buckets in seconds: sub-millisecond calculations up to slow PDFs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Shared bits: name, help text, label names and the child lookup."""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._create_lock = threading.Lock()
+
+    def _child(self, labels: Dict[str, str]):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            # Only the first observation of a label set takes this lock
+            with self._create_lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. requests served."""
+
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0, **labels):
+        child = self._child(labels)
+        with child.lock:
+            child.value += amount
+
+    def value(self, **labels) -> float:
+        return self._child(labels).value
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(child.value)}"]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. Pass `callback` to read the value at scrape
+    time instead (e.g. a queue length owned by someone else).
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float, **labels):
+        self._child(labels).value = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        child = self._child(labels)
+        with child.lock:
+            child.value += amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._child(labels).value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            try:
+                self.set(self.callback())
+            except Exception:
+                # A broken callback shouldn't take down the whole scrape
+                pass
+        return super().render()
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(child.value)}"]
+
+
+class _HistogramValue:
+    __slots__ = ("counts", "sum", "count", "lock")
+
+    def __init__(self, bucket_count: int):
+        self.counts = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies) in fixed buckets."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(len(self.buckets))
+
+    def observe(self, value: float, **labels):
+        child = self._child(labels)
+        # Find the first bucket this value fits in; later buckets are
+        # cumulative and get summed at render time
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with child.lock:
+            if index < len(self.buckets):
+                child.counts[index] += 1
+            child.sum += value
+            child.count += 1
+
+    def _render_child(self, key, child):
+        with child.lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        plain = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{plain} {_format_number(total)}")
+        lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+class Registry:
+    """Holds every metric plus optional collectors that emit extra lines."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], List[str]]):
+        """`collector` returns ready-made exposition lines at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception:
+                pass
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS_TOTAL = REGISTRY.counter(
+    "janua_http_requests_total", "HTTP requests served", ("method", "route", "status")
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    "janua_http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    "janua_http_requests_in_flight", "Requests currently being handled"
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "janua_stage_duration_seconds",
+    "Time spent in each processing stage (body_parse, model_validation, "
+    "business_validation, cache_lookup, calculate_all, render, pdf_render)",
+    ("stage",),
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "janua_cache_lookups_total", "Result cache lookups by backend and result (hit/miss/error)", ("backend", "result")
+)
+
+
+# Stage durations for the current request, read by the request middleware to
+# build the Server-Timing header. None outside a request.
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+def start_request_timings() -> Dict[str, float]:
+    """Begin collecting stage timings for the current request."""
+    timings: Dict[str, float] = {}
+    _request_stages.set(timings)
+    return timings
+
+
+def record_stage(name: str, seconds: float):
+    """Record a stage duration in the histogram and the current request's timings."""
+    STAGE_DURATION.observe(seconds, stage=name)
+    timings = _request_stages.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+# Set by app.alloc_tracking when allocation tracking is on; gets
+# stage_started(name) / stage_finished(name, token) around every stage
+_stage_tracker = None
+
+
+def set_stage_tracker(tracker):
+    global _stage_tracker
+    _stage_tracker = tracker
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block of work and record it under janua_stage_duration_seconds."""
+    tracker = _stage_tracker
+    token = tracker.stage_started(name) if tracker is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+        if tracker is not None:
+            tracker.stage_finished(name, token)
+
+
+def threadpool_statistics():
+    """
+    anyio's default thread limiter backs FastAPI sync endpoints and
+    run_in_threadpool. Calculations and renders run on the scheduler's own
+    pool instead - its gauges are registered in app.scheduler.
+    """
+    from anyio import to_thread
+    return to_thread.current_default_thread_limiter().statistics()
+
+
+def _compression_lines() -> List[str]:
+    from app.middleware.compression import compression_stats
+    snapshot = compression_stats.snapshot()
+    lines = []
+    for metric, key, documentation in (
+        ("janua_compression_responses_total", "responses", "Responses compressed"),
+        ("janua_compression_bytes_in_total", "bytes_in", "Bytes before compression"),
+        ("janua_compression_bytes_out_total", "bytes_out", "Bytes after compression"),
+        ("janua_compression_cpu_seconds_total", "cpu_seconds", "CPU time spent compressing"),
+    ):
+        lines.append(f"# HELP {metric} {documentation}")
+        lines.append(f"# TYPE {metric} counter")
+        for encoding, entry in sorted(snapshot.items()):
+            lines.append(f'{metric}{{encoding="{encoding}"}} {_format_number(entry[key])}')
+    return lines
+
+
+REGISTRY.add_collector(_compression_lines)
+
+
+def _shared_cache_lines() -> List[str]:
+    from app.cache import shared_tier
+    from app.cache.shared import stats_lines
+    cache = shared_tier()
+    return stats_lines(cache) if cache is not None else []
+
+
+REGISTRY.add_collector(_shared_cache_lines)
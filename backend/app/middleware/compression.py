@@ -0,0 +1,278 @@
+"""
+Response compression (gzip and brotli) negotiated via Accept-Encoding.
+Written as plain ASGI so streaming responses (NDJSON, CSV) are compressed
+chunk by chunk instead of being buffered in memory first.
+"""
+
+import time
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - we just offer gzip without it
+    brotli = None
+
+
+# Content types worth compressing. PDFs and images are already compressed.
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/javascript",
+    "application/xml",
+)
+
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    # application/vnd.janua.compact+json and friends
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    Pick "br" or "gzip" from an Accept-Encoding header, or None.
+    Brotli wins ties because it compresses our JSON noticeably better.
+    """
+    if not accept_encoding:
+        return None
+
+    offered: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        pieces = [p.strip() for p in part.split(";")]
+        coding = pieces[0].lower()
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        offered[coding] = q
+
+    candidates = []
+    if brotli is not None:
+        candidates.append("br")
+    candidates.append("gzip")
+
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = offered.get(coding, offered.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionStats:
+    """
+    Running totals per encoding so we can see what compression costs us.
+    CPU time is thread time spent inside the compressor only.
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, Dict[str, float]] = {}
+
+    def record(self, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float):
+        entry = self.totals.setdefault(
+            encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+        )
+        entry["bytes_in"] += bytes_in
+        entry["bytes_out"] += bytes_out
+        entry["cpu_seconds"] += cpu_seconds
+
+    def count_response(self, encoding: str):
+        entry = self.totals.setdefault(
+            encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0}
+        )
+        entry["responses"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Totals plus compression ratio and CPU milliseconds per MB of input."""
+        result = {}
+        for encoding, entry in self.totals.items():
+            megabytes = entry["bytes_in"] / 1_000_000
+            result[encoding] = {
+                **entry,
+                "ratio": round(entry["bytes_out"] / entry["bytes_in"], 4) if entry["bytes_in"] else 0.0,
+                "cpu_ms_per_mb": round(entry["cpu_seconds"] * 1000 / megabytes, 3) if megabytes else 0.0,
+            }
+        return result
+
+
+compression_stats = CompressionStats()
+
+
+class _Encoder:
+    """Incremental compressor with a common interface for gzip and brotli."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 -> gzip container instead of raw zlib
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        start = time.thread_time()
+        if self.encoding == "br":
+            out = self._compressor.process(data)
+            out += self._compressor.finish() if final else self._compressor.flush()
+        else:
+            out = self._compressor.compress(data)
+            out += self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+        compression_stats.record(self.encoding, len(data), len(out), time.thread_time() - start)
+        return out
+
+
+def compress_bytes(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """One-shot compression, used for cached static payloads and benchmarks."""
+    return _Encoder(encoding, gzip_level, brotli_quality).compress(data, final=True)
+
+
+class CompressionMiddleware:
+    """
+    Compress responses above `minimum_size` with the best encoding the client
+    accepts. GET responses for `cached_paths` never change after startup, so
+    their bodies are compressed once per encoding and reused afterwards. Only
+    the body is kept: the headers come from the app on every request, since
+    the CORS ones depend on the request's Origin.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        cached_paths: Iterable[str] = (),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cached_paths = set(cached_paths)
+        # (path, encoding) -> (uncompressed length, compressed body)
+        self._static_cache: Dict[Tuple[str, str], Tuple[int, bytes]] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if scope["method"] == "GET" and path in self.cached_paths:
+            responder = _CompressionResponder(self, encoding, cache_key=(path, encoding))
+        else:
+            responder = _CompressionResponder(self, encoding)
+
+        await responder(scope, receive, send)
+
+
+class _CompressionResponder:
+    """Per-request state: holds back the start message until we know the body size."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, cache_key: Optional[tuple] = None):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.cache_key = cache_key
+        self.send: Send = None
+        self.initial_message: Optional[Message] = None
+        self.started = False
+        self.passthrough = False
+        self.encoder: Optional[_Encoder] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.middleware.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            status = message["status"]
+            self.passthrough = (
+                "content-encoding" in headers
+                or status < 200
+                or status in (204, 304)
+                or not _is_compressible(headers.get("content-type", ""))
+            )
+            return
+
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+
+            if not more_body and len(body) < self.middleware.minimum_size:
+                # Small responses aren't worth the CPU
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            compression_stats.count_response(self.encoding)
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # The compressed bytes differ from the identity ones, so a strong
+            # validator would be wrong here
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+
+            if not more_body:
+                compressed = self._compress_whole(body)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(self.initial_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming response: length is unknown once compressed
+            self.encoder = _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            del headers["Content-Length"]
+            await self.send(self.initial_message)
+
+        if self.encoder is None:
+            # Small first chunk went out uncompressed; nothing left to do
+            await self.send(message)
+            return
+
+        chunk = self.encoder.compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compress_whole(self, body: bytes) -> bytes:
+        cacheable = self.cache_key is not None and self.initial_message["status"] == 200
+        if cacheable:
+            cached = self.middleware._static_cache.get(self.cache_key)
+            if cached is not None and cached[0] == len(body):
+                return cached[1]
+        compressed = _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality).compress(
+            body, final=True
+        )
+        if cacheable:
+            self.middleware._static_cache[self.cache_key] = (len(body), compressed)
+        return compressed
@@ -0,0 +1,265 @@
+"""
+Per-client rate limiting and fair queuing, as a pure ASGI middleware.
+
+Clients are identified by their X-API-Key header when the key is one of
+settings.rate_limit_api_keys, otherwise by IP. Any other key is ignored -
+clients can't pick their own bucket by making one up. The IP is the peer
+address, or with settings.rate_limit_trust_forwarded_for on (Railway and
+Render put a proxy in front of us), the X-Forwarded-For entry added by the
+outermost of our rate_limit_trusted_proxy_hops proxies. Entries to the left
+of it come from the client and can say anything.
+
+Limited routes fall into two classes with their own limits:
+- cheap: /api/calculate
+- expensive: /api/generate-pdf and batch routes
+
+Each (client, class) has a token bucket. An empty bucket gets a 429 with
+Retry-After. Requests that pass the bucket then need one of the class's
+`max_active` slots. When all are busy they wait in a per-client queue, and
+freed slots go round-robin across the clients that are waiting instead of
+FIFO - a partner sending 50 PDFs at once waits behind itself, not in front of
+everybody else.
+
+All state is per worker process and in memory. Buckets idle long enough to be
+full again are dropped by a periodic sweep, which is the same as keeping them.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Deque, Dict, FrozenSet, Optional, Tuple
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REGISTRY, record_stage
+
+logger = get_logger(__name__)
+
+RATE_LIMITED = REGISTRY.counter(
+    "janua_rate_limited_total", "Requests rejected with 429, by route class and reason", ("route_class", "reason")
+)
+
+# How often idle buckets are swept
+SWEEP_INTERVAL = 60.0
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def take(self, rate: float, capacity: float, now: float) -> float:
+        """0 if a token was taken, otherwise seconds until one is available."""
+        self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class QueueFull(Exception):
+    pass
+
+
+class FairQueue:
+    """
+    At most `max_active` holders at once; waiters are served round-robin
+    across clients (one per client per turn), FIFO within a client.
+    """
+
+    def __init__(self, max_active: int, max_waiting_per_client: int):
+        self.max_active = max_active
+        self.max_waiting_per_client = max_waiting_per_client
+        self.active = 0
+        self._waiting: Dict[str, Deque[asyncio.Future]] = {}
+        # Clients with waiters, in the order they get their next turn
+        self._turns: Deque[str] = deque()
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    async def acquire(self, client: str):
+        if self.active < self.max_active and not self._turns:
+            self.active += 1
+            return
+        queue = self._waiting.get(client)
+        if len(queue or ()) >= self.max_waiting_per_client:
+            raise QueueFull()
+        if queue is None:
+            queue = self._waiting[client] = deque()
+            self._turns.append(client)
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        try:
+            # release() hands its slot over by resolving the future
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Got the slot just as we were cancelled - pass it on
+                self.release()
+            else:
+                self._forget(client, future)
+            raise
+
+    def _forget(self, client: str, future: asyncio.Future):
+        queue = self._waiting.get(client)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[client]
+            self._turns.remove(client)
+
+    def release(self):
+        while self._turns:
+            client = self._turns.popleft()
+            queue = self._waiting[client]
+            future = queue.popleft()
+            if queue:
+                self._turns.append(client)
+            else:
+                del self._waiting[client]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+fair_queues = {
+    "cheap": FairQueue(settings.rate_limit_cheap_max_active, settings.rate_limit_max_queued_per_client),
+    "expensive": FairQueue(settings.rate_limit_expensive_max_active, settings.rate_limit_max_queued_per_client),
+}
+for _name, _queue in fair_queues.items():
+    REGISTRY.gauge(
+        f"janua_fair_queue_{_name}_waiting", f"{_name.capitalize()} requests waiting for a slot",
+        callback=_queue.waiting,
+    )
+
+
+def route_class(path: str) -> Optional[str]:
+    if path in settings.rate_limit_cheap_paths.split(","):
+        return "cheap"
+    if path in settings.rate_limit_expensive_paths.split(","):
+        return "expensive"
+    return None
+
+
+def _key_id(api_key: bytes) -> str:
+    # Don't keep raw keys around in memory
+    return "key:" + hashlib.sha256(api_key).hexdigest()[:16]
+
+
+@lru_cache(maxsize=4)
+def _allowed_keys(keys: str) -> FrozenSet[str]:
+    return frozenset(_key_id(key.strip().encode("latin-1")) for key in keys.split(",") if key.strip())
+
+
+def client_id(scope) -> str:
+    headers = dict(scope.get("headers") or [])
+    api_key = headers.get(b"x-api-key")
+    if api_key:
+        key = _key_id(api_key)
+        if key in _allowed_keys(settings.rate_limit_api_keys):
+            return key
+    if settings.rate_limit_trust_forwarded_for:
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.split(b",")]
+            # Each proxy appends the address it got the request from, so the
+            # entry the outermost trusted proxy added is that many from the right
+            index = max(0, len(hops) - max(1, settings.rate_limit_trusted_proxy_hops))
+            if hops[index]:
+                return "ip:" + hops[index].decode("latin-1")
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._last_sweep = time.monotonic()
+
+    def _limits(self, kind: str) -> Tuple[float, float]:
+        """(tokens per second, burst) for a route class."""
+        if kind == "cheap":
+            return settings.rate_limit_cheap_per_minute / 60, settings.rate_limit_cheap_burst
+        return settings.rate_limit_expensive_per_minute / 60, settings.rate_limit_expensive_burst
+
+    def _sweep(self, now: float):
+        """Drop buckets that have refilled completely - a new one would be identical."""
+        self._last_sweep = now
+        stale = []
+        for (client, kind), bucket in self.buckets.items():
+            rate, burst = self._limits(kind)
+            if bucket.tokens + (now - bucket.updated) * rate >= burst:
+                stale.append((client, kind))
+        for key in stale:
+            del self.buckets[key]
+        if stale:
+            logger.debug("Dropped %s idle rate limit buckets, %s left", len(stale), len(self.buckets))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+        kind = route_class(scope["path"])
+        if kind is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        now = time.monotonic()
+        if now - self._last_sweep > SWEEP_INTERVAL:
+            self._sweep(now)
+
+        client = client_id(scope)
+        rate, burst = self._limits(kind)
+        bucket = self.buckets.get((client, kind))
+        if bucket is None:
+            bucket = self.buckets[(client, kind)] = TokenBucket(burst, now)
+        retry_after = bucket.take(rate, burst, now)
+        if retry_after:
+            RATE_LIMITED.inc(route_class=kind, reason="rate")
+            logger.info("Rate limited %s on %s, retry in %.1fs", client, scope["path"], retry_after)
+            await self._reject(send, retry_after)
+            return
+
+        queue = fair_queues[kind]
+        start = time.perf_counter()
+        try:
+            await queue.acquire(client)
+        except QueueFull:
+            RATE_LIMITED.inc(route_class=kind, reason="queue")
+            logger.info("Too many queued requests from %s on %s", client, scope["path"])
+            await self._reject(send, 1.0)
+            return
+        record_stage("queue_wait", time.perf_counter() - start)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            queue.release()
+
+    async def _reject(self, send, retry_after: float):
+        body = json.dumps({
+            "detail": "ERRO: Demasiados pedidos. Aguarde alguns segundos e tente novamente."
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
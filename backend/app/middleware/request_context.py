@@ -0,0 +1,117 @@
+"""
+Per-request bookkeeping as one pure ASGI middleware.
+Replaces the two @app.middleware("http") layers (charset fix and request
+logging). Those went through BaseHTTPMiddleware, which runs the endpoint in a
+separate task and pipes the body through a memory stream - twice. Here we only
+touch the `http.response.start` message; body chunks are forwarded as-is.
+
+Also adds a Server-Timing header so the browser devtools show where the time
+went: parse, model, validate, calc and render come from app.metrics.stage(),
+total is the time until the headers were sent.
+"""
+
+import time
+from typing import Dict, List, Tuple
+
+from app.logger import get_logger
+from app.metrics import REQUESTS_TOTAL, REQUEST_DURATION, REQUESTS_IN_FLIGHT, start_request_timings
+from app.profiler import profiler, request_route
+
+logger = get_logger(__name__)
+
+# Stage names from app.metrics.stage() -> short Server-Timing metric names
+SERVER_TIMING_NAMES = {
+    "queue_wait": "queue",
+    "body_parse": "parse",
+    "cache_lookup": "cache",
+    "coalesced_wait": "wait",
+    "model_validation": "model",
+    "business_validation": "validate",
+    "calculate_all": "calc",
+    "render": "render",
+    "pdf_render": "render",
+}
+
+
+def route_label(scope, status_code: int) -> str:
+    """Route template for metrics labels, "unmatched" for 404s."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if status_code in (404, 405):
+        return "unmatched"
+    # Plain Starlette routes (/openapi.json, /docs) and responses served by
+    # middleware (cached static payloads) have fixed paths
+    return scope["path"]
+
+
+def server_timing(timings: Dict[str, float], total_seconds: float) -> str:
+    """Format stage timings as a Server-Timing header value (milliseconds)."""
+    parts = [
+        f"{SERVER_TIMING_NAMES.get(name, name)};dur={seconds * 1000:.2f}"
+        for name, seconds in timings.items()
+    ]
+    parts.append(f"total;dur={total_seconds * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def _fix_charset(headers: List[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Add charset=utf-8 to JSON content types that don't declare one."""
+    fixed = []
+    for name, value in headers:
+        if name.lower() == b"content-type" and b"application/json" in value and b"charset" not in value:
+            value = b"application/json; charset=utf-8"
+        fixed.append((name, value))
+    return fixed
+
+
+class RequestContextMiddleware:
+    """Logs and times every HTTP request, fixes JSON charset, adds Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        path = scope["path"]
+        start_time = time.perf_counter()
+        # request.state.received_at - request deadlines count from here
+        scope.setdefault("state", {})["received_at"] = time.monotonic()
+        timings = start_request_timings()
+        request_route.set(path)
+        status_code = 500
+
+        logger.info("Request started: %s %s", method, path)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = _fix_charset(message.get("headers", []))
+                headers.append((
+                    b"server-timing",
+                    server_timing(timings, time.perf_counter() - start_time).encode("latin-1"),
+                ))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            duration = time.perf_counter() - start_time
+            # Use the route template (/api/calculate) rather than the raw path
+            # so unknown URLs can't blow up the number of series
+            route = route_label(scope, status_code)
+            REQUESTS_TOTAL.inc(method=method, route=route, status=status_code)
+            REQUEST_DURATION.observe(duration, method=method, route=route, status=status_code)
+            profiler.request_finished()
+            logger.info(
+                "Request completed: %s %s - Status: %s - Duration: %.3fs",
+                method, path, status_code, duration
+            )
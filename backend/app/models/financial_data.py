@@ -130,3 +130,5 @@ class CalculationResult(BaseModel):
     metrics: PerformanceMetrics
     success: bool
     message: str
+    # Send back to /api/generate-pdf instead of the full payload
+    result_token: Optional[str] = None
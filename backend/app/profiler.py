@@ -0,0 +1,182 @@
+"""
+On-demand sampling profiler (POST /admin/profile).
+
+When latency spikes in production we can't attach py-spy on Railway. Instead
+a thread samples every thread's Python stack (sys._current_frames()) every
+few milliseconds while a profile is running, and the endpoint returns the
+samples as collapsed stacks:
+
+    /api/generate-pdf;...;render_report (app/routes/analysis.py);generate_report (...);... 412
+
+That's the input format of flamegraph.pl, speedscope and inferno. The first
+frame is the route the work belongs to, so each route gets its own tower:
+executor threads are labelled with the route of the request that handed them
+the work, and the event loop thread is "[event loop]" (its async frames show
+which route handler is running). Idle threads aren't sampled.
+
+Sampling only happens during a profile; otherwise the cost is one dict
+write per executor job. At the default 100 Hz it costs around 1% CPU.
+Per worker process - only the worker that got the request is profiled.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_LOOP_LABEL = "[event loop]"
+
+# Innermost Python frames of an event loop thread with nothing to do: asyncio's
+# own loop waits in the selector, while uvloop (uvicorn[standard]) waits in C,
+# so there the runner that started the loop is the innermost Python frame. A
+# callback or task that's actually running is always on top of these.
+IDLE_LOOP_FRAMES = frozenset({
+    ("selectors.py", "select"),
+    ("selectors.py", "poll"),
+    ("runners.py", "run"),
+    ("runners.py", "run_until_complete"),
+    ("base_events.py", "run_until_complete"),
+    ("base_events.py", "run_forever"),
+    ("uvloop/__init__.py", "run"),
+})
+
+# Path of the request being handled; executor threads inherit it
+request_route: ContextVar[Optional[str]] = ContextVar("request_route", default=None)
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+def short_path(filename: str) -> str:
+    """app/routes/analysis.py, reportlab/pdfgen/canvas.py, ... rather than absolute paths."""
+    if filename.startswith(_BACKEND_ROOT):
+        return filename[len(_BACKEND_ROOT):]
+    for marker in ("site-packages" + os.sep, "dist-packages" + os.sep):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index + len(marker):]
+    return os.path.basename(filename)
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.active = False
+        # thread ident -> route of the job it's running
+        self._thread_routes: Dict[int, str] = {}
+        self._stacks: Counter = Counter()
+        self._labels: Dict[Any, str] = {}
+        self._idle_codes: Dict[Any, bool] = {}
+        self._samples = 0
+        self._requests = 0
+        self._max_requests: Optional[int] = None
+        self._done: Optional[asyncio.Event] = None
+        self._loop_thread: Optional[int] = None
+
+    def run_labelled(self, func: Callable[..., Any], *args) -> Any:
+        """func(*args), with this thread's samples attributed to the current request's route."""
+        ident = threading.get_ident()
+        self._thread_routes[ident] = request_route.get() or "[background]"
+        try:
+            return func(*args)
+        finally:
+            self._thread_routes.pop(ident, None)
+
+    def request_finished(self):
+        """Called by the request middleware; ends a profile limited to N requests."""
+        if not self.active or self._max_requests is None:
+            return
+        self._requests += 1
+        if self._requests >= self._max_requests:
+            self._done.set()
+
+    def _frame_label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({short_path(code.co_filename)})".replace(";", ":")
+            self._labels[code] = label
+        return label
+
+    def _is_idle_loop(self, code) -> bool:
+        idle = self._idle_codes.get(code)
+        if idle is None:
+            idle = (short_path(code.co_filename), code.co_name) in IDLE_LOOP_FRAMES
+            self._idle_codes[code] = idle
+        return idle
+
+    def _sample(self, own_ident: int):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if ident == self._loop_thread:
+                if self._is_idle_loop(frame.f_code):
+                    continue
+                root = EVENT_LOOP_LABEL
+            else:
+                # Threads without a job are idle
+                root = self._thread_routes.get(ident)
+                if root is None:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(root)
+            stack.reverse()
+            self._stacks[";".join(stack)] += 1
+        self._samples += 1
+
+    def _sampler(self, interval: float, stop: threading.Event):
+        own_ident = threading.get_ident()
+        while not stop.wait(interval):
+            self._sample(own_ident)
+
+    async def profile(self, seconds: float, interval: float, max_requests: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sample for `seconds`, or until `max_requests` requests have finished.
+        Returns {"stacks": "<collapsed stacks>", "samples": n, "requests": n, "seconds": s}.
+        """
+        if self.active:
+            raise RuntimeError("A profile is already running")
+        self._stacks.clear()
+        self._labels.clear()
+        self._idle_codes.clear()
+        self._samples = 0
+        self._requests = 0
+        self._max_requests = max_requests
+        self._done = asyncio.Event()
+        self._loop_thread = threading.get_ident()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sampler, args=(interval, stop), name="sampling-profiler", daemon=True)
+        start = time.perf_counter()
+        self.active = True
+        sampler.start()
+        logger.info("Profiling for up to %.0fs (%s requests) every %.0f ms",
+                    seconds, max_requests or "any", interval * 1000)
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.active = False
+            stop.set()
+            # The sampler finishes its current sample off the event loop
+            await asyncio.to_thread(sampler.join)
+        elapsed = time.perf_counter() - start
+        logger.info("Profile done: %s samples, %s requests in %.1fs", self._samples, self._requests, elapsed)
+        lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+        return {
+            "stacks": "\n".join(lines) + ("\n" if lines else ""),
+            "samples": self._samples,
+            "requests": self._requests,
+            "seconds": elapsed,
+        }
+
+
+profiler = SamplingProfiler()
@@ -1,22 +1,148 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from pydantic import ValidationError as PydanticValidationError
-from app.models.financial_data import InputData, EnhancedInputData, CalculationResult
+from app.models.financial_data import InputData, EnhancedInputData, CalculationResult, PerformanceMetrics
 from app.services.calculator import FinancialCalculator
-from app.services.pdf_generator import FinancialPDFGenerator
+from app.services.calculator_profiler import CalculatorProfiler
+from app.services.response_formats import VARY, render_result, metric_schema, representation_id
+from app.services.speculative import speculative_renderer
 from app.validators import validate_all, validate_on_request_only
-from app.exceptions import CalculationError, ValidationError, BalanceSheetError
+from app.exceptions import CalculationError, ValidationError, BalanceSheetError, RequestCancelled
 from app.utils.validation_helpers import format_pydantic_errors, create_detailed_error_response
+from app.utils.http_cache import canonical_input_hash, make_etag, etag_matches, not_modified
+from app.utils.idempotency import idempotency_key, replay, remember
+from app.utils.result_tokens import (
+    RESULT_TOKEN_FIELD, RESULT_TOKEN_HEADER, current_result_token, issue_result_token, resolve_result_token
+)
+from app.utils.deadlines import Deadline, checkpoint, guard, start_deadline
+from app.cache import cache_io, get_metrics, put_metrics, get_report_and_metrics, put_report_and_metrics, report_key
+from app.cache.single_flight import single_flight
+from app.config import settings
 from app.logger import get_logger
+from app.metrics import stage
+from app.scheduler import BULK, INTERACTIVE, scheduler
 from datetime import datetime
+from io import BytesIO
+from typing import Any, List, Optional
+import asyncio
+import hashlib
 import json
+import logging
+import random
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+PROFILE_HEADER = "X-Calculator-Profile"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def calculator_profile_mode(request: Request) -> Optional[str]:
+    """
+    Decide whether to profile this calculation.
+    Returns "json" or "table" when the client asked via header (not allowed
+    in production), "log" when picked by the production sampling rate,
+    or None.
+    """
+    requested = request.headers.get(PROFILE_HEADER, "").strip().lower()
+    if requested and settings.environment != "production":
+        return "table" if requested == "table" else "json"
+    
+    rate = settings.calculator_profile_sample_rate
+    if rate > 0 and random.random() < rate:
+        return "log"
+    return None
+
+
+def run_calculation(data: EnhancedInputData, input_hash: str, profiler: Optional[CalculatorProfiler] = None,
+                    store: bool = True) -> PerformanceMetrics:
+    """
+    Business validation plus calculate_all(), then cache the result.
+    Blocking - runs in the thread pool. Raises the same errors as the routes handle,
+    or RequestCancelled between stages once the request is given up on.
+    """
+    # Validate input data first (only when explicitly requested)
+    checkpoint("business_validation")
+    with stage("business_validation"):
+        validate_on_request_only(data.balanco, data.demonstracao_resultados)
+    logger.debug("Input validation passed")
+    
+    # Create calculator and run calculations
+    calculator = FinancialCalculator(
+        balanco=data.balanco,
+        demonstracao=data.demonstracao_resultados,
+        profiler=profiler
+    )
+    
+    logger.debug("Running calculations...")
+    checkpoint("calculate_all")
+    with stage("calculate_all"):
+        metrics = calculator.calculate_all()
+    logger.debug("Calculations completed successfully")
+    if store:
+        put_metrics(input_hash, metrics)
+    return metrics
+
+
+def render_report(data: EnhancedInputData, input_hash: str, report_date: str,
+                  metrics: Optional[PerformanceMetrics]) -> bytes:
+    """
+    The PDF for this input, calculating first unless `metrics` came from the
+    cache. Stores the PDF (and the calculation) in the result cache.
+    Blocking - runs in the thread pool.
+    """
+    calculated = None
+    if metrics is None:
+        metrics = calculated = run_calculation(data, input_hash, store=False)
+    
+    # Imported here so reportlab and PIL only load once a PDF is actually
+    # requested - most cold starts only ever serve /calculate and health checks
+    from app.services.pdf_generator import FinancialPDFGenerator, build_report_inputs
+    checkpoint("pdf_render")
+    pdf_generator = FinancialPDFGenerator()
+    with stage("pdf_render"):
+        pdf = pdf_generator.generate_report(**build_report_inputs(data, metrics)).getvalue()
+    put_report_and_metrics(input_hash, report_date, pdf, calculated)
+    return pdf
+
+
+async def read_json_body(request: Request):
+    """The request body as JSON, with a Portuguese 422 when it isn't."""
+    try:
+        with stage("body_parse"):
+            body = await request.body()
+            raw_data = json.loads(body)
+        logger.debug("Raw request data parsed successfully")
+        return raw_data
+    except json.JSONDecodeError as e:
+        logger.error("Invalid JSON in request: %s", e)
+        raise HTTPException(
+            status_code=422, 
+            detail="ERRO: Dados enviados não estão em formato JSON válido. Verifique se todos os campos foram preenchidos corretamente."
+        )
+
+
+async def parse_input_data(request: Request) -> EnhancedInputData:
+    """
+    Parse the request body manually to provide better error handling
+    than FastAPI's default 422 (Portuguese messages, field translations).
+    """
+    return parse_raw_input(await read_json_body(request))
+
+
+def parse_raw_input(raw_data) -> EnhancedInputData:
+    # Validate and parse with Pydantic
+    try:
+        with stage("model_validation"):
+            return EnhancedInputData(**raw_data)
+    except PydanticValidationError as e:
+        logger.error("Pydantic validation error: %s", e)
+        detailed_error = format_pydantic_errors(e)
+        raise HTTPException(status_code=422, detail=detailed_error)
+
 
 @router.post("/calculate", response_model=CalculationResult)
-async def calculate_metrics(request: Request):
+async def calculate_metrics(request: Request, response: Response):
     """
     Main endpoint for financial analysis calculations.
     
@@ -30,137 +156,327 @@ async def calculate_metrics(request: Request):
         - Trend indicators
         - Portuguese interpretations
     
+    The response format follows the Accept header: regular JSON by default,
+    or the compact columnar shape (application/vnd.janua.compact+json and
+    application/msgpack) for batch clients. See /api/calculate/schema.
+    
+    Responses carry an ETag; sending it back in If-None-Match gets a
+    304 Not Modified without re-running validation or calculations.
+    
+    Requests are given up on (504) after settings.request_deadline_seconds,
+    or the X-Request-Timeout header's value. Work for clients that disconnect
+    is cancelled.
+    
     The calculations match the client's Excel file exactly.
     """
     try:
-        # Parse request body manually to provide better error handling
-        try:
-            body = await request.body()
-            raw_data = json.loads(body)
-            logger.debug("Raw request data parsed successfully")
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON in request: {str(e)}")
-            raise HTTPException(
-                status_code=422, 
-                detail="ERRO: Dados enviados não estão em formato JSON válido. Verifique se todos os campos foram preenchidos corretamente."
-            )
-        
-        # Validate and parse with Pydantic
-        try:
-            data = EnhancedInputData(**raw_data)
-        except PydanticValidationError as e:
-            logger.error(f"Pydantic validation error: {str(e)}")
-            detailed_error = format_pydantic_errors(e)
-            raise HTTPException(status_code=422, detail=detailed_error)
+        start_deadline(request)
+        data = await parse_input_data(request)
         
         company_name = data.company_info.nome_empresa
-        logger.info(f"Calculation request received for: {company_name}")
+        logger.info("Calculation request received for: %s", company_name)
         
-        # Validate input data first (only when explicitly requested)
-        validate_on_request_only(data.balanco, data.demonstracao_resultados)
-        logger.debug("Input validation passed")
+        profile_mode = calculator_profile_mode(request)
+        profiler = CalculatorProfiler() if profile_mode else None
         
-        # Create calculator and run calculations
-        calculator = FinancialCalculator(
-            balanco=data.balanco,
-            demonstracao=data.demonstracao_resultados
-        )
+        # Same input + same calculator = same result, so polling clients
+        # can skip everything below (unless they asked for a fresh profile)
+        input_hash = canonical_input_hash(data)
+        etag = make_etag(input_hash, representation_id(request), weak=True)
+        if profile_mode not in ("json", "table") and etag_matches(request, etag):
+            logger.debug("ETag matched, returning 304")
+            not_modified_response = not_modified(etag, settings.calculation_cache_control, vary=VARY)
+            # The client's cached body has a token that may have expired by now
+            token = await cache_io(current_result_token, data, input_hash)
+            if token:
+                not_modified_response.headers[RESULT_TOKEN_HEADER] = token
+            return not_modified_response
         
-        logger.debug("Running calculations...")
-        metrics = calculator.calculate_all()
-        logger.debug("Calculations completed successfully")
+        # Another worker or replica may have calculated this input already. Only
+        # validated input is ever cached, so a hit skips validation too.
+        metrics = None
+        if profiler is None:
+            with stage("cache_lookup"):
+                metrics = await cache_io(get_metrics, input_hash)
+        
+        if metrics is None and profiler is None:
+            # Identical requests already running in this worker share one calculation
+            metrics = await guard(request, single_flight.run("calculate", input_hash, run_calculation, data, input_hash))
+        elif metrics is None:
+            metrics = await guard(request, scheduler.run(INTERACTIVE, run_calculation, data, input_hash, profiler))
+        else:
+            logger.debug("Calculation served from the result cache")
         
-        # Build response
+        # Build response. The token lets /api/generate-pdf reuse this result.
+        result_token = await cache_io(issue_result_token, data, input_hash)
         result = CalculationResult(
             timestamp=datetime.now(),
             empresa=company_name,
             metrics=metrics,
             success=True,
-            message="Cálculo realizado com sucesso"
+            message="Cálculo realizado com sucesso",
+            result_token=result_token
         )
         
-        logger.info(f"Calculation successful for: {company_name}")
-        return result
+        logger.info("Calculation successful for: %s", company_name)
+        # Most users download the report next; render it now if the server is quiet
+        report_date = datetime.now().strftime('%Y%m%d')
+        speculative_renderer.submit(input_hash, report_date, render_report, data, input_hash, report_date, metrics)
+        
+        extra = None
+        headers = {"ETag": etag, "Cache-Control": settings.calculation_cache_control}
+        if result_token:
+            headers[RESULT_TOKEN_HEADER] = result_token
+        if profiler is not None:
+            # Sampled profiles only exist in the log; requested ones go to the client
+            log_level = logging.INFO if profile_mode == "log" else logging.DEBUG
+            logger.log(log_level, "Calculator profile for %s:\n%s", company_name, profiler.format_table())
+            if profile_mode == "json":
+                extra = {"profile": profiler.as_dict()}
+            elif profile_mode == "table":
+                extra = {"profile": profiler.format_table()}
+            if extra:
+                # The body includes timings, so it's no longer the cacheable representation
+                headers = {"Cache-Control": "no-store"}
+        
+        with stage("render"):
+            return render_result(result, request, response, headers=headers, extra=extra)
         
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
         
     except ValidationError as e:
-        logger.error(f"Business validation error: {e.detail}")
+        logger.error("Business validation error: %s", e.detail)
         raise HTTPException(status_code=400, detail=e.detail)
         
     except BalanceSheetError as e:
-        logger.error(f"Balance sheet validation error: {e.detail}")
+        logger.error("Balance sheet validation error: %s", e.detail)
         raise HTTPException(status_code=400, detail=e.detail)
         
     except (ValueError, ZeroDivisionError) as e:
-        logger.error(f"Calculation error: {str(e)}")
+        logger.error("Calculation error: %s", e)
         raise HTTPException(
             status_code=400, 
             detail=f"Não foi possível calcular as métricas. Verifique os dados inseridos. Erro: {str(e)}"
         )
     except Exception as e:
-        logger.error(f"Unexpected error during calculation: {str(e)}", exc_info=True)
+        logger.error("Unexpected error during calculation: %s", e, exc_info=True)
         detailed_error = create_detailed_error_response(e)
         raise HTTPException(status_code=500, detail=detailed_error)
 
+@router.get("/calculate/schema")
+async def calculation_schema():
+    """
+    Static metric metadata (nome, unidade) used by the compact formats.
+    Clients can cache this and send its version in the X-Metrics-Schema
+    header so compact responses skip the metadata block.
+    """
+    return metric_schema()
+
+
+def _batch_line(index: int, raw: Any) -> dict:
+    """Result line for one batch item - errors are reported per company, not raised."""
+    try:
+        if isinstance(raw, (bytes, str)):
+            raw = json.loads(raw)
+        if not isinstance(raw, dict):
+            return {"index": index, "success": False, "error": "ERRO: Cada empresa deve ser um objeto JSON."}
+        data = EnhancedInputData(**raw)
+        input_hash = canonical_input_hash(data)
+        metrics = get_metrics(input_hash)
+        if metrics is None:
+            metrics = run_calculation(data, input_hash)
+        return {
+            "index": index,
+            "success": True,
+            "empresa": data.company_info.nome_empresa,
+            "metrics": metrics.model_dump(mode="json"),
+        }
+    except json.JSONDecodeError:
+        error = "ERRO: Linha não está em formato JSON válido."
+    except PydanticValidationError as e:
+        error = format_pydantic_errors(e)
+    except (ValidationError, BalanceSheetError) as e:
+        error = e.detail
+    except (ValueError, ZeroDivisionError) as e:
+        error = f"Não foi possível calcular as métricas. Verifique os dados inseridos. Erro: {str(e)}"
+    except Exception as e:
+        logger.error("Unexpected error in batch item %s: %s", index, e, exc_info=True)
+        error = create_detailed_error_response(e)
+    return {"index": index, "success": False, "error": error}
+
+
+def calculate_batch_chunk(items: List[Any], start: int, deadline: Deadline) -> bytes:
+    """
+    NDJSON lines for one chunk of a batch. Blocking - runs on the scheduler at
+    bulk priority. Stops between companies once `deadline` is cancelled.
+    """
+    lines = []
+    for offset, raw in enumerate(items):
+        deadline.check("batch_item")
+        lines.append(json.dumps(_batch_line(start + offset, raw), ensure_ascii=False, separators=(",", ":")))
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+@router.post("/calculate-batch")
+async def calculate_batch(request: Request):
+    """
+    Calculate metrics for many companies in one request.
+    
+    The body is either a JSON array of /api/calculate payloads or NDJSON
+    (Content-Type: application/x-ndjson, one payload per line). The response
+    is NDJSON, one line per company in input order:
+        {"index": 0, "success": true, "empresa": "...", "metrics": {...}}
+        {"index": 1, "success": false, "error": "..."}
+    Invalid companies don't fail the batch.
+    
+    Batches run at bulk priority, settings.batch_chunk_size companies at a
+    time, so form submissions and downloads get the executor between chunks.
+    Lines are streamed as chunks finish, and a client that disconnects stops
+    the batch after the company being calculated. With an Idempotency-Key
+    header, a retry of a completed batch is replayed instead of calculated
+    again, as long as its output fits in settings.batch_idempotency_max_bytes
+    and the result cache. Otherwise the retry runs again, mostly from cached
+    results.
+    """
+    key = idempotency_key(request)
+    with stage("body_parse"):
+        body = await request.body()
+    fingerprint = hashlib.sha256(body).hexdigest()
+    if key is not None:
+        replayed = await cache_io(replay, "calculate-batch", key, fingerprint)
+        if replayed is not None:
+            return replayed
+    
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith((NDJSON_MEDIA_TYPE, "application/jsonl")):
+        # Each line is decoded in its chunk, so a bad line only fails that company
+        items = [line for line in body.splitlines() if line.strip()]
+    else:
+        try:
+            # A big array takes a while to decode - keep it off the event loop
+            items = await scheduler.run(BULK, json.loads, body)
+        except json.JSONDecodeError as e:
+            logger.error("Invalid JSON in batch request: %s", e)
+            raise HTTPException(
+                status_code=422,
+                detail="ERRO: Dados enviados não estão em formato JSON válido. Envie uma lista de empresas ou NDJSON."
+            )
+        if not isinstance(items, list):
+            raise HTTPException(status_code=422, detail="ERRO: O lote deve ser uma lista de empresas.")
+    
+    if not items:
+        raise HTTPException(status_code=422, detail="ERRO: O lote não tem empresas.")
+    if len(items) > settings.batch_max_companies:
+        raise HTTPException(
+            status_code=413,
+            detail=f"ERRO: O lote tem {len(items)} empresas; o máximo por pedido é {settings.batch_max_companies}."
+        )
+    logger.info("Batch calculation request for %s companies", len(items))
+    
+    # Batches take as long as they take; only a disconnect stops them
+    deadline = Deadline()
+    
+    async def stream():
+        kept: Optional[List[bytes]] = [] if key is not None else None
+        kept_bytes = 0
+        chunk_size = max(1, settings.batch_chunk_size)
+        for start in range(0, len(items), chunk_size):
+            job = asyncio.ensure_future(
+                scheduler.run(BULK, calculate_batch_chunk, items[start:start + chunk_size], start, deadline)
+            )
+            try:
+                # shield: a running chunk only notices the cancellation through the deadline
+                lines = await asyncio.shield(job)
+            except asyncio.CancelledError:
+                # Starlette cancels the response when the client goes away
+                logger.info("Batch cancelled by the client after %s of %s companies", start, len(items))
+                deadline.cancel("disconnect")
+                job.cancel()
+                raise
+            if kept is not None:
+                kept.append(lines)
+                kept_bytes += len(lines)
+                if kept_bytes > settings.batch_idempotency_max_bytes:
+                    kept = None
+            yield lines
+        logger.info("Batch calculation finished for %s companies", len(items))
+        if kept is not None:
+            await cache_io(
+                remember, "calculate-batch", key, fingerprint, 200, NDJSON_MEDIA_TYPE, headers={}, body=b"".join(kept)
+            )
+    
+    return StreamingResponse(stream(), media_type=NDJSON_MEDIA_TYPE)
+
+
 @router.post("/generate-pdf")
-async def generate_pdf(data: EnhancedInputData):
+async def generate_pdf(request: Request):
     """
     Generate PDF report with financial analysis summary.
     
     Returns a PDF file with the 8 key indicators matching the Relatório format.
+    Supports If-None-Match like /api/calculate. The report shows today's date,
+    so the ETag changes daily.
+    
+    With an Idempotency-Key header, a retry gets the original report back
+    (same date and filename) without rendering it again.
+    
+    Instead of the full payload, the body can be {"result_token": "..."}
+    with the token from a /api/calculate response. That skips parsing,
+    validation and calculations. Unknown or expired tokens get a 404 - send
+    the full payload then.
+    
+    Deadlines and disconnects are handled as in /api/calculate.
     """
+    key = idempotency_key(request)
+    start_deadline(request)
+    raw_data = await read_json_body(request)
+    if isinstance(raw_data, dict) and RESULT_TOKEN_FIELD in raw_data:
+        with stage("model_validation"):
+            resolved = await cache_io(resolve_result_token, raw_data[RESULT_TOKEN_FIELD])
+        if resolved is None:
+            raise HTTPException(
+                status_code=404,
+                detail="ERRO: O resultado do cálculo já não está disponível. Envie os dados completos para gerar o PDF."
+            )
+        data, input_hash = resolved
+    else:
+        data = parse_raw_input(raw_data)
+        input_hash = canonical_input_hash(data)
     company_name = data.company_info.nome_empresa
-    logger.info(f"PDF generation request for: {company_name}")
+    logger.info("PDF generation request for: %s", company_name)
+    
+    if key is not None:
+        replayed = await cache_io(replay, "generate-pdf", key, input_hash)
+        if replayed is not None:
+            return replayed
+    
+    report_date = datetime.now().strftime('%Y%m%d')
+    etag = make_etag(input_hash, f"pdf:{report_date}")
+    if etag_matches(request, etag):
+        logger.debug("ETag matched, returning 304 for PDF")
+        return not_modified(etag, settings.report_cache_control)
     
     try:
-        # Validate and calculate
-        validate_on_request_only(data.balanco, data.demonstracao_resultados)
-        
-        calculator = FinancialCalculator(
-            balanco=data.balanco,
-            demonstracao=data.demonstracao_resultados
-        )
-        
-        metrics = calculator.calculate_all()
-        logger.debug("Calculations completed for PDF")
-        
-        # Convert metrics to dict format
-        metrics_dict = {}
-        for field_name, field_value in metrics.__dict__.items():
-            if hasattr(field_value, '__dict__'):
-                metrics_dict[field_name] = field_value.__dict__
-            else:
-                metrics_dict[field_name] = field_value
-        
-        # Generate PDF with proper data including computed properties
-        balance_sheet_data = {
-            **data.balanco.year_n.__dict__,
-            'total_ativo': data.balanco.year_n.total_ativo,
-            'total_passivo': data.balanco.year_n.total_passivo,
-            'total_capital_proprio': data.balanco.year_n.total_capital_proprio,
-            'total_ativo_corrente': data.balanco.year_n.total_ativo_corrente,
-            'total_passivo_corrente': data.balanco.year_n.total_passivo_corrente,
-        }
+        with stage("cache_lookup"):
+            pdf_bytes, metrics = await cache_io(get_report_and_metrics, input_hash, report_date)
         
-        income_statement_data = {
-            **data.demonstracao_resultados.year_n.__dict__
-        }
-        
-        pdf_generator = FinancialPDFGenerator()
-        pdf_buffer = pdf_generator.generate_report(
-            empresa_nome=company_name,
-            metrics=metrics_dict,
-            balance_sheet=balance_sheet_data,
-            income_statement=income_statement_data
-        )
-        
-        logger.info(f"PDF generated successfully for: {company_name}")
+        if pdf_bytes is not None:
+            logger.info("PDF served from the result cache for: %s", company_name)
+        else:
+            # A double-click or retry while this report is rendering waits
+            # for that render instead of starting another one
+            pdf_bytes = await guard(request, single_flight.run(
+                "generate_report", f"{input_hash}:{report_date}",
+                render_report, data, input_hash, report_date, metrics
+            ))
+            logger.info("PDF generated successfully for: %s", company_name)
+        await cache_io(speculative_renderer.record_download, input_hash, report_date)
+        pdf_buffer = BytesIO(pdf_bytes)
         
         # Return PDF as streaming response
-        filename = f"relatorio_{company_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        filename = f"relatorio_{company_name.replace(' ', '_')}_{report_date}.pdf"
         
         # Create response with proper headers
         response = StreamingResponse(
@@ -168,10 +484,20 @@ async def generate_pdf(data: EnhancedInputData):
             media_type="application/pdf"
         )
         response.headers["Content-Disposition"] = f"attachment; filename=\"{filename}\""
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = settings.report_cache_control
+        if key is not None:
+            await cache_io(
+                remember, "generate-pdf", key, input_hash, 200, "application/pdf",
+                headers={name: response.headers[name] for name in ("Content-Disposition", "ETag", "Cache-Control")},
+                artifact=report_key(input_hash, report_date),
+            )
         return response
         
+    except RequestCancelled:
+        raise
     except Exception as e:
-        logger.error(f"PDF generation error: {str(e)}", exc_info=True)
+        logger.error("PDF generation error: %s", e, exc_info=True)
         raise CalculationError(f"Erro ao gerar PDF: {str(e)}")
 
 
@@ -187,6 +513,7 @@ async def test_endpoint():
         "message": "API está funcional e pronta para receber dados",
         "available_endpoints": {
             "calculate": "POST /api/calculate - Calcular métricas financeiras",
+            "calculate-batch": "POST /api/calculate-batch - Calcular métricas de várias empresas",
             "generate-pdf": "POST /api/generate-pdf - Gerar relatório PDF",
             "health": "GET /api/health - Verificar saúde do serviço",
             "docs": "GET /docs - Documentação interativa da API"
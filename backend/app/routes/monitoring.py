@@ -0,0 +1,85 @@
+import gc
+import sys
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from app.alloc_tracking import alloc_tracker
+from app.config import settings
+from app.metrics import REGISTRY
+from app.profiler import profiler
+from app.server import current_rss_bytes
+from app.utils.admin import require_admin
+
+router = APIRouter()
+
+# Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    Request counts and latency per route/status, per-stage latency
+    (parse, validation, calculation, PDF render), in-flight requests and
+    thread pool queue depth.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@router.post("/admin/profile", response_class=PlainTextResponse, include_in_schema=False)
+async def profile(
+    request: Request,
+    seconds: float = Query(10.0, gt=0),
+    requests: Optional[int] = Query(None, ge=1),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+):
+    """
+    Sample this worker's stacks for `seconds` (or until `requests` more
+    requests have finished) and return them as collapsed stacks, one line
+    per stack with the route as the first frame. Feed the output to
+    flamegraph.pl, speedscope or inferno. Needs X-Admin-Token.
+    """
+    require_admin(request)
+    try:
+        result = await profiler.profile(
+            min(seconds, settings.profile_max_seconds), interval_ms / 1000, max_requests=requests
+        )
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="ERRO: Já está a decorrer um perfil. Tente novamente mais tarde.")
+    return PlainTextResponse(
+        result["stacks"],
+        headers={
+            "X-Profile-Samples": str(result["samples"]),
+            "X-Profile-Requests": str(result["requests"]),
+            "X-Profile-Seconds": f"{result['seconds']:.2f}",
+        },
+    )
+
+
+def _memory_report(top: int) -> dict:
+    # gc.get_objects() and tracemalloc snapshots take a while - thread pool
+    return {
+        "rss_bytes": current_rss_bytes(),
+        "python_heap": {
+            "allocated_blocks": sys.getallocatedblocks(),
+            "gc_objects": len(gc.get_objects()),
+            "gc_frozen_objects": gc.get_freeze_count(),
+            "gc_counts": gc.get_count(),
+            "gc_generations": gc.get_stats(),
+        },
+        "tracemalloc": alloc_tracker.report(top),
+    }
+
+
+@router.get("/admin/memory", include_in_schema=False)
+async def memory(request: Request, top: int = Query(15, ge=1, le=100)):
+    """
+    RSS and Python heap stats for this worker, plus the allocation tracking
+    report (net bytes per route and stage, top allocation sites) when
+    TRACEMALLOC_ENABLED is on. Needs X-Admin-Token.
+    """
+    require_admin(request)
+    return await run_in_threadpool(_memory_report, top)
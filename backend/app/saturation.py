@@ -0,0 +1,113 @@
+"""
+Event-loop lag monitor and saturation checks for /ready.
+
+/health only says the process is up. An instance whose event loop is held up
+(GIL contention from renders, a blocking call that slipped into an async
+route) or whose executor has a long queue still says "ok", and the load
+balancer keeps sending it traffic.
+
+A background task sleeps loop_lag_interval_ms at a time and records how much
+later than that it woke up - that's how long everything else on the loop had
+to wait. The last loop_lag_window samples give the percentiles in
+/api/health, and /ready turns 503 ("saturated") while the p99 lag is over
+ready_max_loop_lag_ms or more than ready_max_queue_depth interactive jobs
+are waiting for a thread. Bulk work waiting is expected and doesn't count.
+
+Per worker process, like the rest of the metrics.
+"""
+
+import asyncio
+import contextvars
+from collections import deque
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REGISTRY, threadpool_statistics
+from app.scheduler import BACKGROUND, BULK, INTERACTIVE, scheduler
+
+logger = get_logger(__name__)
+
+LOOP_LAG = REGISTRY.histogram(
+    "janua_event_loop_lag_seconds", "How late the event loop lag sampler woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+
+class LoopLagMonitor:
+    def __init__(self):
+        self.samples: deque = deque(maxlen=settings.loop_lag_window)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            # Empty context: not part of whichever request or startup hook started it
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = settings.loop_lag_interval_ms / 1000
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - start - interval)
+            self.samples.append(lag)
+            LOOP_LAG.observe(lag)
+            if lag > 1.0:
+                logger.warning("Event loop was blocked for %.2fs", lag)
+
+    def percentile(self, fraction: float) -> float:
+        return _percentile(sorted(self.samples), fraction)
+
+    def percentiles_ms(self) -> Dict[str, float]:
+        """Recent lag for the health payload, in milliseconds."""
+        ordered = sorted(self.samples)
+        summary = {
+            name: round(_percentile(ordered, fraction) * 1000, 2)
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        }
+        summary["samples"] = len(ordered)
+        return summary
+
+
+def _percentile(ordered: List[float], fraction: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+loop_monitor = LoopLagMonitor()
+
+REGISTRY.gauge(
+    "janua_event_loop_lag_p99_seconds", "p99 event loop lag over the last loop_lag_window samples",
+    callback=lambda: loop_monitor.percentile(0.99),
+)
+
+
+def queue_depths() -> Dict[str, int]:
+    """Jobs waiting for a thread: scheduler classes plus FastAPI's own thread pool."""
+    return {
+        "interactive": scheduler.waiting(INTERACTIVE),
+        "background": scheduler.waiting(BACKGROUND),
+        "bulk": scheduler.waiting(BULK),
+        "threadpool": threadpool_statistics().tasks_waiting,
+    }
+
+
+def saturation_reasons() -> List[str]:
+    """Why this instance shouldn't get more traffic right now; empty when it's fine."""
+    reasons = []
+    max_lag = settings.ready_max_loop_lag_ms / 1000
+    lag = loop_monitor.percentile(0.99)
+    if max_lag and lag > max_lag:
+        reasons.append(f"event loop p99 lag {lag * 1000:.0f} ms")
+    depths = queue_depths()
+    waiting = depths["interactive"] + depths["threadpool"]
+    if settings.ready_max_queue_depth and waiting > settings.ready_max_queue_depth:
+        reasons.append(f"{waiting} jobs waiting for a thread")
+    return reasons
@@ -0,0 +1,199 @@
+"""
+Priority scheduler for the calculation and rendering executors.
+
+Blocking work (calculate_all, PDF renders, batch chunks) runs on a small
+dedicated thread pool, and each job has a priority class:
+
+- interactive: form submissions and downloads - someone is waiting
+- background: speculative PDF renders
+- bulk: batch calculations, split into chunks
+
+Free slots go to the highest class waiting, FIFO within a class. Background
+and bulk never take the last `scheduler_reserved_interactive` slots, and
+background runs at most `scheduler_background_max_active` jobs at once.
+
+Bulk concurrency adapts to interactive latency: the scheduler tracks the p99
+of interactive jobs (queue wait + run time) over the last
+`scheduler_latency_window` jobs. Over budget, the bulk limit halves (down to
+one chunk at a time); within budget, it grows by one. With no interactive
+traffic for a couple of seconds, bulk gets every non-reserved slot. Bulk
+jobs are chunks, so an interactive job never waits for more than one chunk.
+"""
+
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional, Tuple
+
+import anyio
+
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REGISTRY
+from app.profiler import profiler
+
+logger = get_logger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+BULK = 2
+PRIORITY_NAMES = ("interactive", "background", "bulk")
+
+# Recompute the interactive p99 (and adjust the bulk limit) every this many jobs
+ADJUST_EVERY = 20
+# Without interactive jobs for this long, bulk may use all non-reserved slots
+IDLE_SECONDS = 2.0
+
+SCHEDULER_WAIT = REGISTRY.histogram(
+    "janua_scheduler_wait_seconds", "Time jobs waited for an executor slot", ("priority",)
+)
+SCHEDULER_CANCELLED = REGISTRY.counter(
+    "janua_scheduler_cancelled_total", "Jobs cancelled while waiting for an executor slot", ("priority",)
+)
+
+
+class PriorityScheduler:
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.active = [0, 0, 0]
+        self.bulk_limit = self._max_shared()
+        self.interactive_p99: Optional[float] = None
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._latencies: deque = deque(maxlen=settings.scheduler_latency_window)
+        self._observed = 0
+        self._last_interactive = 0.0
+        self._limiter: Optional[anyio.CapacityLimiter] = None
+
+    def _max_shared(self) -> int:
+        """Slots background and bulk may use between them."""
+        return max(1, self.workers - settings.scheduler_reserved_interactive)
+
+    def waiting(self, priority: int) -> int:
+        return sum(1 for p, _, future in self._waiting if p == priority and not future.done())
+
+    def busy_threads(self) -> int:
+        return self._limiter.statistics().borrowed_tokens if self._limiter is not None else 0
+
+    def _can_start(self, priority: int) -> bool:
+        if sum(self.active) >= self.workers:
+            return False
+        if priority == INTERACTIVE:
+            return True
+        if self.active[BACKGROUND] + self.active[BULK] >= self._max_shared():
+            return False
+        if priority == BACKGROUND:
+            return self.active[BACKGROUND] < settings.scheduler_background_max_active
+        limit = self.bulk_limit
+        if time.monotonic() - self._last_interactive > IDLE_SECONDS:
+            limit = self._max_shared()
+        return self.active[BULK] < limit
+
+    def _dispatch(self):
+        """Start every waiting job that may start now, highest priority first."""
+        blocked = []
+        while self._waiting:
+            priority, seq, future = heapq.heappop(self._waiting)
+            if future.done():
+                # Cancelled while waiting
+                continue
+            if self._can_start(priority):
+                self.active[priority] += 1
+                future.set_result(None)
+            else:
+                blocked.append((priority, seq, future))
+        for item in blocked:
+            heapq.heappush(self._waiting, item)
+
+    async def acquire(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Got the slot just as we were cancelled - give it back
+                self.release(priority)
+            else:
+                SCHEDULER_CANCELLED.inc(priority=PRIORITY_NAMES[priority])
+            raise
+
+    def release(self, priority: int):
+        self.active[priority] -= 1
+        self._dispatch()
+
+    def _observe_interactive(self, seconds: float):
+        self._last_interactive = time.monotonic()
+        self._latencies.append(seconds)
+        self._observed += 1
+        if self._observed % ADJUST_EVERY:
+            return
+        ordered = sorted(self._latencies)
+        self.interactive_p99 = ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+        budget = settings.scheduler_interactive_p99_budget_ms / 1000
+        previous = self.bulk_limit
+        if self.interactive_p99 > budget:
+            self.bulk_limit = max(1, self.bulk_limit // 2)
+        else:
+            self.bulk_limit = min(self._max_shared(), self.bulk_limit + 1)
+        if self.bulk_limit != previous:
+            logger.debug(
+                "Interactive p99 %.0f ms (budget %.0f ms), bulk limit %s -> %s",
+                self.interactive_p99 * 1000, budget * 1000, previous, self.bulk_limit
+            )
+
+    async def run(self, priority: int, func: Callable[..., Any], *args) -> Any:
+        """func(*args) on the executor once a slot for `priority` is free."""
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.workers)
+        start = time.perf_counter()
+        await self.acquire(priority)
+        SCHEDULER_WAIT.observe(time.perf_counter() - start, priority=PRIORITY_NAMES[priority])
+        try:
+            return await anyio.to_thread.run_sync(
+                functools.partial(profiler.run_labelled, func, *args), limiter=self._limiter
+            )
+        finally:
+            self.release(priority)
+            if priority == INTERACTIVE:
+                self._observe_interactive(time.perf_counter() - start)
+
+
+scheduler = PriorityScheduler(settings.scheduler_workers)
+
+# The pool calculations and renders run on. Jobs queue in the scheduler, not
+# in the limiter, so the queue depth counts every priority class.
+REGISTRY.gauge(
+    "janua_threadpool_queue_depth", "Jobs waiting for a scheduler thread",
+    callback=lambda: sum(scheduler.waiting(p) for p in range(len(PRIORITY_NAMES))),
+)
+REGISTRY.gauge(
+    "janua_threadpool_busy_threads", "Scheduler threads currently in use",
+    callback=scheduler.busy_threads,
+)
+REGISTRY.gauge(
+    "janua_threadpool_threads", "Threads in the scheduler pool (scheduler_workers)",
+    callback=lambda: scheduler.workers,
+)
+
+for _priority, _name in enumerate(PRIORITY_NAMES):
+    REGISTRY.gauge(
+        f"janua_scheduler_{_name}_active", f"{_name.capitalize()} jobs running",
+        callback=lambda p=_priority: scheduler.active[p],
+    )
+    REGISTRY.gauge(
+        f"janua_scheduler_{_name}_waiting", f"{_name.capitalize()} jobs waiting for a slot",
+        callback=lambda p=_priority: scheduler.waiting(p),
+    )
+REGISTRY.gauge(
+    "janua_scheduler_bulk_limit", "Bulk jobs allowed at once (adapts to interactive p99)",
+    callback=lambda: scheduler.bulk_limit,
+)
+REGISTRY.gauge(
+    "janua_scheduler_interactive_p99_seconds", "Recent interactive p99 (wait + run)",
+    callback=lambda: scheduler.interactive_p99 or 0.0,
+)
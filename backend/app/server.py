@@ -0,0 +1,295 @@
+"""
+Pre-fork multi-worker server.
+
+    python -m app.server
+
+The parent process imports the app, runs the warmup (fonts, logo, PDF
+libraries, Pydantic serializers), freezes the GC and binds the socket. Then it
+forks `settings.workers` uvicorn workers that all accept on that socket. The
+workers get the warmed-up heap copy-on-write. gc.freeze() keeps the collector
+from touching those objects, which would otherwise copy the pages anyway.
+
+Signals to the parent:
+- SIGTERM / SIGINT: graceful shutdown. Workers finish in-flight requests,
+  and any still running after graceful_timeout are killed.
+- SIGHUP: rolling restart. Workers are replaced one at a time, new one
+  first, so capacity never drops.
+
+Workers recycle themselves after worker_max_requests requests or once their
+RSS is above worker_max_memory_mb, and the parent starts a fresh one.
+"""
+
+import gc
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Dict, Optional, Set
+
+from app.config import settings
+from app.logger import get_logger, restart_logging_after_fork, rotate_log_file, shutdown_logging
+
+logger = get_logger(__name__)
+
+# How often the parent checks on its workers, and workers on their memory
+SUPERVISE_INTERVAL = 0.5
+MEMORY_CHECK_INTERVAL = 5.0
+
+
+def available_cpus() -> int:
+    """CPUs this process may use, honouring cgroup quotas (containers)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    # cgroup v2: "max 100000" or "<quota> <period>"
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def current_rss_bytes() -> int:
+    """Resident memory of this process. Linux reads /proc, elsewhere the peak RSS."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _watch_memory(server, limit_bytes: int):
+    """Ask the worker to exit gracefully once it grows past the limit."""
+    while not server.should_exit:
+        time.sleep(MEMORY_CHECK_INTERVAL)
+        rss = current_rss_bytes()
+        if rss > limit_bytes:
+            logger.info(
+                "Worker %s using %.0f MB (limit %.0f MB), recycling",
+                os.getpid(), rss / 1e6, limit_bytes / 1e6
+            )
+            server.should_exit = True
+            return
+
+
+def run_worker(app, sock: socket.socket):
+    """Body of a forked worker. Never returns."""
+    import uvicorn
+
+    # Undo the parent's handlers; uvicorn installs its own for SIGTERM/SIGINT
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    restart_logging_after_fork()
+    random.seed()
+
+    max_requests = None
+    if settings.worker_max_requests > 0:
+        max_requests = settings.worker_max_requests + random.randint(0, max(0, settings.worker_max_requests_jitter))
+
+    config = uvicorn.Config(
+        app,
+        lifespan="on",
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=int(settings.graceful_timeout),
+        # Requests are logged by RequestContextMiddleware, and logging is
+        # already set up - don't let uvicorn replace it
+        access_log=False,
+        log_config=None,
+    )
+    server = uvicorn.Server(config)
+    if settings.worker_max_memory_mb > 0:
+        threading.Thread(
+            target=_watch_memory, args=(server, settings.worker_max_memory_mb * 1024 * 1024),
+            name="memory-watch", daemon=True,
+        ).start()
+
+    exit_code = 0
+    try:
+        server.run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %s crashed", os.getpid())
+        exit_code = 1
+    finally:
+        shutdown_logging()
+        # Skip the parent's atexit handlers and buffered state
+        os._exit(exit_code)
+
+
+class Arbiter:
+    """Parent process: keeps `num_workers` workers alive and handles signals."""
+
+    def __init__(self, app, sock: socket.socket, num_workers: int):
+        self.app = app
+        self.sock = sock
+        self.num_workers = num_workers
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        # Workers we stopped on purpose; they're not replaced when they exit
+        self.retiring: Set[int] = set()
+        self.shutting_down = False
+        self.restart_requested = False
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.app, self.sock)
+        self.workers[pid] = time.monotonic()
+        logger.info("Started worker %s", pid)
+        return pid
+
+    def reap(self):
+        """Collect exited workers and replace the ones that shouldn't have gone."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                logger.info("Worker %s stopped", pid)
+                continue
+            if self.shutting_down:
+                continue
+            lifetime = time.monotonic() - started
+            logger.info("Worker %s exited with code %s after %.0fs, replacing it", pid, code, lifetime)
+            if code != 0 and lifetime < 1:
+                # Crashing on startup - don't spin
+                time.sleep(1)
+            self.spawn()
+
+    def stop_worker(self, pid: int, timeout: float) -> bool:
+        """SIGTERM one worker and wait for it to exit. True if it did in time."""
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + timeout
+        while pid in self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        return pid not in self.workers
+
+    def rolling_restart(self):
+        logger.info("Rolling restart of %s workers", len(self.workers))
+        for pid in list(self.workers):
+            if self.shutting_down:
+                return
+            self.spawn()
+            # Give the replacement a moment to start its event loop
+            time.sleep(1)
+            if not self.stop_worker(pid, settings.graceful_timeout):
+                logger.warning("Worker %s didn't stop in time, killing it", pid)
+                self._kill(pid)
+        logger.info("Rolling restart done")
+
+    def shutdown(self):
+        logger.info("Shutting down %s workers", len(self.workers))
+        for pid in list(self.workers):
+            self.retiring.add(pid)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + settings.graceful_timeout
+        while self.workers and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.workers):
+            logger.warning("Worker %s didn't stop in time, killing it", pid)
+            self._kill(pid)
+
+    def _kill(self, pid: int):
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        self.workers.pop(pid, None)
+        self.retiring.discard(pid)
+
+    def _on_stop(self, signum, frame):
+        self.shutting_down = True
+
+    def _on_hup(self, signum, frame):
+        self.restart_requested = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_hup)
+
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        while not self.shutting_down:
+            self.reap()
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+            # Workers only reopen the log file; rotating it is our job
+            rotate_log_file()
+            time.sleep(SUPERVISE_INTERVAL)
+
+        self.shutdown()
+        self.sock.close()
+
+
+def main(num_workers: Optional[int] = None):
+    from app.cache import reset_shared_cache
+    from app.main import app
+    from app.warmup import run_warmup
+
+    num_workers = num_workers or settings.workers or available_cpus()
+    logger.info(
+        "Pre-fork server on %s:%s with %s workers (parent %s)",
+        settings.host, settings.port, num_workers, os.getpid()
+    )
+
+    # Warm up once here; workers see warmup_state.ready and skip their own
+    run_warmup()
+
+    # Created here so every worker maps the same file; emptied so nothing
+    # rendered by the previous deploy is served
+    reset_shared_cache()
+
+    sock = bind_socket(settings.host, settings.port)
+
+    # Everything allocated so far is shared with the workers. Collect once,
+    # then move it all to the permanent generation so the workers' GC never
+    # writes to (and so copies) those pages.
+    gc.collect()
+    gc.freeze()
+    logger.info("Froze %s objects before forking", gc.get_freeze_count())
+
+    Arbiter(app, sock, num_workers).run()
+    logger.info("Server stopped")
+
+
+if __name__ == "__main__":
+    main()
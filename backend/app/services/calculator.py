@@ -1,7 +1,14 @@
 ﻿from app.models.balance_sheet import BalanceSheet
 from app.models.income_statement import IncomeStatement
 from app.models.financial_data import MetricValue, PerformanceMetrics
+from app.services.calculator_profiler import CalculatorProfiler
 from datetime import datetime
+from typing import Optional
+import time
+
+# Bump whenever a formula or interpretation changes - it's part of the ETag,
+# so cached results from an older calculator are never reused
+CALCULATOR_VERSION = "1.0.0"
 
 class FinancialCalculator:
     """
@@ -9,13 +16,31 @@ class FinancialCalculator:
     Fórmulas baseadas 100% no ficheiro Excel fornecido pelo cliente.
     """
     
-    def __init__(self, balanco: BalanceSheet, demonstracao: IncomeStatement):
+    def __init__(self, balanco: BalanceSheet, demonstracao: IncomeStatement,
+                 profiler: Optional[CalculatorProfiler] = None):
         self.bs = balanco
         self.dr = demonstracao
+        self.profiler = profiler
+        
+        if profiler is not None:
+            # Shadow every _calc_* method with an instrumented one on this
+            # instance, so nested self._calc_*() calls are counted too
+            for name in dir(type(self)):
+                if name.startswith("_calc_"):
+                    setattr(self, name, profiler.wrap(name, getattr(self, name)))
     
     def calculate_all(self) -> PerformanceMetrics:
         """Calcula TODAS as 51 métricas do Excel Performance sheet"""
+        if self.profiler is None:
+            return self._build_metrics()
         
+        start = time.perf_counter()
+        try:
+            return self._build_metrics()
+        finally:
+            self.profiler.total_seconds += time.perf_counter() - start
+    
+    def _build_metrics(self) -> PerformanceMetrics:
         return PerformanceMetrics(
             # ========== Dimensão / Produção (6) ==========
             consumos_intermedios=self._calc_consumos_intermedios(),
@@ -0,0 +1,78 @@
+"""
+Opt-in profiler for FinancialCalculator.
+Many metrics call other _calc_* methods (VAB calls VBP and CI, TC calls VAB...),
+so a slow calculate_all() can hide behind a single metric that gets
+recomputed several times. This records, per method:
+
+- calls: how many times it ran, nested calls included
+- total: inclusive time, counted once per outermost call so re-entrant
+  calls aren't double counted
+- self: time spent in the method itself, excluding nested _calc_* calls
+"""
+
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List
+
+
+class CalculatorProfiler:
+    """Collects call counts and timings for the methods it wraps."""
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {}
+        # Each frame: [method name, time spent in nested wrapped calls]
+        self._stack: List[list] = []
+        self.total_seconds = 0.0
+
+    def wrap(self, name: str, method: Callable) -> Callable:
+        """Return `method` instrumented under `name`."""
+
+        @wraps(method)
+        def profiled(*args, **kwargs):
+            entry = self.stats.setdefault(name, {"calls": 0, "total": 0.0, "self": 0.0})
+            entry["calls"] += 1
+            outermost = all(frame[0] != name for frame in self._stack)
+            frame = [name, 0.0]
+            self._stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self._stack.pop()
+                entry["self"] += elapsed - frame[1]
+                if outermost:
+                    entry["total"] += elapsed
+                if self._stack:
+                    self._stack[-1][1] += elapsed
+
+        return profiled
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Rows sorted by self time, slowest first. Times in milliseconds."""
+        rows = [
+            {
+                "method": name,
+                "calls": int(entry["calls"]),
+                "total_ms": round(entry["total"] * 1000, 4),
+                "self_ms": round(entry["self"] * 1000, 4),
+            }
+            for name, entry in self.stats.items()
+        ]
+        rows.sort(key=lambda row: row["self_ms"], reverse=True)
+        return {
+            "total_ms": round(self.total_seconds * 1000, 4),
+            "methods": rows,
+        }
+
+    def format_table(self) -> str:
+        """Plain-text table, same ordering as as_dict()."""
+        data = self.as_dict()
+        width = max([len(row["method"]) for row in data["methods"]] + [len("method")])
+        lines = [f"{'method':<{width}} {'calls':>6} {'total ms':>10} {'self ms':>10}"]
+        for row in data["methods"]:
+            lines.append(
+                f"{row['method']:<{width}} {row['calls']:>6} {row['total_ms']:>10.4f} {row['self_ms']:>10.4f}"
+            )
+        lines.append(f"calculate_all total: {data['total_ms']:.4f} ms")
+        return "\n".join(lines)
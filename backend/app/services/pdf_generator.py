@@ -8,10 +8,91 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.pdfbase import pdfmetrics
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
 from datetime import datetime
 from io import BytesIO
+from typing import Optional
 import os
+import threading
+
+
+LOGO_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'frontend', 'public')
+LOGO_PATH = os.path.join(LOGO_DIR, 'logo_blue.png')
+# Same logo already shrunk to the 200px thumbnail the report uses
+LOGO_THUMBNAIL_PATH = os.path.join(LOGO_DIR, 'logo_blue_resized.png')
+REPORT_FONTS = ('Helvetica', 'Helvetica-Bold')
+
+# The source logo is a ~20000x6000 PNG; decoding and shrinking it took ~4s,
+# which used to happen on every report. Now the pre-shrunk copy is used when
+# present, and either way it's loaded once per process.
+_logo_png: Optional[bytes] = None
+_logo_loaded = False
+_logo_lock = threading.Lock()
+
+
+def load_logo() -> Optional[bytes]:
+    """Thumbnail of the logo as PNG bytes, or None when it can't be loaded."""
+    global _logo_png, _logo_loaded
+    if _logo_loaded:
+        return _logo_png
+    with _logo_lock:
+        if not _logo_loaded:
+            if os.path.exists(LOGO_THUMBNAIL_PATH):
+                with open(LOGO_THUMBNAIL_PATH, 'rb') as logo_file:
+                    _logo_png = logo_file.read()
+            elif os.path.exists(LOGO_PATH):
+                try:
+                    from PIL import Image as PILImage
+                    PILImage.MAX_IMAGE_PIXELS = None
+                    pil_img = PILImage.open(LOGO_PATH)
+                    pil_img.thumbnail((200, 200), PILImage.Resampling.LANCZOS)
+                    output = BytesIO()
+                    pil_img.save(output, 'PNG')
+                    _logo_png = output.getvalue()
+                except Exception:
+                    _logo_png = None
+            _logo_loaded = True
+    return _logo_png
+
+
+def preload_assets():
+    """Decode the logo and load the font metrics reports use."""
+    load_logo()
+    for font_name in REPORT_FONTS:
+        pdfmetrics.getFont(font_name)
+
+
+def build_report_inputs(data, metrics) -> dict:
+    """
+    The keyword arguments generate_report() expects, from parsed input data
+    (EnhancedInputData) and the calculator's PerformanceMetrics.
+    """
+    # Convert metrics to dict format
+    metrics_dict = {}
+    for field_name, field_value in metrics.__dict__.items():
+        if hasattr(field_value, '__dict__'):
+            metrics_dict[field_name] = field_value.__dict__
+        else:
+            metrics_dict[field_name] = field_value
+    
+    # Balance sheet data including computed properties
+    year_n = data.balanco.year_n
+    balance_sheet_data = {
+        **year_n.__dict__,
+        'total_ativo': year_n.total_ativo,
+        'total_passivo': year_n.total_passivo,
+        'total_capital_proprio': year_n.total_capital_proprio,
+        'total_ativo_corrente': year_n.total_ativo_corrente,
+        'total_passivo_corrente': year_n.total_passivo_corrente,
+    }
+    
+    return {
+        'empresa_nome': data.company_info.nome_empresa,
+        'metrics': metrics_dict,
+        'balance_sheet': balance_sheet_data,
+        'income_statement': {**data.demonstracao_resultados.year_n.__dict__},
+    }
 
 
 class FinancialPDFGenerator:
@@ -26,19 +107,9 @@ class FinancialPDFGenerator:
         
     def _create_logo_box(self):
         """Create logo box - removed placeholder text as per client request"""
-        logo_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'frontend', 'public', 'logo_blue.png')
-        
-        if os.path.exists(logo_path):
-            try:
-                from PIL import Image as PILImage
-                PILImage.MAX_IMAGE_PIXELS = None
-                pil_img = PILImage.open(logo_path)
-                pil_img.thumbnail((200, 200), PILImage.Resampling.LANCZOS)
-                temp_path = os.path.join(os.path.dirname(logo_path), 'logo_temp.png')
-                pil_img.save(temp_path, 'PNG')
-                return Image(temp_path, width=2.5*cm, height=2.5*cm)
-            except:
-                pass
+        logo_png = load_logo()
+        if logo_png:
+            return Image(BytesIO(logo_png), width=2.5*cm, height=2.5*cm)
         
         # Return empty space instead of placeholder text
         empty_space = Paragraph('', ParagraphStyle('Empty', fontSize=8))
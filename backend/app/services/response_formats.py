@@ -0,0 +1,206 @@
+"""
+Alternative response formats for /api/calculate.
+The default JSON repeats nome/unidade for all 51 metrics on every call, which
+adds up quickly for batch clients. The compact format sends that static
+metadata once (identified by a schema version id) and the values as arrays.
+"""
+
+import hashlib
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from app.models.financial_data import CalculationResult, MetricValue, PerformanceMetrics
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional - compact JSON still works without it
+    msgpack = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+COMPACT_MEDIA_TYPE = "application/vnd.janua.compact+json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Header clients send with the schema version they already have cached
+SCHEMA_HEADER = "X-Metrics-Schema"
+# Both pick the representation, so shared caches have to key on both
+VARY = f"Accept, {SCHEMA_HEADER}"
+
+# Trend arrows as small integers: 1 = improving, -1 = declining, 0 = stable
+TREND_CODES = {"▲": 1, "▼": -1, "▶": 0, "►": 0}
+
+
+@lru_cache(maxsize=1)
+def metric_schema() -> Dict[str, Any]:
+    """
+    Static metadata for every MetricValue field, in response order.
+    Built once by running the calculator on an empty company, since nome and
+    unidade are fixed per metric and don't depend on the input values.
+    """
+    # Imported here to avoid a circular import (calculator imports the models)
+    from app.models.balance_sheet import BalanceSheet, BalanceSheetYear
+    from app.models.income_statement import IncomeStatement, IncomeStatementYear
+    from app.services.calculator import FinancialCalculator
+
+    empty_bs = BalanceSheet(year_n=BalanceSheetYear(), year_n1=BalanceSheetYear(), year_n2=BalanceSheetYear())
+    empty_dr = IncomeStatement(year_n=IncomeStatementYear(), year_n1=IncomeStatementYear(), year_n2=IncomeStatementYear())
+    metrics = FinancialCalculator(balanco=empty_bs, demonstracao=empty_dr).calculate_all()
+
+    fields = [
+        {"key": key, "nome": value.nome, "unidade": value.unidade}
+        for key, value in _metric_values(metrics)
+    ]
+    digest = hashlib.sha256(json.dumps(fields, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+    return {
+        "version": digest.hexdigest()[:12],
+        "columns": ["year_n", "year_n1", "year_n2", "tendencia"],
+        "trend_codes": {"1": "▲", "-1": "▼", "0": "▶"},
+        "fields": fields,
+    }
+
+
+def _metric_values(metrics: PerformanceMetrics):
+    """Yield (key, MetricValue) pairs in model field order."""
+    for key in PerformanceMetrics.model_fields:
+        value = getattr(metrics, key)
+        if isinstance(value, MetricValue):
+            yield key, value
+
+
+def to_compact(result: CalculationResult, include_meta: bool = True) -> Dict[str, Any]:
+    """
+    Convert a CalculationResult into the columnar shape.
+    values[i] = [n, n1, n2, trend_code] for schema field i.
+    """
+    schema = metric_schema()
+    values: List[List[Any]] = []
+    interpretacoes: List[Optional[str]] = []
+
+    for _, metric in _metric_values(result.metrics):
+        values.append([
+            metric.year_n,
+            metric.year_n1,
+            metric.year_n2,
+            TREND_CODES.get(metric.tendencia, 0),
+        ])
+        interpretacoes.append(metric.interpretacao)
+
+    payload = {
+        "schema": schema["version"],
+        "timestamp": result.timestamp.isoformat(),
+        "empresa": result.empresa,
+        "success": result.success,
+        "message": result.message,
+        "values": values,
+        "interpretacoes": interpretacoes,
+        "resumo_balanco_funcional": result.metrics.resumo_balanco_funcional,
+    }
+    if result.result_token:
+        payload["result_token"] = result.result_token
+    if include_meta:
+        payload["meta"] = schema
+    return payload
+
+
+def _parse_accept(accept: str) -> List[tuple]:
+    """Parse an Accept header into (media_type, q) pairs, highest q first."""
+    entries = []
+    for position, part in enumerate(accept.split(",")):
+        pieces = [p.strip() for p in part.split(";")]
+        media_type = pieces[0].lower()
+        if not media_type:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        # Keep original order as a tie-breaker
+        entries.append((media_type, q, position))
+    entries.sort(key=lambda e: (-e[1], e[2]))
+    return [(media_type, q) for media_type, q, _ in entries]
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """
+    Pick the response format from the Accept header.
+    Returns "json", "compact" or "msgpack". Anything we don't recognise falls
+    back to the regular JSON so existing clients keep working.
+    """
+    if not accept:
+        return "json"
+
+    for media_type, q in _parse_accept(accept):
+        if q <= 0:
+            continue
+        if media_type == COMPACT_MEDIA_TYPE:
+            return "compact"
+        if media_type in MSGPACK_MEDIA_TYPES and msgpack is not None:
+            return "msgpack"
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return "json"
+
+    return "json"
+
+
+def representation_id(request: Request) -> str:
+    """
+    Short name for the exact response body this request will get.
+    Used in ETags, so it must change whenever the bytes would.
+    """
+    response_format = negotiate_format(request.headers.get("accept"))
+    if response_format == "json":
+        return "json"
+    if request.headers.get(SCHEMA_HEADER) != metric_schema()["version"]:
+        return f"{response_format}+meta"
+    return response_format
+
+
+def render_result(
+    result: CalculationResult,
+    request: Request,
+    response: Response,
+    headers: Optional[Dict[str, str]] = None,
+    extra: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """
+    Render a calculation result in the format the client asked for.
+    Plain JSON is serialized here too rather than left to FastAPI, so the
+    caller can time it as the "render" stage. Extra `headers` (ETag, Cache-Control...) are added to either kind of
+    response; `extra` keys (e.g. a profile) are added to the body.
+    """
+    response_format = negotiate_format(request.headers.get("accept"))
+    headers = {"Vary": VARY, **(headers or {})}
+
+    if response_format == "json":
+        content = jsonable_encoder(result)
+        if extra:
+            content.update(extra)
+        return JSONResponse(content=content, headers=headers)
+
+    client_schema = request.headers.get(SCHEMA_HEADER)
+    include_meta = client_schema != metric_schema()["version"]
+    payload = to_compact(result, include_meta=include_meta)
+    if extra:
+        payload.update(extra)
+
+    if response_format == "msgpack":
+        body = msgpack.packb(payload, use_bin_type=True)
+        media_type = MSGPACK_MEDIA_TYPES[0]
+    else:
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        media_type = COMPACT_MEDIA_TYPE
+
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={**headers, SCHEMA_HEADER: payload["schema"]},
+    )
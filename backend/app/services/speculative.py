@@ -0,0 +1,134 @@
+"""
+Speculative PDF pre-rendering.
+
+Most users who run /api/calculate download the PDF a few seconds later. With
+settings.speculative_pdf_enabled, a successful calculation queues a render of
+that report into the result cache, so the later /api/generate-pdf is a cache
+hit (or joins the render still running, through single-flight).
+
+Speculative work only ever uses spare capacity:
+- renders run at background priority on the scheduler (app.scheduler), one
+  at a time by default and never in the slots reserved for interactive work
+- a job only starts while no more than speculative_max_in_flight requests are
+  being handled and no interactive work is waiting for a slot; otherwise it
+  waits, and jobs older than speculative_max_age_seconds are dropped
+- the queue is bounded; when full, the oldest job is dropped
+
+janua_speculative_pdf_total{result} counts what happened to each job, and
+result="used" counts reports that were later downloaded, so
+used / rendered is the hit rate.
+"""
+
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Tuple
+
+from app.cache import get_cache, report_key
+from app.cache.single_flight import single_flight
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REGISTRY, REQUESTS_IN_FLIGHT, threadpool_statistics
+from app.scheduler import BACKGROUND, INTERACTIVE, scheduler
+
+logger = get_logger(__name__)
+
+SPECULATIVE_PDF = REGISTRY.counter(
+    "janua_speculative_pdf_total",
+    "Speculative PDF renders by result: rendered, cached (already there), dropped, expired, failed, used",
+    ("result",),
+)
+
+# How often a waiting job re-checks the load
+POLL_INTERVAL = 0.1
+
+
+def _marker_key(input_hash: str, report_date: str) -> str:
+    return f"spec:{report_key(input_hash, report_date)}"
+
+
+class SpeculativeRenderer:
+    def __init__(self):
+        # (input hash, report date) -> (queued at, render function, args)
+        self._queue: "OrderedDict[Tuple[str, str], Tuple[float, Callable[..., Any], tuple]]" = OrderedDict()
+        self._task = None
+
+    def submit(self, input_hash: str, report_date: str, render: Callable[..., Any], *args):
+        """Queue a render of this report. `render(*args)` must store the PDF in the result cache."""
+        if not settings.speculative_pdf_enabled or get_cache() is None:
+            return
+        job = (input_hash, report_date)
+        if job in self._queue:
+            return
+        if len(self._queue) >= settings.speculative_queue_size:
+            self._queue.popitem(last=False)
+            SPECULATIVE_PDF.inc(result="dropped")
+        self._queue[job] = (time.monotonic(), render, args)
+        if self._task is None or self._task.done():
+            # Empty context: this isn't part of the request that queued it
+            self._task = asyncio.get_running_loop().create_task(self._drain(), context=contextvars.Context())
+
+    def _idle(self) -> bool:
+        return (
+            REQUESTS_IN_FLIGHT.value() <= settings.speculative_max_in_flight
+            and scheduler.waiting(INTERACTIVE) == 0
+            and threadpool_statistics().tasks_waiting == 0
+        )
+
+    async def _drain(self):
+        while self._queue:
+            if not self._idle():
+                self._expire()
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            (input_hash, report_date), (_, render, args) = self._queue.popitem(last=False)
+            if report_date != datetime.now().strftime('%Y%m%d'):
+                SPECULATIVE_PDF.inc(result="expired")
+                continue
+            try:
+                await single_flight.run(
+                    "generate_report", f"{input_hash}:{report_date}",
+                    self._render, input_hash, report_date, render, args,
+                    priority=BACKGROUND,
+                )
+            except Exception as e:
+                SPECULATIVE_PDF.inc(result="failed")
+                logger.warning("Speculative PDF render failed: %s", e)
+
+    def _expire(self):
+        cutoff = time.monotonic() - settings.speculative_max_age_seconds
+        while self._queue:
+            job, (queued_at, _, _) = next(iter(self._queue.items()))
+            if queued_at >= cutoff:
+                return
+            del self._queue[job]
+            SPECULATIVE_PDF.inc(result="expired")
+
+    @staticmethod
+    def _render(input_hash: str, report_date: str, render: Callable[..., Any], args: tuple) -> bytes:
+        cache = get_cache()
+        pdf = cache.get(report_key(input_hash, report_date))
+        if pdf is not None:
+            SPECULATIVE_PDF.inc(result="cached")
+            return pdf
+        pdf = render(*args)
+        # Lets generate-pdf tell a speculative hit from a regular cache hit
+        cache.set(_marker_key(input_hash, report_date), b"1", settings.cache_ttl_seconds or None)
+        SPECULATIVE_PDF.inc(result="rendered")
+        logger.debug("Speculatively rendered report %s", input_hash[:12])
+        return pdf
+
+    def record_download(self, input_hash: str, report_date: str):
+        """Call when a report is downloaded; counts it once if it was rendered speculatively."""
+        if not settings.speculative_pdf_enabled:
+            return
+        cache = get_cache()
+        marker = _marker_key(input_hash, report_date)
+        if cache is not None and cache.get(marker) is not None:
+            cache.delete(marker)
+            SPECULATIVE_PDF.inc(result="used")
+
+
+speculative_renderer = SpeculativeRenderer()
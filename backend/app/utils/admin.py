@@ -0,0 +1,28 @@
+"""
+Access control for the /admin endpoints (profiling, memory stats).
+
+They're off unless settings.admin_token is set; then requests need the same
+value in the X-Admin-Token header. Disabled endpoints answer 404, so they
+look like they don't exist.
+"""
+
+import secrets
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+def require_admin(request: Request):
+    """404 when admin endpoints are off, 403 without the right token."""
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    if not secrets.compare_digest(token.encode("utf-8"), settings.admin_token.encode("utf-8")):
+        logger.warning("Rejected admin request to %s", request.url.path)
+        raise HTTPException(status_code=403, detail="ERRO: Acesso negado.")
@@ -0,0 +1,159 @@
+"""
+Request deadlines and cancellation for dead clients.
+
+If a user closes the tab during a slow /api/generate-pdf, there's no point
+finishing the render. Each calculation/report request gets a Deadline:
+settings.request_deadline_seconds from when it arrived (clients can ask for a
+different budget with X-Request-Timeout, up to request_deadline_max_seconds).
+
+- guard() awaits the request's work while watching for the client to
+  disconnect. On disconnect or when the deadline passes, it stops waiting,
+  cancels the work and raises RequestCancelled (499 / 504).
+- Cancelled work still waiting for the scheduler just leaves the queue.
+  Work already running on a thread can't be interrupted, so blocking code
+  calls checkpoint() between stages (validation, calculation, render) and
+  stops there.
+
+The current Deadline lives in a contextvar, which the executor threads
+inherit. Shared work (single-flight) gets a Deadline of its own that is only
+cancelled once every request waiting for it is gone.
+
+janua_cancelled_total{reason, stage} counts it: stage="request" for requests
+given up on, any other stage for executor work stopped before that stage.
+"""
+
+import asyncio
+import contextvars
+import math
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Optional, TypeVar
+
+from fastapi import HTTPException, Request
+
+from app.config import settings
+from app.exceptions import RequestCancelled
+from app.logger import get_logger
+from app.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+DEADLINE_HEADER = "X-Request-Timeout"
+
+CANCELLED = REGISTRY.counter(
+    "janua_cancelled_total",
+    "Cancelled work by reason (disconnect, deadline, abandoned) and the stage it stopped before",
+    ("reason", "stage"),
+)
+
+T = TypeVar("T")
+
+
+class Deadline:
+    __slots__ = ("expires_at", "reason")
+
+    def __init__(self, expires_at: Optional[float] = None):
+        self.expires_at = expires_at
+        # Set once cancelled; read from executor threads
+        self.reason: Optional[str] = None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, None without a deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    def check(self, stage_name: str):
+        """Raise RequestCancelled if cancelled or past the deadline."""
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.reason = "deadline"
+        if self.reason is not None:
+            CANCELLED.inc(reason=self.reason, stage=stage_name)
+            raise RequestCancelled(self.reason)
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def start_deadline(request: Request) -> Deadline:
+    """Deadline for this request (also made current). 400 if X-Request-Timeout is malformed."""
+    seconds = settings.request_deadline_seconds
+    requested = request.headers.get(DEADLINE_HEADER)
+    if requested is not None:
+        try:
+            seconds = float(requested)
+        except ValueError:
+            seconds = math.nan
+        if not 0 < seconds < math.inf:
+            raise HTTPException(
+                status_code=400,
+                detail=f"ERRO: O cabeçalho {DEADLINE_HEADER} deve ser um número de segundos maior que zero."
+            )
+        seconds = min(seconds, settings.request_deadline_max_seconds)
+    expires_at = None
+    if seconds:
+        # Time spent queued in the rate limiter counts too
+        expires_at = getattr(request.state, "received_at", None) or time.monotonic()
+        expires_at += seconds
+    deadline = Deadline(expires_at)
+    _current.set(deadline)
+    return deadline
+
+
+def checkpoint(stage_name: str):
+    """Stop here if the current request (or shared work) was cancelled. Safe to call from threads."""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check(stage_name)
+
+
+def detached_context(deadline: Deadline) -> contextvars.Context:
+    """A copy of the current context with `deadline` as the current deadline."""
+    context = contextvars.copy_context()
+    context.run(_current.set, deadline)
+    return context
+
+
+async def _disconnected(request: Request):
+    # The body has been read already, so the next message is the disconnect
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+def _retrieve(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()
+
+
+async def guard(request: Request, work: Awaitable[T]) -> T:
+    """
+    Await `work`, cancelling it if the client disconnects or the request's
+    deadline passes first. Only call once the request body has been read.
+    """
+    deadline = _current.get()
+    task = asyncio.ensure_future(work)
+    if deadline is None:
+        return await task
+    watcher = asyncio.ensure_future(_disconnected(request))
+    try:
+        done, _ = await asyncio.wait(
+            (task, watcher), timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+        )
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if task in done:
+        return task.result()
+
+    deadline.cancel("disconnect" if watcher in done else "deadline")
+    # Don't wait for it - a thread finishes its current stage first
+    task.cancel()
+    task.add_done_callback(_retrieve)
+    logger.info("Cancelled %s %s: %s", request.method, request.url.path, deadline.reason)
+    deadline.check("request")
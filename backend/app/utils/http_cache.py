@@ -0,0 +1,70 @@
+"""
+ETag helpers for conditional requests.
+Results are a pure function of the input data and the calculator version, so
+a hash of both is enough to tell a client its cached copy is still good.
+"""
+
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.models.financial_data import EnhancedInputData
+from app.services.calculator import CALCULATOR_VERSION
+
+
+def canonical_input_hash(data: EnhancedInputData) -> str:
+    """
+    SHA-256 of the parsed input plus the calculator version.
+    Hashing after Pydantic parsing means "1.234,50" and 1234.5 give the same
+    hash, and key order in the request body doesn't matter.
+    """
+    canonical = json.dumps(
+        data.model_dump(mode="json"),
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    digest = hashlib.sha256()
+    digest.update(CALCULATOR_VERSION.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(canonical.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_etag(input_hash: str, representation: str, weak: bool = False) -> str:
+    """
+    ETag for one representation (json, compact, pdf...) of a result.
+    Different representations of the same input must not share a validator.
+    Use weak=True for bodies CompressionMiddleware may compress: it weakens
+    the 200's validator then, and the 304 has to send the same one.
+    """
+    digest = hashlib.sha256(f"{input_hash}:{representation}".encode("utf-8")).hexdigest()
+    return f'{"W/" if weak else ""}"{digest[:32]}"'
+
+
+def _opaque_tag(tag: str) -> str:
+    """Strip the weak prefix - If-None-Match uses weak comparison."""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match covers this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == wanted for tag in header.split(","))
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None, vary: str = "Accept") -> Response:
+    """304 response carrying the validator and caching headers (the same Vary as the 200)."""
+    headers = {"ETag": etag, "Vary": vary}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,121 @@
+"""
+Idempotency-Key support for POST endpoints that are expensive to repeat.
+
+Mobile clients on flaky networks retry POSTs. When a request carries an
+Idempotency-Key header, the completed response is remembered for
+settings.idempotency_ttl_seconds, and a retry with the same key gets it
+replayed (with Idempotent-Replayed: true) instead of being processed again.
+
+Records live in the result cache (app.cache), so they're shared between
+workers and replicas the same way results are. A record holds the status and
+headers plus the cache key of the artifact holding the body - the rendered PDF
+is already cached, other bodies get their own entry (raw bytes compress much
+better than base64 inside the record). If that artifact has been evicted, the
+request is simply processed again.
+
+Keys are per client (the rate limiter's client_id: API key or address), so
+two clients that happen to pick the same key never get each other's
+responses.
+
+Reusing a key with a different payload is a client bug and gets a 422.
+"""
+
+import json
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from app.cache import get_cache
+from app.config import settings
+from app.logger import get_logger
+from app.metrics import REGISTRY
+from app.middleware.rate_limit import client_id
+
+logger = get_logger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+IDEMPOTENT_REPLAYS = REGISTRY.counter(
+    "janua_idempotent_replays_total", "Responses replayed for a repeated Idempotency-Key", ("route",)
+)
+
+
+def idempotency_key(request: Request) -> Optional[str]:
+    """
+    The request's Idempotency-Key prefixed with the client's id, None without
+    one. 400 if it's malformed.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key is None:
+        return None
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise HTTPException(
+            status_code=400,
+            detail=f"ERRO: O cabeçalho {IDEMPOTENCY_HEADER} deve ter entre 1 e {MAX_KEY_LENGTH} caracteres imprimíveis."
+        )
+    return f"{client_id(request.scope)}:{key}"
+
+
+def _record_key(route: str, key: str) -> str:
+    return f"idem:{route}:{key}"
+
+
+def _body_key(route: str, key: str) -> str:
+    return f"idem-body:{route}:{key}"
+
+
+def replay(route: str, key: str, fingerprint: str) -> Optional[Response]:
+    """
+    The stored response for this key, or None when there is none (or its
+    artifact is gone) and the request should be processed.
+    `fingerprint` identifies the payload, e.g. its canonical input hash.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    raw = cache.get(_record_key(route, key))
+    if raw is None:
+        return None
+    record = json.loads(raw)
+    if record["fingerprint"] != fingerprint:
+        logger.warning("Idempotency-Key %r reused with a different payload on %s", key, route)
+        raise HTTPException(
+            status_code=422,
+            detail=f"ERRO: Este {IDEMPOTENCY_HEADER} já foi usado com dados diferentes. Use uma nova chave para um novo pedido."
+        )
+
+    body = cache.get(record["artifact"]) if record.get("artifact") else None
+    if body is None:
+        logger.debug("Idempotent response artifact for %r expired, processing again", key)
+        return None
+
+    IDEMPOTENT_REPLAYS.inc(route=route)
+    logger.info("Replaying response for Idempotency-Key %r on %s", key, route)
+    headers = {**record["headers"], REPLAYED_HEADER: "true"}
+    return Response(content=body, status_code=record["status"], headers=headers, media_type=record["media_type"])
+
+
+def remember(route: str, key: str, fingerprint: str, status_code: int, media_type: str,
+             headers: Dict[str, str], body: Optional[bytes] = None, artifact: Optional[str] = None):
+    """Store a completed response. Pass `artifact` (a cache key) instead of `body` when the body is already cached."""
+    cache = get_cache()
+    if cache is None:
+        return
+    ttl = settings.idempotency_ttl_seconds or None
+    if artifact is None:
+        artifact = _body_key(route, key)
+        if not cache.set(artifact, body or b"", ttl):
+            # Too large for the cache - retries get processed again
+            return
+    record = {
+        "fingerprint": fingerprint,
+        "status": status_code,
+        "media_type": media_type,
+        "headers": headers,
+        "artifact": artifact,
+    }
+    cache.set(_record_key(route, key), json.dumps(record).encode("utf-8"), ttl)
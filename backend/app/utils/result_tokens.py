@@ -0,0 +1,74 @@
+"""
+Result tokens: /api/calculate hands out a token for the input it just
+calculated, and /api/generate-pdf accepts {"result_token": "..."} instead of
+the whole payload. The report then skips body parsing, validation and
+calculate_all() - the token points at the already validated input and its
+cached metrics.
+
+Tokens are stored in the result cache (app.cache) for
+settings.result_token_ttl_seconds, so they work on any worker or replica
+sharing that cache. The same input always gets the same token, which keeps
+/api/calculate responses stable for ETags. An expired token is a 404 and the
+client sends the full payload instead.
+"""
+
+import hashlib
+import json
+from typing import Optional, Tuple
+
+from app.cache import get_cache
+from app.config import settings
+from app.models.financial_data import EnhancedInputData
+
+RESULT_TOKEN_FIELD = "result_token"
+RESULT_TOKEN_HEADER = "X-Result-Token"
+
+
+def _store_key(token: str) -> str:
+    return f"token:{token}"
+
+
+def _token(input_hash: str) -> str:
+    return hashlib.sha256(f"result-token:{input_hash}".encode("utf-8")).hexdigest()[:32]
+
+
+def issue_result_token(data: EnhancedInputData, input_hash: str) -> Optional[str]:
+    """Token for this input, or None when there's no cache to keep it in."""
+    cache = get_cache()
+    if cache is None:
+        return None
+    token = _token(input_hash)
+    record = {"input_hash": input_hash, "input": data.model_dump(mode="json")}
+    if not cache.set(_store_key(token), json.dumps(record).encode("utf-8"), settings.result_token_ttl_seconds or None):
+        return None
+    return token
+
+
+def current_result_token(data: EnhancedInputData, input_hash: str) -> Optional[str]:
+    """
+    Like issue_result_token(), but reuses the stored token while it's still
+    there. For 304s: clients poll, and rewriting the same record on every
+    poll only pushes other entries out of the cache.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+    token = _token(input_hash)
+    if cache.get(_store_key(token)) is not None:
+        return token
+    return issue_result_token(data, input_hash)
+
+
+def resolve_result_token(token: str) -> Optional[Tuple[EnhancedInputData, str]]:
+    """(input data, input hash) for a token, or None if it's unknown or expired."""
+    cache = get_cache()
+    if cache is None or not isinstance(token, str) or len(token) > 64:
+        return None
+    raw = cache.get(_store_key(token))
+    if raw is None:
+        return None
+    record = json.loads(raw)
+    # Parsed once already, so this only rebuilds the models. Business
+    # validation still runs in the PDF route unless the metrics are cached,
+    # and metrics are only ever cached for validated input.
+    return EnhancedInputData.model_validate(record["input"]), record["input_hash"]
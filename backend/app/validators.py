@@ -28,7 +28,7 @@ def validate_balance_sheet(balanco: BalanceSheet) -> bool:
     diff_n = abs(assets_n - liabilities_equity_n)
     
     if diff_n > tolerance:
-        logger.warning(f"Balance sheet year N doesn't balance. Difference: {diff_n}")
+        logger.warning("Balance sheet year N doesn't balance. Difference: %s", diff_n)
         raise BalanceSheetError(
             f"REGRA VIOLADA: Total do Ativo = Total do Passivo + Capital Próprio (Ano N)\n"
             f"Diferença encontrada: €{diff_n:.2f}\n"
@@ -43,7 +43,7 @@ def validate_balance_sheet(balanco: BalanceSheet) -> bool:
     diff_n1 = abs(assets_n1 - liabilities_equity_n1)
     
     if diff_n1 > tolerance:
-        logger.warning(f"Balance sheet year N-1 doesn't balance. Difference: {diff_n1}")
+        logger.warning("Balance sheet year N-1 doesn't balance. Difference: %s", diff_n1)
         raise BalanceSheetError(
             f"REGRA VIOLADA: Total do Ativo = Total do Passivo + Capital Próprio (Ano N-1)\n"
             f"Diferença encontrada: €{diff_n1:.2f}\n"
@@ -57,7 +57,7 @@ def validate_balance_sheet(balanco: BalanceSheet) -> bool:
     diff_n2 = abs(assets_n2 - liabilities_equity_n2)
     
     if diff_n2 > tolerance:
-        logger.warning(f"Balance sheet year N-2 doesn't balance. Difference: {diff_n2}")
+        logger.warning("Balance sheet year N-2 doesn't balance. Difference: %s", diff_n2)
         raise BalanceSheetError(
             f"REGRA VIOLADA: Total do Ativo = Total do Passivo + Capital Próprio (Ano N-2)\n"
             f"Diferença encontrada: €{diff_n2:.2f}\n"
@@ -225,10 +225,10 @@ def validate_on_request_only(balanco: BalanceSheet, demonstracao: IncomeStatemen
         return True, "Validação bem-sucedida"
         
     except (ValidationError, BalanceSheetError) as e:
-        logger.error(f"Validation failed: {e.detail}")
+        logger.error("Validation failed: %s", e.detail)
         raise
     except Exception as e:
-        logger.error(f"Unexpected validation error: {str(e)}")
+        logger.error("Unexpected validation error: %s", e)
         raise ValidationError(f"Erro inesperado na validação: {str(e)}")
 
 
@@ -0,0 +1,133 @@
+"""
+Startup warmup.
+The first request after a deploy used to pay for everything that loads
+lazily: reportlab and PIL imports, font metrics, the logo thumbnail, Pydantic
+serializers, the metric schema. Warmup runs one synthetic company through
+the same steps as /api/calculate and /api/generate-pdf (PDF kept in memory),
+then marks the instance ready for /ready.
+"""
+
+import time
+from datetime import datetime
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class WarmupState:
+    """Readiness flag plus what happened during warmup, for /ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.duration_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.duration_seconds, 3) if self.duration_seconds is not None else None,
+            "warmup_error": self.error,
+        }
+
+
+warmup_state = WarmupState()
+
+
+def _year(ativo_fixo, vendas):
+    """One balanced year: assets = liabilities + equity, matching net result."""
+    custos = {
+        "cmvmc": vendas * 0.6,
+        "fornecimentos_servicos_externos": vendas * 0.15,
+        "gastos_pessoal": vendas * 0.175,
+        "gastos_depreciacoes_amortizacoes": ativo_fixo * 0.05,
+        "juros_gastos_suportados": 2000.0,
+    }
+    rai = vendas - sum(custos.values())
+    imposto = round(rai * 0.21, 2)
+    resultado_liquido = rai - imposto
+
+    ativo = {"ativos_fixos_tangiveis": ativo_fixo, "inventarios": 40000.0, "clientes": 30000.0,
+             "caixa_depositos_bancarios": 20000.0}
+    passivo = {"fornecedores": 60000.0, "financiamentos_obtidos_nc": 80000.0}
+    capital_proprio = sum(ativo.values()) - sum(passivo.values())
+    balanco = {
+        **ativo,
+        **passivo,
+        "capital_realizado": 50000.0,
+        "resultado_liquido_periodo": resultado_liquido,
+        "resultados_transitados": capital_proprio - 50000.0 - resultado_liquido,
+    }
+    demonstracao = {"vendas_servicos_prestados": vendas, **custos, "imposto_rendimento": imposto}
+    return balanco, demonstracao
+
+
+def warmup_payload() -> dict:
+    """A small, valid company. Amounts are strings to go through the Portuguese number parser too."""
+    years = {"year_n": _year(150000.0, 400000.0), "year_n1": _year(155000.0, 380000.0),
+             "year_n2": _year(160000.0, 360000.0)}
+
+    def as_text(values):
+        return {key: f"{value:.2f}".replace(".", ",") for key, value in values.items()}
+
+    return {
+        "company_info": {"nome_empresa": "Warmup Lda", "setor_atividade": "Warmup"},
+        "balanco": {year: as_text(balanco) for year, (balanco, _) in years.items()},
+        "demonstracao_resultados": {year: as_text(demonstracao) for year, (_, demonstracao) in years.items()},
+    }
+
+
+def run_warmup() -> float:
+    """
+    Exercise the calculation and PDF paths once, then flip the readiness flag.
+    Blocking - call from a thread (or before the server starts). A failure is
+    logged and recorded but still ends in ready: a cold instance is better
+    than one that never takes traffic.
+    """
+    from app.models.financial_data import CalculationResult, EnhancedInputData
+    from app.services.calculator import FinancialCalculator
+    from app.services.response_formats import metric_schema, to_compact
+    from app.utils.http_cache import canonical_input_hash
+    from app.validators import validate_on_request_only
+
+    start = time.perf_counter()
+    try:
+        data = EnhancedInputData(**warmup_payload())
+        validate_on_request_only(data.balanco, data.demonstracao_resultados)
+        canonical_input_hash(data)
+        metrics = FinancialCalculator(balanco=data.balanco, demonstracao=data.demonstracao_resultados).calculate_all()
+        result = CalculationResult(
+            timestamp=datetime.now(),
+            empresa=data.company_info.nome_empresa,
+            metrics=metrics,
+            success=True,
+            message="Warmup",
+        )
+        jsonable_encoder(result)
+        metric_schema()
+        to_compact(result)
+        calc_seconds = time.perf_counter() - start
+
+        from app.services.pdf_generator import FinancialPDFGenerator, build_report_inputs, preload_assets
+        preload_assets()
+        FinancialPDFGenerator().generate_report(**build_report_inputs(data, metrics))
+        warmup_state.duration_seconds = time.perf_counter() - start
+        logger.info(
+            "Warmup finished in %.2fs (calculation path %.2fs, PDF path %.2fs)",
+            warmup_state.duration_seconds, calc_seconds, warmup_state.duration_seconds - calc_seconds
+        )
+    except Exception as e:
+        warmup_state.duration_seconds = time.perf_counter() - start
+        warmup_state.error = str(e)
+        logger.warning("Warmup failed after %.2fs: %s", warmup_state.duration_seconds, e, exc_info=True)
+    warmup_state.ready = True
+    return warmup_state.duration_seconds
+
+
+async def run_warmup_in_background():
+    """Warm up on a worker thread so /health and /ready answer meanwhile."""
+    await run_in_threadpool(run_warmup)
@@ -0,0 +1,94 @@
+"""
+CPU cost of response compression per MB, for every gzip level and brotli quality.
+Uses a real /api/calculate response body (and an NDJSON stream of them) so the
+numbers reflect our payloads rather than random text. The NDJSON sample repeats
+the same record, so its ratios are optimistic compared to a real batch export.
+
+Usage (from the backend folder):
+    python -m benchmarks.compression_levels
+    python -m benchmarks.compression_levels --megabytes 5 --json
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app.models.financial_data import CalculationResult, EnhancedInputData
+from app.services.calculator import FinancialCalculator
+from app.middleware.compression import brotli, compress_bytes
+
+SAMPLE_PATH = Path(__file__).parent / "data" / "sample_company.json"
+
+
+def calculation_body() -> bytes:
+    """Body of a regular /api/calculate response for the sample company."""
+    data = EnhancedInputData(**json.loads(SAMPLE_PATH.read_text(encoding="utf-8")))
+    metrics = FinancialCalculator(balanco=data.balanco, demonstracao=data.demonstracao_resultados).calculate_all()
+    result = CalculationResult(
+        timestamp=datetime.now(),
+        empresa=data.company_info.nome_empresa,
+        metrics=metrics,
+        success=True,
+        message="Cálculo realizado com sucesso",
+    )
+    return result.model_dump_json().encode("utf-8")
+
+
+def measure(data: bytes, encoding: str, level: int, repeat: int) -> dict:
+    """Average CPU time over `repeat` runs, scaled to milliseconds per MB."""
+    kwargs = {"gzip_level": level} if encoding == "gzip" else {"brotli_quality": level}
+    compressed = compress_bytes(data, encoding, **kwargs)
+
+    start = time.process_time()
+    for _ in range(repeat):
+        compress_bytes(data, encoding, **kwargs)
+    cpu = (time.process_time() - start) / repeat
+
+    megabytes = len(data) / 1_000_000
+    return {
+        "encoding": encoding,
+        "level": level,
+        "ratio": round(len(compressed) / len(data), 4),
+        "cpu_ms_per_mb": round(cpu * 1000 / megabytes, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--megabytes", type=float, default=1.0, help="size of the NDJSON sample")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    single = calculation_body()
+    copies = max(1, int(args.megabytes * 1_000_000 / (len(single) + 1)))
+    samples = {
+        "single": single,
+        "ndjson": b"\n".join([single] * copies) + b"\n",
+    }
+
+    levels = [("gzip", level) for level in range(1, 10)]
+    if brotli is not None:
+        levels += [("br", quality) for quality in range(0, 12)]
+
+    rows = []
+    for name, data in samples.items():
+        for encoding, level in levels:
+            rows.append({"sample": name, "bytes": len(data), **measure(data, encoding, level, args.repeat)})
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'sample':<8} {'bytes':>10} {'enc':<5} {'level':>5} {'ratio':>7} {'cpu ms/MB':>10}")
+    for row in rows:
+        print(
+            f"{row['sample']:<8} {row['bytes']:>10} {row['encoding']:<5} {row['level']:>5} "
+            f"{row['ratio']:>7.3f} {row['cpu_ms_per_mb']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+Load test for the API: N concurrent clients send a weighted mix of requests
+for a fixed duration, then throughput, latency percentiles and error rates are
+reported per route.
+
+By default the app runs in-process through httpx's ASGI transport, which
+measures the app itself without a network or server in between. Pass --url to
+hit a running server instead (uvicorn locally, or a Railway instance):
+
+    python -m benchmarks.load_test --concurrency 16 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --mix calculate=8,pdf=1,health=1
+    python -m benchmarks.load_test --payloads companies.ndjson      # from benchmarks.synthetic
+    python -m benchmarks.load_test --report benchmarks/results/*.json   # compare saved runs
+
+Payloads are the sample company scaled by a random factor (so they still pass
+validation) with a distinct name each, unless --payloads points at an NDJSON
+file. Each request also gets a company name of its own, so it misses the
+result cache and the run measures calculations and renders; --cached sends
+the payloads unchanged to measure cache hits instead. Every run is saved to
+benchmarks/results/ with its config and machine info so runs on different
+hardware or settings can be put side by side.
+
+All the load comes from one client, so a server under test should run with
+RATE_LIMIT_ENABLED=false (in-process runs turn it off themselves).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import time
+from copy import deepcopy
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+BENCH_DIR = Path(__file__).parent
+SAMPLE_PATH = BENCH_DIR / "data" / "sample_company.json"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Tags that keep request payloads distinct, also from earlier runs against the same server
+RUN_ID = f"{time.time_ns():x}"
+REQUEST_IDS = itertools.count()
+
+# Request kinds the mix can refer to: (method, path, sends a payload)
+ROUTES = {
+    "calculate": ("POST", "/api/calculate", True),
+    "pdf": ("POST", "/api/generate-pdf", True),
+    "health": ("GET", "/api/health", False),
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """"calculate=8,pdf=1,health=1" -> weights per route kind."""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise SystemExit(f"Unknown route '{name}' in --mix (known: {', '.join(ROUTES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def scaled_company(sample: dict, factor: float, index: int) -> dict:
+    """
+    The sample company with every amount multiplied by `factor`.
+    Scaling keeps the balance sheet balanced and the net results consistent,
+    so the payload passes the same validation as the original.
+    """
+    company = deepcopy(sample)
+    name = f"{sample['company_info']['nome_empresa']} #{index}"
+    company["nome_entidade"] = name
+    company["company_info"]["nome_empresa"] = name
+    for statement in ("balanco", "demonstracao_resultados"):
+        for year in company[statement].values():
+            for field, value in year.items():
+                year[field] = round(value * factor, 2)
+    return company
+
+
+def load_payloads(path: Optional[str], count: int, seed: int) -> List[dict]:
+    if path:
+        with open(path, encoding="utf-8") as handle:
+            payloads = [json.loads(line) for line in islice(handle, count) if line.strip()]
+        if not payloads:
+            raise SystemExit(f"No payloads in {path}")
+        return payloads
+    sample = json.loads(SAMPLE_PATH.read_text(encoding="utf-8"))
+    rng = random.Random(seed)
+    return [scaled_company(sample, rng.uniform(0.2, 5.0), i) for i in range(count)]
+
+
+def uncached(payload: dict, tag: str) -> dict:
+    """`payload` under a company name no other request uses (the name is part of the cache key)."""
+    info = payload["company_info"]
+    return {**payload, "company_info": {**info, "nome_empresa": f"{info['nome_empresa']} {tag}"}}
+
+
+async def worker(client: httpx.AsyncClient, deadline: float, mix: Dict[str, float],
+                 payloads: List[dict], rng: random.Random, records: list, cached: bool = False):
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        method, path, with_body = ROUTES[kind]
+        body = rng.choice(payloads) if with_body else None
+        if body is not None and not cached:
+            body = uncached(body, f"{RUN_ID}-{next(REQUEST_IDS)}")
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json=body)
+            # Read the whole body so streamed PDFs are fully counted
+            size = len(response.content)
+            status = response.status_code
+        except httpx.HTTPError:
+            size, status = 0, 0
+        records.append((kind, status, time.perf_counter() - start, size))
+
+
+async def run_load(url: Optional[str], concurrency: int, duration: float, warmup: float,
+                   mix: Dict[str, float], payloads: List[dict], seed: int,
+                   cached: bool = False) -> Tuple[list, float]:
+    """Records of (route, status, latency, bytes) and the measured wall time."""
+    if url:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=concurrency))
+        base_url = url
+    else:
+        from app.config import settings
+        from app.main import app
+        # All load comes from one client; don't measure the rate limiter
+        settings.rate_limit_enabled = False
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=120) as client:
+        if warmup > 0:
+            deadline = time.perf_counter() + warmup
+            await asyncio.gather(*(
+                worker(client, deadline, mix, payloads, random.Random(seed - i - 1), [], cached)
+                for i in range(concurrency)
+            ))
+
+        records: list = []
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            worker(client, deadline, mix, payloads, random.Random(seed + i), records, cached)
+            for i in range(concurrency)
+        ))
+        # Requests in flight at the deadline still finish, so use the real span
+        return records, time.perf_counter() - start
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def summarize(records: list, elapsed: float) -> Dict[str, dict]:
+    by_route: Dict[str, list] = {}
+    for kind, status, latency, size in records:
+        by_route.setdefault(kind, []).append((status, latency, size))
+    by_route["all"] = [(status, latency, size) for _, status, latency, size in records]
+
+    summary = {}
+    for kind, rows in by_route.items():
+        if not rows:
+            continue
+        latencies = sorted(latency for _, latency, _ in rows)
+        errors = sum(1 for status, _, _ in rows if status == 0 or status >= 400)
+        summary[kind] = {
+            "requests": len(rows),
+            "rps": round(len(rows) / elapsed, 2),
+            "error_rate": round(errors / len(rows), 4),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "mb_received": round(sum(size for _, _, size in rows) / 1e6, 3),
+        }
+    return summary
+
+
+def print_summary(summary: Dict[str, dict]):
+    print(f"{'route':<10} {'reqs':>7} {'rps':>8} {'err %':>6} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for kind, row in summary.items():
+        print(
+            f"{kind:<10} {row['requests']:>7} {row['rps']:>8.1f} {row['error_rate'] * 100:>6.2f} "
+            f"{row['p50_ms']:>9.1f} {row['p90_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['max_ms']:>9.1f}"
+        )
+
+
+def print_report(paths: List[str]):
+    """Side by side comparison of saved runs, one row per run and route."""
+    print(f"{'run':<28} {'target':<10} {'conc':>5} {'route':<10} {'rps':>8} {'err %':>6} "
+          f"{'p50 ms':>9} {'p99 ms':>9}")
+    for path in paths:
+        run = json.loads(Path(path).read_text(encoding="utf-8"))
+        config = run["config"]
+        target = "in-process" if not config["url"] else "http"
+        for kind, row in run["summary"].items():
+            print(
+                f"{Path(path).stem[:28]:<28} {target:<10} {config['concurrency']:>5} {kind:<10} "
+                f"{row['rps']:>8.1f} {row['error_rate'] * 100:>6.2f} {row['p50_ms']:>9.1f} {row['p99_ms']:>9.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="base URL of a running server; default runs the app in-process")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unmeasured load first")
+    parser.add_argument("--mix", default="calculate=8,pdf=1,health=1")
+    parser.add_argument("--payloads", help="NDJSON file of companies to send")
+    parser.add_argument("--distinct", type=int, default=200, help="number of different payloads to cycle through")
+    parser.add_argument("--cached", action="store_true",
+                        help="send payloads unchanged, so repeats are result cache hits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--label", help="name for the saved result file")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--report", nargs="+", metavar="RESULT", help="compare saved runs instead of running")
+    args = parser.parse_args()
+
+    if args.report:
+        print_report(args.report)
+        return
+
+    mix = parse_mix(args.mix)
+    payloads = load_payloads(args.payloads, args.distinct, args.seed)
+
+    if not args.url:
+        # In-process the app's own log lines would compete with the load generator
+        import logging
+        logging.disable(logging.INFO)
+
+    records, elapsed = asyncio.run(run_load(
+        args.url, args.concurrency, args.duration, args.warmup, mix, payloads, args.seed, args.cached
+    ))
+    summary = summarize(records, elapsed)
+    print_summary(summary)
+
+    if args.no_save:
+        return
+    created = datetime.now()
+    result = {
+        "created": created.isoformat(timespec="seconds"),
+        "config": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": mix,
+            "payloads": args.payloads or "scaled sample",
+            "distinct": len(payloads),
+            "cached": args.cached,
+            "seed": args.seed,
+        },
+        "machine": {
+            "node": platform.node(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "platform": platform.platform(),
+        },
+        "summary": summary,
+    }
+    RESULTS_DIR.mkdir(exist_ok=True)
+    label = args.label or created.strftime("load-%Y%m%d-%H%M%S")
+    path = RESULTS_DIR / f"{label}.json"
+    path.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"\nSaved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Request latency for /api/calculate with logging off, with the old synchronous
+handlers, and with the queue-based setup from app.logger.
+
+Requests go through the full ASGI app in-process (needs httpx). Console output
+is sent to /dev/null during the runs so terminal speed doesn't skew the numbers.
+
+Usage (from the backend folder):
+    python -m benchmarks.logging_overhead --requests 2000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.logger import setup_logging, shutdown_logging
+
+# One client hammering the API is the point here
+settings.rate_limit_enabled = False
+
+SAMPLE_PATH = Path(__file__).parent / "data" / "sample_company.json"
+
+
+def configure_sync_logging(log_file: str):
+    """The handlers setup_logging used to attach: written on the caller's thread."""
+    shutdown_logging()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.setLevel(logging.INFO)
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(logging.INFO)
+    console.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s - %(message)s', datefmt='%H:%M:%S'))
+
+    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(logging.Formatter(
+        '[%(asctime)s] %(levelname)s - %(name)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+
+    root.addHandler(console)
+    root.addHandler(file_handler)
+
+
+async def measure(payload: dict, requests: int, warmup: int) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Accept-Encoding": "identity"}
+        for _ in range(warmup):
+            await client.post("/api/calculate", json=payload, headers=headers)
+
+        latencies = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            response = await client.post("/api/calculate", json=payload, headers=headers)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+        return latencies
+
+
+def summarize(mode: str, latencies: list) -> dict:
+    ordered = sorted(latencies)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+
+    return {
+        "mode": mode,
+        "requests": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": round(pct(50), 3),
+        "p90_ms": round(pct(90), 3),
+        "p99_ms": round(pct(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    payload = json.loads(SAMPLE_PATH.read_text(encoding="utf-8"))
+    results = []
+    real_stdout = sys.stdout
+
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        log_file = os.path.join(tmp, "bench.log")
+        modes = {
+            "off": lambda: logging.disable(logging.CRITICAL),
+            "sync": lambda: configure_sync_logging(log_file),
+            "queue": lambda: setup_logging(log_level="INFO", log_file=log_file),
+        }
+        for mode, configure in modes.items():
+            sys.stdout = devnull
+            try:
+                logging.disable(logging.NOTSET)
+                configure()
+                latencies = asyncio.run(measure(payload, args.requests, args.warmup))
+            finally:
+                sys.stdout = real_stdout
+            results.append(summarize(mode, latencies))
+        shutdown_logging()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'mode':<6} {'mean ms':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for row in results:
+        print(
+            f"{row['mode']:<6} {row['mean_ms']:>8.3f} {row['p50_ms']:>8.3f} "
+            f"{row['p90_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['max_ms']:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Micro-benchmarks for the hot paths of a calculation request, with stored
+baselines so a change that makes things slower shows up before it ships.
+
+Each benchmark is warmed up, then timed in several rounds. A round runs the
+function in a loop long enough to be well above timer resolution. The summary
+is per call: min, median, mean, stdev and p95 in microseconds.
+
+Usage (from the backend folder):
+    python -m benchmarks.micro                        # run everything
+    python -m benchmarks.micro -k validate            # only names containing "validate"
+    python -m benchmarks.micro --save                 # write benchmarks/baselines/<label>.json
+    python -m benchmarks.micro --compare baselines/main.json --threshold 0.15
+
+With --compare, the exit code is 1 when any benchmark's median is more than
+`threshold` slower than the baseline, so it can gate CI. Baselines are only
+comparable on the same machine - keep one per box.
+
+/api/calculate goes through the full ASGI app (needs httpx). generate_report
+renders a real PDF, so it gets fewer rounds.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from app.models.balance_sheet import parse_portuguese_number
+from app.models.financial_data import EnhancedInputData
+from app.services.calculator import FinancialCalculator, CALCULATOR_VERSION
+from app import validators
+
+BENCH_DIR = Path(__file__).parent
+SAMPLE_PATH = BENCH_DIR / "data" / "sample_company.json"
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+# Mix of the formats the frontend actually sends
+NUMBER_SAMPLES = ["1.234.567,89", "1234,5", "1,234,567.89", "98 765", "-", "", 1500, 2750.25, "12.500"]
+
+
+class Benchmark:
+    """A named function to time. `rounds`, `warmup` and `min_round_time` override the defaults."""
+
+    def __init__(self, name: str, func: Callable[[], object], rounds: Optional[int] = None,
+                 warmup: Optional[int] = None, min_round_time: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.rounds = rounds
+        self.warmup = warmup
+        self.min_round_time = min_round_time
+
+
+def load_sample() -> dict:
+    return json.loads(SAMPLE_PATH.read_text(encoding="utf-8"))
+
+
+def build_benchmarks() -> List[Benchmark]:
+    raw = load_sample()
+    data = EnhancedInputData(**raw)
+    balanco, demonstracao = data.balanco, data.demonstracao_resultados
+
+    def parse_numbers():
+        for value in NUMBER_SAMPLES:
+            parse_portuguese_number(value)
+
+    benches = [
+        Benchmark("parse_portuguese_number", parse_numbers),
+        Benchmark("EnhancedInputData", lambda: EnhancedInputData(**raw)),
+        Benchmark("validate_balance_sheet", lambda: validators.validate_balance_sheet(balanco)),
+        Benchmark("validate_positive_values", lambda: validators.validate_positive_values(balanco)),
+        Benchmark("validate_income_statement", lambda: validators.validate_income_statement(demonstracao)),
+        Benchmark("validate_reasonable_values",
+                  lambda: validators.validate_reasonable_values(balanco, demonstracao)),
+        Benchmark("validate_net_result_consistency",
+                  lambda: validators.validate_net_result_consistency(balanco, demonstracao)),
+        Benchmark("validate_on_request_only",
+                  lambda: validators.validate_on_request_only(balanco, demonstracao)),
+        Benchmark("validate_all", lambda: validators.validate_all(balanco, demonstracao)),
+        Benchmark("calculate_all",
+                  lambda: FinancialCalculator(balanco=balanco, demonstracao=demonstracao).calculate_all()),
+        Benchmark("api_calculate", api_calculate_runner(raw)),
+        Benchmark("generate_report", generate_report_runner(data), rounds=10, warmup=2),
+    ]
+    return benches
+
+
+def api_calculate_runner(raw: dict) -> Callable[[], object]:
+    """
+    POST /api/calculate in-process. The client and loop are reused across calls.
+    Every call sends a different company name, so it misses the result cache
+    and times the calculation rather than a cache lookup.
+    """
+    import httpx
+    from app.config import settings
+    from app.main import app
+
+    # One client hammering the API is the point here
+    settings.rate_limit_enabled = False
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    headers = {"Accept-Encoding": "identity"}
+    name = raw["company_info"]["nome_empresa"]
+    calls = itertools.count()
+
+    def run():
+        payload = {**raw, "company_info": {**raw["company_info"], "nome_empresa": f"{name} #{next(calls)}"}}
+        response = loop.run_until_complete(client.post("/api/calculate", json=payload, headers=headers))
+        response.raise_for_status()
+
+    return run
+
+
+def generate_report_runner(data: EnhancedInputData) -> Callable[[], object]:
+    """Same inputs the /api/generate-pdf route builds for the generator."""
+    from app.services.pdf_generator import FinancialPDFGenerator, build_report_inputs
+
+    metrics = FinancialCalculator(balanco=data.balanco, demonstracao=data.demonstracao_resultados).calculate_all()
+    report_inputs = build_report_inputs(data, metrics)
+
+    def run():
+        FinancialPDFGenerator().generate_report(**report_inputs)
+
+    return run
+
+
+def time_benchmark(bench: Benchmark, rounds: int, warmup: int, min_round_time: float) -> Dict[str, float]:
+    """Per-call timings in microseconds."""
+    rounds = bench.rounds or rounds
+    warmup = warmup if bench.warmup is None else bench.warmup
+    min_round_time = min_round_time if bench.min_round_time is None else bench.min_round_time
+    func = bench.func
+
+    for _ in range(warmup):
+        func()
+
+    # Calibrate: double the loop count until one round takes long enough
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time or loops >= 1_000_000:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / loops * 1e6)
+
+    ordered = sorted(samples)
+    return {
+        "rounds": rounds,
+        "loops": loops,
+        "min_us": round(ordered[0], 3),
+        "median_us": round(statistics.median(ordered), 3),
+        "mean_us": round(statistics.fmean(ordered), 3),
+        "stdev_us": round(statistics.stdev(ordered), 3) if len(ordered) > 1 else 0.0,
+        "p95_us": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+        "ops_per_s": round(1e6 / statistics.median(ordered), 1),
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Print the comparison table and return the names that regressed."""
+    regressions = []
+    print()
+    print(f"{'benchmark':<34} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<34} {'-':>12} {current['median_us']:>12.2f} {'new':>8}")
+            continue
+        change = current["median_us"] / previous["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<34} {previous['median_us']:>12.2f} {current['median_us']:>12.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-k", dest="select", help="only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="seconds per timed round")
+    parser.add_argument("--save", nargs="?", const="latest", metavar="LABEL",
+                        help="save results to benchmarks/baselines/LABEL.json (default: latest)")
+    parser.add_argument("--compare", metavar="PATH", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed median slowdown before failing, 0.10 = 10%%")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    # Per-request log lines would dominate the API benchmark
+    import logging
+    logging.disable(logging.INFO)
+
+    benches = build_benchmarks()
+    if args.select:
+        benches = [bench for bench in benches if args.select in bench.name]
+
+    results = {}
+    if not args.json:
+        print(f"{'benchmark':<34} {'median us':>12} {'min us':>12} {'stdev us':>10} {'ops/s':>12}")
+    for bench in benches:
+        stats = time_benchmark(bench, args.rounds, args.warmup, args.min_round_time)
+        results[bench.name] = stats
+        if not args.json:
+            print(
+                f"{bench.name:<34} {stats['median_us']:>12.2f} {stats['min_us']:>12.2f} "
+                f"{stats['stdev_us']:>10.2f} {stats['ops_per_s']:>12.1f}"
+            )
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+        "calculator_version": CALCULATOR_VERSION,
+        "results": results,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+
+    if args.save:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.save}.json"
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nSaved {path}", file=sys.stderr)
+
+    if args.compare:
+        path = Path(args.compare)
+        if not path.exists():
+            path = BENCH_DIR / args.compare
+        baseline = json.loads(path.read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup import report and budget check, based on `python -X importtime`.
+
+Runs `import app.main` in fresh interpreters, takes the median cumulative time
+per module, prints the slowest modules and checks the result against
+benchmarks/import_budget.json:
+
+- total_ms: median cumulative import time of app.main must stay under it
+- forbidden: modules that must not be imported at startup (reportlab and PIL
+  are only needed once a PDF is requested)
+
+Exit code is 1 when the budget is blown, so it can run in CI. Timings depend on
+the machine - refresh the budget with --update-budget after moving hosts.
+
+Usage (from the backend folder):
+    python -m benchmarks.startup_imports
+    python -m benchmarks.startup_imports --runs 9 --top 30
+    python -m benchmarks.startup_imports --update-budget --headroom 1.5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).parent.parent
+BUDGET_PATH = Path(__file__).parent / "import_budget.json"
+DEFAULT_FORBIDDEN = ["reportlab", "PIL"]
+
+
+def import_times(module: str) -> Dict[str, Dict[str, int]]:
+    """{module: {"self": us, "cumulative": us}} for one fresh interpreter."""
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = {"self": int(self_us), "cumulative": int(cumulative_us)}
+    return times
+
+
+def collect(module: str, runs: int) -> Dict[str, Dict[str, float]]:
+    """Median self/cumulative milliseconds per module over `runs` interpreters."""
+    samples: Dict[str, Dict[str, List[int]]] = {}
+    for _ in range(runs):
+        for name, entry in import_times(module).items():
+            row = samples.setdefault(name, {"self": [], "cumulative": []})
+            row["self"].append(entry["self"])
+            row["cumulative"].append(entry["cumulative"])
+    return {
+        name: {
+            "self_ms": statistics.median(row["self"]) / 1000,
+            "cumulative_ms": statistics.median(row["cumulative"]) / 1000,
+        }
+        for name, row in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=20, help="slowest modules to list")
+    parser.add_argument("--update-budget", action="store_true", help="write the budget from this run")
+    parser.add_argument("--headroom", type=float, default=1.5, help="budget = measured total * headroom")
+    args = parser.parse_args()
+
+    stats = collect(args.module, args.runs)
+    total_ms = stats[args.module]["cumulative_ms"]
+
+    print(f"{'module':<48} {'self ms':>9} {'cumul ms':>9}")
+    slowest = sorted(stats.items(), key=lambda item: item[1]["self_ms"], reverse=True)[:args.top]
+    for name, row in slowest:
+        print(f"{name[:48]:<48} {row['self_ms']:>9.1f} {row['cumulative_ms']:>9.1f}")
+    print(f"\n{args.module}: {total_ms:.1f} ms (median of {args.runs}), {len(stats)} modules")
+
+    if args.update_budget:
+        budget = {
+            "module": args.module,
+            "total_ms": round(total_ms * args.headroom, 1),
+            "forbidden": DEFAULT_FORBIDDEN,
+        }
+        BUDGET_PATH.write_text(json.dumps(budget, indent=2) + "\n", encoding="utf-8")
+        print(f"Budget written to {BUDGET_PATH}")
+        return
+
+    if not BUDGET_PATH.exists():
+        print("No budget file yet - run with --update-budget")
+        return
+    budget = json.loads(BUDGET_PATH.read_text(encoding="utf-8"))
+    failures = []
+    if total_ms > budget["total_ms"]:
+        failures.append(f"import time {total_ms:.1f} ms is over the {budget['total_ms']} ms budget")
+    for forbidden in budget.get("forbidden", []):
+        loaded = [name for name in stats if name == forbidden or name.startswith(forbidden + ".")]
+        if loaded:
+            failures.append(f"{forbidden} is imported at startup ({len(loaded)} modules)")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print(f"Within budget ({budget['total_ms']} ms, none of {', '.join(budget.get('forbidden', []))} loaded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+"""
+Seeded generator of synthetic three-year companies that pass validation.
+
+Every record satisfies validate_on_request_only: assets equal liabilities plus
+equity (to the cent), the balance sheet's resultado_liquido_periodo equals the
+income statement's resultado_liquido, assets are positive, there's revenue in
+at least one year and nothing is absurdly large. Amounts follow rough sector
+profiles (retail turns assets over fast on thin margins, IT is people-heavy,
+hotels are asset-heavy...). Rare cases are switched on by probability:
+zero equity, zero sales in year N, and a negative RAI (loss before tax).
+
+Records are generated in chunks and written as they go, so memory stays flat
+however many you ask for. With numpy installed a chunk is built in one go with
+vectorized draws; without it the same formulas run one company at a time
+(slower, and a given seed gives different companies than with numpy).
+
+Formats:
+- ndjson: one /api/calculate payload per line, usable by benchmarks.load_test
+- csv: one flat row per company, columns as in COLUMNS
+- npy: float64 matrix (numpy format, needs numpy), with the column names in
+  <output>.columns.json. This is the fast one - a million companies in seconds.
+
+Usage (from the backend folder):
+    python -m benchmarks.synthetic --count 1000000 --format npy --output companies.npy
+    python -m benchmarks.synthetic --count 10000 --format ndjson --output companies.ndjson --seed 7
+    python -m benchmarks.synthetic --count 1000 --negative-rai 0.5 --check 1000
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+from typing import Dict, Iterator, NamedTuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional speedup
+    np = None
+
+from app.models.balance_sheet import BalanceSheetYear
+from app.models.income_statement import IncomeStatementYear
+
+
+class Sector(NamedTuple):
+    name: str
+    weight: float        # share of companies
+    turnover: float      # sales / total assets
+    cogs: float          # cmvmc / sales
+    fse: float           # external supplies and services / sales
+    staff: float         # personnel costs / sales
+    fixed_share: float   # non-current assets / total assets
+    inventory: float     # inventories / current assets
+    debt: float          # liabilities / total assets
+
+
+SECTORS = [
+    Sector("Comércio a retalho", 0.28, 1.9, 0.68, 0.10, 0.11, 0.35, 0.40, 0.58),
+    Sector("Indústria transformadora", 0.18, 1.1, 0.52, 0.15, 0.19, 0.55, 0.30, 0.60),
+    Sector("Construção", 0.12, 0.9, 0.40, 0.30, 0.18, 0.35, 0.25, 0.68),
+    Sector("Serviços profissionais", 0.20, 1.4, 0.04, 0.30, 0.48, 0.25, 0.03, 0.45),
+    Sector("Alojamento e restauração", 0.12, 0.7, 0.30, 0.25, 0.30, 0.70, 0.08, 0.65),
+    Sector("Tecnologias de informação", 0.10, 1.2, 0.05, 0.22, 0.55, 0.20, 0.02, 0.38),
+]
+
+YEARS = ("year_n", "year_n1", "year_n2")
+BALANCE_FIELDS = list(BalanceSheetYear.model_fields)
+INCOME_FIELDS = list(IncomeStatementYear.model_fields)
+
+# Flat layout used by the csv and npy formats
+COLUMNS = (
+    ["sector"]
+    + [f"balanco.{year}.{field}" for year in YEARS for field in BALANCE_FIELDS]
+    + [f"demonstracao_resultados.{year}.{field}" for year in YEARS for field in INCOME_FIELDS]
+)
+
+
+class EdgeCases(NamedTuple):
+    zero_equity: float = 0.01
+    zero_sales: float = 0.01
+    negative_rai: float = 0.08
+
+
+DEFAULT_EDGE_CASES = EdgeCases()
+
+
+class _NumpyDraws:
+    """Draws and helpers over `size` companies at once."""
+
+    def __init__(self, rng, size: int):
+        self.rng = rng
+        self.size = size
+
+    def lognormal(self, mean, sigma):
+        return self.rng.lognormal(mean, sigma, self.size)
+
+    def uniform(self, low, high):
+        return self.rng.uniform(low, high, self.size)
+
+    def chance(self, p):
+        return self.rng.random(self.size) < p
+
+    def choice(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        return self.rng.choice(len(weights), size=self.size, p=weights / weights.sum())
+
+    def take(self, values, index):
+        return np.asarray(values, dtype=float)[index]
+
+    where = staticmethod(lambda cond, a, b: np.where(cond, a, b))
+    maximum = staticmethod(lambda a, b: np.maximum(a, b))
+    minimum = staticmethod(lambda a, b: np.minimum(a, b))
+    cents = staticmethod(lambda x: np.round(x, 2))
+
+
+class _PythonDraws:
+    """Same interface as _NumpyDraws for a single company."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def lognormal(self, mean, sigma):
+        return self.rng.lognormvariate(mean, sigma)
+
+    def uniform(self, low, high):
+        return self.rng.uniform(low, high)
+
+    def chance(self, p):
+        return self.rng.random() < p
+
+    def choice(self, weights):
+        return self.rng.choices(range(len(weights)), weights)[0]
+
+    def take(self, values, index):
+        return values[index]
+
+    where = staticmethod(lambda cond, a, b: a if cond else b)
+    maximum = staticmethod(max)
+    minimum = staticmethod(min)
+    cents = staticmethod(lambda x: round(x, 2))
+
+
+def _generate(d, edge: EdgeCases) -> Dict[str, object]:
+    """
+    Column name -> value for one company (_PythonDraws) or a whole chunk
+    (_NumpyDraws). Columns left out are zero.
+    """
+    cols: Dict[str, object] = {}
+    sector = d.choice([s.weight for s in SECTORS])
+    param = {field: d.take([getattr(s, field) for s in SECTORS], sector) for field in Sector._fields[2:]}
+    cols["sector"] = sector
+
+    # Activity level (sales before any zero-sales edge case) grows year to year
+    activity_n2 = d.lognormal(13.0, 1.3)
+    activity_n1 = activity_n2 * d.lognormal(0.03, 0.12)
+    activity_n = activity_n1 * d.lognormal(0.03, 0.12)
+    capital = d.cents(activity_n2 / param["turnover"] * d.uniform(0.05, 0.2))
+    zero_equity = d.chance(edge.zero_equity)
+    zero_sales = d.chance(edge.zero_sales)
+
+    for year, activity in (("year_n2", activity_n2), ("year_n1", activity_n1), ("year_n", activity_n)):
+        ds = f"demonstracao_resultados.{year}."
+        bs = f"balanco.{year}."
+
+        # Income statement. Costs follow activity, so a year without sales is a loss
+        sales = activity
+        if year == "year_n":
+            sales = d.where(zero_sales, 0.0, activity)
+        assets = activity / param["turnover"] * d.uniform(0.85, 1.15)
+        fixed = d.minimum(assets * param["fixed_share"] * d.uniform(0.8, 1.2), assets * 0.9)
+
+        income = {
+            "vendas_servicos_prestados": sales,
+            "subsidios_exploracao": d.where(d.chance(0.1), activity * d.uniform(0.0, 0.02), 0.0),
+            "cmvmc": sales * param["cogs"] * d.uniform(0.9, 1.1),
+            "fornecimentos_servicos_externos": activity * param["fse"] * d.uniform(0.85, 1.15),
+            "gastos_pessoal": activity * param["staff"] * d.uniform(0.85, 1.15),
+            "outros_rendimentos_ganhos": activity * d.uniform(0.0, 0.01),
+            "gastos_depreciacoes_amortizacoes": fixed * d.uniform(0.05, 0.12),
+            "juros_rendimentos_obtidos": activity * d.uniform(0.0, 0.002),
+            "juros_gastos_suportados": assets * param["debt"] * 0.6 * d.uniform(0.02, 0.06),
+        }
+        income = {field: d.cents(value) for field, value in income.items()}
+        rai = (
+            income["vendas_servicos_prestados"] + income["subsidios_exploracao"]
+            + income["outros_rendimentos_ganhos"] + income["juros_rendimentos_obtidos"]
+            - income["cmvmc"] - income["fornecimentos_servicos_externos"] - income["gastos_pessoal"]
+            - income["gastos_depreciacoes_amortizacoes"] - income["juros_gastos_suportados"]
+        )
+        # Forced losses get enough other expenses to push RAI below zero
+        other_costs = d.where(
+            d.chance(edge.negative_rai),
+            d.maximum(rai, 0.0) + activity * d.uniform(0.01, 0.1) + 100.0,
+            activity * d.uniform(0.0, 0.005),
+        )
+        income["outros_gastos_perdas"] = d.cents(other_costs)
+        rai = rai - income["outros_gastos_perdas"]
+        income["imposto_rendimento"] = d.cents(d.maximum(rai, 0.0) * 0.21)
+        net_result = d.cents(rai - income["imposto_rendimento"])
+
+        # Balance sheet: assets first, then equity, liabilities take the rest
+        current = assets - fixed
+        balance = {
+            "ativos_fixos_tangiveis": fixed * 0.9,
+            "ativos_intangiveis": fixed * 0.1,
+            "inventarios": current * param["inventory"] * d.uniform(0.8, 1.2),
+            "clientes": current * 0.3 * d.uniform(0.8, 1.2),
+            "estado_outros_entes_publicos_ativo": current * 0.04,
+            "outras_contas_receber": current * 0.03,
+            "diferimentos_ativo": current * 0.01,
+        }
+        balance = {field: d.cents(value) for field, value in balance.items()}
+        balance["caixa_depositos_bancarios"] = d.cents(assets - sum(balance.values()))
+        total_assets = sum(balance.values())
+
+        equity = d.minimum(total_assets * (1 - param["debt"]) * d.uniform(0.7, 1.2), total_assets * 0.9)
+        if year == "year_n":
+            equity = d.where(zero_equity, 0.0, equity)
+        balance["capital_realizado"] = capital
+        balance["reservas_legais"] = d.cents(capital * d.uniform(0.0, 0.2))
+        balance["outras_reservas"] = d.cents(d.maximum(equity, 0.0) * d.uniform(0.0, 0.2))
+        balance["resultado_liquido_periodo"] = net_result
+        # Retained earnings absorb whatever makes equity hit the target
+        balance["resultados_transitados"] = d.cents(
+            equity - capital - balance["reservas_legais"] - balance["outras_reservas"] - net_result
+        )
+        if year == "year_n":
+            # Rounding leaves the sum above a few 1e-10 off zero, and the
+            # calculator's "== 0" guards need an exact 0.0: keep only the net
+            # result, cancelled out by retained earnings
+            for field in ("capital_realizado", "reservas_legais", "outras_reservas"):
+                balance[field] = d.where(zero_equity, 0.0, balance[field])
+            balance["resultados_transitados"] = d.where(zero_equity, -net_result, balance["resultados_transitados"])
+        total_equity = (
+            balance["capital_realizado"] + balance["reservas_legais"] + balance["outras_reservas"]
+            + balance["resultados_transitados"] + net_result
+        )
+
+        liabilities = total_assets - total_equity
+        debt = {
+            "financiamentos_obtidos_nc": liabilities * 0.35 * d.uniform(0.8, 1.2),
+            "fornecedores": liabilities * 0.25 * d.uniform(0.8, 1.2),
+            "estado_outros_entes_publicos_passivo": liabilities * 0.05,
+            "financiamentos_obtidos_corrente": liabilities * 0.15 * d.uniform(0.8, 1.2),
+        }
+        debt = {field: d.cents(value) for field, value in debt.items()}
+        debt["outras_contas_pagar_corrente"] = d.cents(liabilities - sum(debt.values()))
+        balance.update(debt)
+
+        cols.update({ds + field: value for field, value in income.items()})
+        cols.update({bs + field: value for field, value in balance.items()})
+    return cols
+
+
+def iter_chunks(count: int, seed: int = 0, edge: EdgeCases = DEFAULT_EDGE_CASES,
+                chunk_size: int = 20_000, use_numpy: bool = True) -> Iterator:
+    """
+    Yield `count` companies in chunks of rows laid out as COLUMNS: a float64
+    array per chunk with numpy, a list of lists without.
+    """
+    if use_numpy and np is not None:
+        rng = np.random.default_rng(seed)
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            cols = _generate(_NumpyDraws(rng, size), edge)
+            chunk = np.zeros((size, len(COLUMNS)))
+            for i, name in enumerate(COLUMNS):
+                if name in cols:
+                    chunk[:, i] = cols[name]
+            yield chunk
+        return
+
+    rng = random.Random(seed)
+    draws = _PythonDraws(rng)
+    for start in range(0, count, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, count - start)):
+            cols = _generate(draws, edge)
+            rows.append([float(cols.get(name, 0.0)) for name in COLUMNS])
+        yield rows
+
+
+def company_name(index: int) -> str:
+    return f"Empresa Sintética {index:07d}"
+
+
+def _year_slices():
+    """(statement, year, field names, start, end) for each block of COLUMNS."""
+    slices = []
+    position = 1
+    for statement, fields in (("balanco", BALANCE_FIELDS), ("demonstracao_resultados", INCOME_FIELDS)):
+        for year in YEARS:
+            slices.append((statement, year, fields, position, position + len(fields)))
+            position += len(fields)
+    return slices
+
+
+_YEAR_SLICES = _year_slices()
+
+
+def row_to_payload(index: int, row) -> dict:
+    """One flat row back into the /api/calculate request shape."""
+    name = company_name(index)
+    payload = {
+        "nome_entidade": name,
+        "company_info": {"nome_empresa": name, "setor_atividade": SECTORS[int(row[0])].name},
+        "balanco": {},
+        "demonstracao_resultados": {},
+    }
+    for statement, year, fields, start, end in _YEAR_SLICES:
+        payload[statement][year] = dict(zip(fields, row[start:end]))
+    return payload
+
+
+def _ndjson_template() -> str:
+    """
+    The payload JSON with %-placeholders for name and amounts. Every record has
+    the same shape, so filling a template is several times faster than
+    json.dumps on a dict per record.
+    """
+    blocks = {}
+    for statement, year, fields, _, _ in _YEAR_SLICES:
+        body = ",".join(f'"{field}":%.2f' for field in fields)
+        blocks.setdefault(statement, []).append(f'"{year}":{{{body}}}')
+    return (
+        '{"nome_entidade":"%s","company_info":{"nome_empresa":"%s","setor_atividade":"%s"},'
+        f'"balanco":{{{",".join(blocks["balanco"])}}},'
+        f'"demonstracao_resultados":{{{",".join(blocks["demonstracao_resultados"])}}}}}'
+    )
+
+
+def write_ndjson(handle, chunks) -> int:
+    template = _ndjson_template()
+    index = 0
+    for chunk in chunks:
+        rows = chunk.tolist() if np is not None and isinstance(chunk, np.ndarray) else chunk
+        lines = []
+        for row in rows:
+            name = company_name(index)
+            lines.append(template % (name, name, SECTORS[int(row[0])].name, *row[1:]))
+            index += 1
+        handle.write("\n".join(lines) + "\n")
+    return index
+
+
+def write_csv(handle, chunks) -> int:
+    writer = csv.writer(handle, lineterminator="\n")
+    writer.writerow(["nome_empresa"] + COLUMNS)
+    index = 0
+    for chunk in chunks:
+        rows = chunk.tolist() if np is not None and isinstance(chunk, np.ndarray) else chunk
+        for row in rows:
+            writer.writerow([company_name(index), int(row[0])] + row[1:])
+            index += 1
+    return index
+
+
+def write_npy(path: str, count: int, chunks) -> int:
+    """Stream chunks into a .npy file; the header is written up front since the shape is known."""
+    with open(path, "wb") as handle:
+        np.lib.format.write_array_header_1_0(
+            handle, {"descr": "<f8", "fortran_order": False, "shape": (count, len(COLUMNS))}
+        )
+        written = 0
+        for chunk in chunks:
+            np.asarray(chunk, dtype="<f8").tofile(handle)
+            written += len(chunk)
+    with open(path + ".columns.json", "w", encoding="utf-8") as handle:
+        json.dump({"columns": COLUMNS, "sectors": [s.name for s in SECTORS]}, handle, ensure_ascii=False)
+    return written
+
+
+def check(path: str, fmt: str, limit: int) -> int:
+    """Run the first `limit` records through the API's model and validation."""
+    from app.models.financial_data import EnhancedInputData
+    from app.validators import validate_on_request_only
+
+    if fmt == "ndjson":
+        with open(path, encoding="utf-8") as handle:
+            payloads = [json.loads(line) for _, line in zip(range(limit), handle)]
+    elif fmt == "npy":
+        matrix = np.load(path, mmap_mode="r")
+        payloads = [row_to_payload(i, matrix[i].tolist()) for i in range(min(limit, len(matrix)))]
+    else:
+        with open(path, encoding="utf-8", newline="") as handle:
+            reader = csv.reader(handle)
+            next(reader)
+            payloads = [
+                row_to_payload(i, [float(value) for value in row[1:]])
+                for i, row in zip(range(limit), reader)
+            ]
+
+    for payload in payloads:
+        data = EnhancedInputData(**payload)
+        validate_on_request_only(data.balanco, data.demonstracao_resultados)
+    return len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["ndjson", "csv", "npy"], default="ndjson")
+    parser.add_argument("--output", help="output path (default: stdout for ndjson/csv)")
+    parser.add_argument("--chunk-size", type=int, default=20_000)
+    parser.add_argument("--zero-equity", type=float, default=DEFAULT_EDGE_CASES.zero_equity,
+                        help="fraction of companies with zero equity in year N")
+    parser.add_argument("--zero-sales", type=float, default=DEFAULT_EDGE_CASES.zero_sales,
+                        help="fraction of companies with no sales in year N")
+    parser.add_argument("--negative-rai", type=float, default=DEFAULT_EDGE_CASES.negative_rai,
+                        help="chance, per company and year, of a loss before tax")
+    parser.add_argument("--no-numpy", action="store_true", help="use the pure Python generator")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="afterwards, validate the first N records like the API does")
+    args = parser.parse_args()
+
+    if args.format == "npy" and (np is None or args.no_numpy):
+        raise SystemExit("--format npy needs numpy")
+    if args.format == "npy" and not args.output:
+        raise SystemExit("--format npy needs --output")
+    if args.check and not args.output:
+        raise SystemExit("--check needs --output")
+
+    edge = EdgeCases(args.zero_equity, args.zero_sales, args.negative_rai)
+    chunks = iter_chunks(args.count, args.seed, edge, args.chunk_size, use_numpy=not args.no_numpy)
+
+    start = time.perf_counter()
+    if args.format == "npy":
+        written = write_npy(args.output, args.count, chunks)
+    else:
+        writer = write_ndjson if args.format == "ndjson" else write_csv
+        if args.output:
+            with open(args.output, "w", encoding="utf-8", newline="") as handle:
+                written = writer(handle, chunks)
+        else:
+            written = writer(sys.stdout, chunks)
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{written:,} companies in {elapsed:.2f}s ({written / max(elapsed, 1e-9):,.0f}/s)"
+        f"{' using numpy' if np is not None and not args.no_numpy else ''}",
+        file=sys.stderr,
+    )
+    if args.check:
+        checked = check(args.output, args.format, args.check)
+        print(f"{checked:,} records passed validation", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,7 +11,10 @@ echo "==================================="
 # Use the PORT environment variable, default to 8000 if not set
 PORT=${PORT:-8000}
 
-echo "Starting uvicorn on port: $PORT"
+export PORT
 
-# Start uvicorn
-exec uvicorn app.main:app --host 0.0.0.0 --port "$PORT" --log-level info
+echo "Starting pre-fork server on port: $PORT (workers: ${WORKERS:-one per CPU})"
+
+# Start the pre-fork server: warms up once, then forks WORKERS uvicorn workers.
+# For local development with auto-reload use: uvicorn app.main:app --reload
+exec python -m app.server
@@ -0,0 +1,40 @@
+"""Idempotency-Key records are scoped to the client that sent them."""
+
+import pytest
+from starlette.requests import Request
+
+import app.utils.idempotency as idempotency
+from app.cache.memory import MemoryBackend
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch):
+    cache = MemoryBackend(1_000_000)
+    monkeypatch.setattr(idempotency, "get_cache", lambda: cache)
+    return cache
+
+
+def request_from(address: str, key: str = "retry-1") -> Request:
+    headers = [(b"idempotency-key", key.encode())]
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers, "client": (address, 50000)})
+
+
+def test_same_key_from_two_clients_is_two_records():
+    first = idempotency.idempotency_key(request_from("10.0.0.1"))
+    second = idempotency.idempotency_key(request_from("10.0.0.2"))
+    assert first != second
+
+    idempotency.remember("generate-pdf", first, "payload-a", 200, "text/plain", headers={}, body=b"for client one")
+    assert idempotency.replay("generate-pdf", first, "payload-a").body == b"for client one"
+    # Neither a replay of client one's response nor a 422 for the other payload
+    assert idempotency.replay("generate-pdf", second, "payload-a") is None
+    assert idempotency.replay("generate-pdf", second, "payload-b") is None
+
+
+def test_same_client_replays():
+    key = idempotency.idempotency_key(request_from("10.0.0.1"))
+    idempotency.remember("generate-pdf", key, "payload-a", 200, "text/plain", headers={}, body=b"done")
+    again = idempotency.idempotency_key(request_from("10.0.0.1"))
+    response = idempotency.replay("generate-pdf", again, "payload-a")
+    assert response.body == b"done"
+    assert response.headers[idempotency.REPLAYED_HEADER] == "true"
@@ -0,0 +1,30 @@
+"""SamplingFilter keeps the configured fraction of chatty records."""
+
+import logging
+
+import pytest
+
+from app.logger import SamplingFilter
+
+
+def kept(sampling: SamplingFilter, name: str, count: int, level: int = logging.INFO) -> int:
+    return sum(sampling.filter(logging.LogRecord(name, level, __file__, 0, "msg", None, None)) for _ in range(count))
+
+
+@pytest.mark.parametrize("rate", [0.1, 0.25, 0.3, 0.4, 0.75])
+def test_keeps_the_configured_fraction(rate):
+    assert kept(SamplingFilter({"app.routes": rate}), "app.routes.analysis", 1000) == round(1000 * rate)
+
+
+def test_non_reciprocal_rate_is_evenly_spaced():
+    sampling = SamplingFilter({"app": 0.4})
+    record = logging.LogRecord("app", logging.INFO, __file__, 0, "msg", None, None)
+    assert [sampling.filter(record) for _ in range(10)] == [False, False, True, False, True] * 2
+
+
+def test_longest_prefix_wins_and_warnings_always_pass():
+    sampling = SamplingFilter({"app": 0.0, "app.routes": 1.0})
+    assert kept(sampling, "app.routes.analysis", 10) == 10
+    assert kept(sampling, "app.cache", 10) == 0
+    assert kept(sampling, "app.cache", 10, level=logging.WARNING) == 10
+    assert kept(sampling, "uvicorn", 10) == 10
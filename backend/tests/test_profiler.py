@@ -0,0 +1,57 @@
+"""SamplingProfiler: idle event loop samples are dropped with asyncio's loop and with uvloop."""
+
+import asyncio
+import time
+
+import pytest
+import uvloop
+
+from app.profiler import EVENT_LOOP_LABEL, SamplingProfiler
+
+
+def spin(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def mostly_idle(stop: asyncio.Event):
+    # Busy about a fifth of the time, waiting on the loop the rest
+    while not stop.is_set():
+        spin(0.01)
+        await asyncio.sleep(0.04)
+
+
+async def profile_mostly_idle_loop():
+    profiler = SamplingProfiler()
+    stop = asyncio.Event()
+    task = asyncio.create_task(mostly_idle(stop))
+    try:
+        return await profiler.profile(seconds=1.0, interval=0.005)
+    finally:
+        stop.set()
+        await task
+
+
+def loop_stacks(result):
+    stacks = {}
+    for line in result["stacks"].splitlines():
+        stack, count = line.rsplit(" ", 1)
+        if stack.startswith(EVENT_LOOP_LABEL + ";"):
+            stacks[stack] = int(count)
+    return stacks
+
+
+@pytest.mark.parametrize("run", [asyncio.run, uvloop.run], ids=["asyncio", "uvloop"])
+def test_idle_loop_samples_are_dropped(run):
+    result = run(profile_mostly_idle_loop())
+    stacks = loop_stacks(result)
+    recorded = sum(stacks.values())
+    busy = sum(count for stack, count in stacks.items() if "spin (tests/test_profiler.py)" in stack)
+
+    assert result["samples"] > 50
+    assert busy > 0
+    # Without the idle filter about four in five samples would be the loop waiting
+    assert recorded < result["samples"] / 2
+    assert busy >= 0.8 * recorded, stacks
+    assert not any(stack.endswith("run (runners.py)") or stack.endswith("select (selectors.py)") for stack in stacks)
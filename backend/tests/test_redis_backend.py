@@ -0,0 +1,154 @@
+"""RedisBackend and TieredBackend against fakeredis."""
+
+import threading
+import time
+import zlib
+
+import anyio
+import fakeredis
+import pytest
+
+import app.cache
+from app.cache.base import TieredBackend
+from app.cache.memory import MemoryBackend
+from app.cache.redis_backend import RAW, ZLIB, RedisBackend, decode_value, encode_value
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def backend(server):
+    return RedisBackend(fakeredis.FakeRedis(server=server), prefix="test:", retry_after=0.2)
+
+
+def test_get_many_and_set_many(backend):
+    assert backend.set_many({"a": b"1", "b": b"2"})
+    assert backend.get_many(["a", "b", "missing"]) == {"a": b"1", "b": b"2"}
+    assert backend.get("a") == b"1"
+    assert backend.get_many([]) == {}
+
+
+def test_keys_are_prefixed(backend):
+    backend.set("a", b"1")
+    assert backend.client.get("test:a") == RAW + b"1"
+    assert backend.client.get("a") is None
+
+
+def test_large_values_are_compressed(backend):
+    value = b'{"metric": 1.25}' * 200
+    backend.set("big", value)
+    stored = backend.client.get("test:big")
+    assert stored[:1] == ZLIB
+    assert len(stored) < len(value) / 2
+    assert backend.get("big") == value
+
+
+def test_incompressible_values_stay_raw():
+    value = bytes(range(256)) * 4
+    assert encode_value(zlib.compress(value, 9))[:1] == RAW
+    assert encode_value(b"small")[:1] == RAW
+
+
+def test_corrupt_values_are_misses(backend):
+    good = encode_value(b"x" * 2000)
+    backend.client.set("test:truncated", good[:len(good) // 2])
+    backend.client.set("test:garbage", ZLIB + b"not zlib at all")
+    backend.client.set("test:foreign", b"written by someone else")
+    assert backend.get_many(["truncated", "garbage", "foreign"]) == {}
+    assert decode_value(ZLIB + b"\x00") is None
+
+
+def test_ttl(backend):
+    backend.set("short", b"1", ttl=0.1)
+    backend.set("forever", b"1")
+    assert 0 < backend.client.pttl("test:short") <= 100
+    assert backend.client.pttl("test:forever") == -1
+    time.sleep(0.15)
+    assert backend.get_many(["short", "forever"]) == {"forever": b"1"}
+
+
+def test_delete_and_clear_only_touch_our_prefix(backend):
+    backend.set_many({"a": b"1", "b": b"2"})
+    backend.client.set("other:a", b"keep")
+    backend.delete("a")
+    assert backend.get("a") is None
+    backend.clear()
+    assert backend.get("b") is None
+    assert backend.client.get("other:a") == b"keep"
+
+
+def test_backs_off_after_an_error(server, backend):
+    backend.set("a", b"1")
+    server.connected = False
+    assert backend.get("a") is None
+    assert not backend._available()
+    server.connected = True
+    # Still backing off: no round trip, even though the server is back
+    assert backend.get("a") is None
+    assert not backend.set("b", b"2")
+    time.sleep(0.25)
+    assert backend.get("a") == b"1"
+    assert backend.set("b", b"2")
+
+
+def test_errors_on_write_are_not_raised(server, backend):
+    server.connected = False
+    assert not backend.set_many({"a": b"1"})
+    backend.delete("a")
+    backend.clear()
+
+
+def test_tiered_backfills_faster_tiers(backend):
+    memory = MemoryBackend(1_000_000)
+    tiered = TieredBackend([memory, backend], backfill_ttl=60)
+    backend.set("a", b"1")
+    assert tiered.get_many(["a", "b"]) == {"a": b"1"}
+    assert memory.get("a") == b"1"
+
+    tiered.set_many({"c": b"3"})
+    assert memory.get("c") == b"3"
+    assert backend.get("c") == b"3"
+
+
+def test_tiered_keeps_working_while_redis_is_down(server, backend):
+    memory = MemoryBackend(1_000_000)
+    tiered = TieredBackend([memory, backend])
+    server.connected = False
+    assert tiered.set("a", b"1")
+    assert tiered.get("a") == b"1"
+    assert tiered.get("b") is None
+
+
+def test_cache_io_keeps_redis_round_trips_off_the_event_loop(monkeypatch, backend):
+    def thread_name():
+        return threading.current_thread().name
+
+    async def run():
+        return await app.cache.cache_io(thread_name)
+
+    # Restored afterwards, along with the cache the next get_cache() builds
+    for name in ("_cache", "_cache_pid", "_cache_remote"):
+        monkeypatch.setattr(app.cache, name, None if name == "_cache_pid" else getattr(app.cache, name))
+    monkeypatch.setattr(app.cache, "build_cache", lambda: MemoryBackend(1_000_000))
+    assert anyio.run(run) == "MainThread"
+
+    monkeypatch.setattr(app.cache, "build_cache", lambda: TieredBackend([MemoryBackend(1_000_000), backend]))
+    monkeypatch.setattr(app.cache, "_cache_pid", None)
+    assert anyio.run(run) != "MainThread"
+
+
+def test_tiered_backfill_keeps_the_remaining_ttl(backend):
+    memory = MemoryBackend(1_000_000)
+    tiered = TieredBackend([memory, backend], backfill_ttl=60)
+    backend.set("token", b"1", ttl=0.2)
+    backend.set("result", b"2")
+    assert tiered.get_many(["token", "result"]) == {"token": b"1", "result": b"2"}
+    assert memory.get("token") == b"1"
+    time.sleep(0.25)
+    # Gone from Redis, and the copy in memory didn't outlive it
+    assert memory.get("token") is None
+    assert tiered.get("token") is None
+    assert memory.get("result") == b"2"
@@ -0,0 +1,234 @@
+"""SharedResultCache: seqlock reads, eviction, expiry and several processes at once."""
+
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from app.cache.shared import SEQ, SLOT_HEADER_SIZE, WAYS, SharedResultCache, hash_key
+
+SLOT_BYTES = 1024
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def open_cache(path, slots=64, generation="test"):
+    return SharedResultCache(path, slots=slots, slot_bytes=SLOT_BYTES, generation=generation)
+
+
+@pytest.fixture
+def cache(path):
+    cache = open_cache(path)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def one_set(path):
+    """WAYS slots, so every key lands in the same set."""
+    cache = open_cache(path, slots=WAYS)
+    yield cache
+    cache.close()
+
+
+def slot_of(cache, key):
+    digest = hash_key(key)
+    for slot in range(cache.slots):
+        if cache._mm[cache._slot_offset(slot) + 24:cache._slot_offset(slot) + 40] == digest:
+            return slot
+    return None
+
+
+def test_get_set_delete(cache):
+    assert cache.get("a") is None
+    assert cache.set("a", b"1")
+    assert cache.get("a") == b"1"
+    assert cache.set("a", b"2")
+    assert cache.get("a") == b"2"
+    cache.delete("a")
+    assert cache.get("a") is None
+    stats = cache.worker_stats()[os.getpid()]
+    assert stats["hits"] == 2 and stats["misses"] == 2 and stats["stores"] == 2
+
+
+def test_compressed_and_too_large_values(cache):
+    compressible = b"0123456789" * 300
+    assert cache.set("big", compressible)
+    assert cache.get("big") == compressible
+    assert not cache.set("random", os.urandom(SLOT_BYTES))
+    assert cache.get("random") is None
+    assert cache.worker_stats()[os.getpid()]["too_large"] == 1
+
+
+def test_other_processes_see_writes(path, cache):
+    other = open_cache(path)
+    try:
+        cache.set("a", b"1")
+        assert other.get("a") == b"1"
+    finally:
+        other.close()
+
+
+def test_new_generation_starts_empty(path, cache):
+    cache.set("a", b"1")
+    newer = open_cache(path, generation="next")
+    try:
+        assert newer.get("a") is None
+    finally:
+        newer.close()
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("short", b"1", ttl=0.05)
+    cache.set("forever", b"1")
+    assert cache.get("short") == b"1"
+    time.sleep(0.1)
+    assert cache.get("short") is None
+    assert cache.get("forever") == b"1"
+
+
+def test_evicts_least_recently_used(one_set):
+    for key in "abcd":
+        one_set.set(key, key.encode())
+        time.sleep(0.001)
+    # "a" is now the most recently used
+    assert one_set.get("a") == b"a"
+    one_set.set("e", b"e")
+    assert one_set.get("b") is None
+    assert [one_set.get(key) for key in "acde"] == [b"a", b"c", b"d", b"e"]
+    assert one_set.worker_stats()[os.getpid()]["evictions"] == 1
+
+
+def test_expired_entries_are_evicted_first(one_set):
+    one_set.set("old", b"1", ttl=0.01)
+    for key in "bcd":
+        time.sleep(0.001)
+        one_set.set(key, key.encode())
+    time.sleep(0.02)
+    one_set.set("e", b"e")
+    assert [one_set.get(key) for key in "bcde"] == [b"b", b"c", b"d", b"e"]
+    # Replacing an expired entry isn't an eviction
+    assert one_set.worker_stats()[os.getpid()]["evictions"] == 0
+
+
+def test_slot_being_written_is_a_miss(cache):
+    cache.set("a", b"1")
+    offset = cache._slot_offset(slot_of(cache, "a"))
+    seq = SEQ.unpack_from(cache._mm, offset)[0]
+    SEQ.pack_into(cache._mm, offset, seq + 1)
+    assert cache.get("a") is None
+    # A writer that died mid-write doesn't block the slot for good
+    assert cache.set("a", b"2")
+    assert cache.get("a") == b"2"
+
+
+def test_torn_value_is_a_miss(cache):
+    cache.set("a", b"x" * 100)
+    body = cache._slot_offset(slot_of(cache, "a")) + SLOT_HEADER_SIZE
+    cache._mm[body:body + 10] = b"y" * 10
+    assert cache.get("a") is None
+
+
+def test_contended_slot_does_not_hide_other_ways(one_set):
+    one_set.set("busy", b"1")
+    one_set.set("a", b"2")
+    busy = one_set._slot_offset(slot_of(one_set, "busy"))
+    SEQ.pack_into(one_set._mm, busy, SEQ.unpack_from(one_set._mm, busy)[0] + 1)
+    assert slot_of(one_set, "a") > slot_of(one_set, "busy")
+    assert one_set.get("a") == b"2"
+
+
+def test_clear_keeps_stats(cache):
+    cache.set("a", b"1")
+    cache.clear()
+    assert cache.get("a") is None
+    assert cache.used_slots() == 0
+    assert cache.worker_stats()[os.getpid()]["stores"] == 1
+
+
+def _value(key: str, round_: int) -> bytes:
+    # Every byte depends on the round, so a torn copy can't pass for a real value
+    return (f"{key}:{round_}:".encode() * 40)[:300 + round_ % 200]
+
+
+def _hammer(path, keys, rounds, errors):
+    cache = open_cache(path, slots=WAYS * 2)
+    try:
+        for round_ in range(rounds):
+            for key in keys:
+                cache.set(key, _value(key, round_))
+                value = cache.get(key)
+                if value is not None and not _valid(key, value):
+                    errors.put(f"{key}: {value[:40]!r}")
+    finally:
+        cache.close()
+
+
+def _valid(key: str, value: bytes) -> bool:
+    round_ = int(value.split(b":")[1])
+    return value == _value(key, round_)
+
+
+def test_concurrent_processes_never_read_torn_values(path):
+    """More keys than slots, so readers keep racing writers and evictions."""
+    keys = [f"k{i}" for i in range(12)]
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [context.Process(target=_hammer, args=(path, keys, 300, errors)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+
+    cache = open_cache(path, slots=WAYS * 2)
+    reads = hits = 0
+    try:
+        while any(worker.is_alive() for worker in workers):
+            for key in keys:
+                value = cache.get(key)
+                reads += 1
+                if value is not None:
+                    hits += 1
+                    assert _valid(key, value), value[:40]
+    finally:
+        for worker in workers:
+            worker.join(30)
+        cache.close()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert errors.empty(), errors.get()
+    assert hits > 0 and reads > hits
+
+
+def test_concurrent_threads(path, cache):
+    errors = []
+
+    def run(offset):
+        try:
+            for i in range(500):
+                key = f"t{(i + offset) % 40}"
+                cache.set(key, key.encode() * 20)
+                value = cache.get(key)
+                if value is not None and value != key.encode() * 20:
+                    errors.append(value)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(n * 7,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def test_remaining_ttl(cache):
+    cache.set("short", b"1", ttl=10)
+    cache.set("forever", b"2")
+    found = cache.get_many_with_ttl(["short", "forever", "missing"])
+    assert found["short"][0] == b"1" and 9 < found["short"][1] <= 10
+    assert found["forever"] == (b"2", None)
+    assert "missing" not in found
@@ -207,7 +207,7 @@ const ResultsDisplay = ({ results, originalData }) => {
 
     setIsGeneratingPDF(true);
     try {
-      const result = await generatePDF(originalData);
+      const result = await generatePDF(originalData, results.result_token);
       if (!result.success) {
         alert(`Erro ao gerar PDF: ${result.error}`);
       }
@@ -120,11 +120,26 @@ export const checkHealth = async () => {
   }
 };
 
-export const generatePDF = async (financialData) => {
+const requestPDF = (body) => api.post('/generate-pdf', body, {
+  responseType: 'blob', // Important for PDF download
+});
+
+// resultToken comes from the /calculate response. Sending it instead of the
+// full data lets the server skip validation and calculations; if it has
+// expired (404) we fall back to the full data.
+export const generatePDF = async (financialData, resultToken) => {
   try {
-    const response = await api.post('/generate-pdf', financialData, {
-      responseType: 'blob', // Important for PDF download
-    });
+    let response;
+    if (resultToken) {
+      try {
+        response = await requestPDF({ result_token: resultToken });
+      } catch (error) {
+        if (error.response?.status !== 404) throw error;
+      }
+    }
+    if (!response) {
+      response = await requestPDF(financialData);
+    }
     
     // Create download link
     const url = window.URL.createObjectURL(new Blob([response.data]));